@@ -0,0 +1,170 @@
+"""
+Compares the compiled kernels of slicesim.Kernels with their NumPy (or plain Python) counterparts on inputs of the
+size of the Kapalicarsi scenario, and checks that the results are identical. Needs numba for the compiled ones.
+With --simulate, the scenario itself is run for a few time units with and without the compiled kernels
+(SLICE_SIM_JIT=1 / 0) in separate processes, with batched admission, the fair scheduler and max load balancing.
+The kernels pay off on their own, but not end to end: the time of a run goes to the per client processes of the
+event loop and to Client.start_consume and Client.release_consume, which are not compiled, and runs are slower
+with numba at 15000 and 150000 clients.
+
+Usage:
+    python benchmarks/jit_kernels.py [num_clients ...] [--repeat N] [--simulate] [--ticks N]
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slicesim import Kernels
+
+CONF_FILENAME = os.path.join(os.path.dirname(__file__), '..', 'slicesim', 'istanbul-kapalicarsi.yml')
+ADMISSION_SHARE = 0.1  # share of the clients requesting a connection in a time unit
+CONSUMER_SHARE = 0.3  # share of the clients consuming in a time unit
+
+
+def get_inputs(data, num_clients, seed=7):
+    """
+    :return: Dict of kernel name to its arguments, drawn like the per time unit inputs of the scenario
+    """
+    rng = np.random.RandomState(seed)
+    n_stations, n_slices = len(data['base_stations']), len(data['slices'])
+    k = data['settings']['limit_closest_base_stations']
+    weights = np.asarray([s['client_weight'] for s in data['slices'].values()], dtype=float)
+    subscribed = rng.rand(num_clients, n_slices) < weights / weights.max()
+    subscribed[np.arange(num_clients), rng.choice(n_slices, num_clients, p=weights / weights.sum())] = True
+
+    loads = rng.rand(n_stations, n_slices)
+    stations = rng.randint(-1, n_stations, (num_clients, k))
+    # up to three of the subscribed slices in a random order, as subscribed by the clients
+    order = np.argsort(rng.rand(num_clients, n_slices) + ~subscribed, axis=1)[:, :3]
+    slice_indices = np.where(np.take_along_axis(subscribed, order, axis=1), order, -1)
+    candidate_load = Kernels.get_candidate_loads_numpy(loads, stations, slice_indices, True)
+
+    requests = rng.choice(num_clients, int(num_clients * ADMISSION_SHARE), replace=False)
+    request_stations = rng.randint(0, n_stations, len(requests))
+    counts = subscribed[requests].sum(axis=1)
+    ptr = np.zeros(len(requests) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    keys = (np.repeat(request_stations, counts) * n_slices + np.nonzero(subscribed[requests])[1]).astype(np.int64)
+    headroom = np.where(rng.rand(n_stations * n_slices) < 0.2, np.inf,
+                        rng.randint(0, len(requests) // n_stations + 1, n_stations * n_slices).astype(float))
+
+    consumers = int(num_clients * CONSUMER_SHARE)
+    groups = np.sort(rng.randint(0, n_stations * n_slices, consumers))
+    group_ptr = np.searchsorted(groups, np.arange(n_stations * n_slices + 1)).astype(np.int64)
+    demands = rng.lognormal(16, 1.5, consumers)
+    capacities = np.add.reduceat(demands, group_ptr[:-1]) * 0.7 if consumers > 0 else np.zeros(0)
+    capacities[np.diff(group_ptr) == 0] = 0.0
+
+    return {
+        'candidate loads (max)': ((loads, stations, slice_indices, True),),
+        'candidate loads (mean)': ((loads, stations, slice_indices, False),),
+        'threshold / margin decision': ((candidate_load, rng.rand(num_clients, k) < 0.7,
+                                         rng.rand(num_clients) < 0.9, rng.rand(num_clients), 0.6, 0.05),),
+        'sequential admission': ((rng.permutation(len(requests)).astype(np.int64), ptr, keys,
+                                  rng.rand(len(keys)) < 0.7, headroom),),
+        'water-filling (fair)': ((capacities, group_ptr, demands, np.ones(consumers)),),
+        'water-filling (weighted)': ((capacities, group_ptr, demands, 1.0 / rng.randint(1, 6, consumers)),),
+    }
+
+
+KERNELS = {
+    'candidate loads (max)': ('get_candidate_loads_numpy', 'get_candidate_loads'),
+    'candidate loads (mean)': ('get_candidate_loads_numpy', 'get_candidate_loads'),
+    'threshold / margin decision': ('decide_threshold_margin_numpy', 'decide_threshold_margin'),
+    'sequential admission': ('admit_in_order_python', 'admit_in_order'),
+    'water-filling (fair)': ('water_fill_groups_numpy', 'water_fill_groups'),
+    'water-filling (weighted)': ('water_fill_groups_numpy', 'water_fill_groups'),
+}
+
+
+def best_time(function, args, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_kernels(data, num_clients, repeat):
+    print(f'\n{num_clients} clients')
+    print(f'{"kernel":<30}{"numpy ms":>12}{"jit ms":>12}{"speed-up":>10}  identical')
+    for name, (args,) in get_inputs(data, num_clients).items():
+        fallback, compiled = (getattr(Kernels, f) for f in KERNELS[name])
+        numpy_time, expected = best_time(fallback, args, repeat)
+        if not Kernels.JIT:
+            print(f'{name:<30}{1000 * numpy_time:>12.3f}{"-":>12}{"-":>10}  -')
+            continue
+        compiled(*args)  # compile, or load from the cache
+        jit_time, result = best_time(compiled, args, repeat)
+        print(f'{name:<30}{1000 * numpy_time:>12.3f}{1000 * jit_time:>12.3f}{numpy_time / jit_time:>9.1f}x'
+              f'  {np.array_equal(expected, result)}')
+
+
+def simulate(num_clients, ticks):
+    """
+    Runs the scenario in this process and prints the wall time and a digest of the stats as JSON.
+    """
+    from slicesim.Equivalence import get_series
+    from slicesim.Simulation import run_simulation
+
+    with open(CONF_FILENAME, 'r') as stream:
+        data = yaml.load(stream, Loader=yaml.FullLoader)
+    settings = data['settings']
+    settings.update({'num_clients': num_clients, 'simulation_time': ticks, 'load_balance_type': 'max',
+                     'admission_params': {'mode': 'batched', 'priority': 'qos'},
+                     'scheduler_params': {'mode': 'fair'}, 'logging': False})
+    settings['plotting_params']['plotting'] = False
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        general_stats, per_slice_stats, _ = run_simulation(data, os.path.dirname(CONF_FILENAME))
+    elapsed = time.perf_counter() - start
+    series = get_series(general_stats, per_slice_stats)
+    digest = hashlib.sha1(b''.join(np.asarray(series[k]).tobytes() for k in sorted(series))).hexdigest()
+    print(json.dumps({'elapsed': elapsed, 'digest': digest}))
+
+
+def bench_simulation(num_clients, ticks):
+    results = {}
+    for jit in ('0', '1'):
+        output = subprocess.run([sys.executable, '-W', 'ignore', __file__, str(num_clients), '--run', '--ticks',
+                                 str(ticks)], env=dict(os.environ, SLICE_SIM_JIT=jit), check=True,
+                                capture_output=True, text=True).stdout
+        results[jit] = json.loads(output.strip().splitlines()[-1])
+    numpy_time, jit_time = results['0']['elapsed'], results['1']['elapsed']
+    print(f'{num_clients} clients, {ticks} time units: numpy {numpy_time:.2f}s, jit {jit_time:.2f}s, '
+          f'speed-up {numpy_time / jit_time:.2f}x, identical stats: {results["0"]["digest"] == results["1"]["digest"]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('clients', type=int, nargs='*', default=[15000, 150000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--simulate', action='store_true', help='run the scenario with and without the kernels')
+    parser.add_argument('--ticks', type=int, default=3)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        simulate(args.clients[0], args.ticks)
+        sys.exit(0)
+    with open(CONF_FILENAME, 'r') as stream:
+        conf = yaml.load(stream, Loader=yaml.FullLoader)
+    print(f'numba: {"enabled" if Kernels.JIT else "not available, numpy only"}')
+    for n in args.clients:
+        bench_kernels(conf, n, args.repeat)
+    if args.simulate:
+        print()
+        for n in args.clients:
+            bench_simulation(n, args.ticks)
@@ -0,0 +1,181 @@
+"""
+Reports the memory footprint of a client, including its simpy process, on the Kapalicarsi scenario, and the
+footprint of a slice. The current __slots__ layout is compared with a reproduction of the previous layout:
+clients with an instance dict, usage_remaining and last_usage dicts keyed by slice index and a
+closest_base_stations list of (distance, base station) tuples filled by the k-d tree, and slices with a
+simpy.Container.
+
+Usage:
+    python benchmarks/memory_per_client.py [num_clients]
+"""
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+import numpy as np
+import simpy
+import yaml
+from sklearn.neighbors import KDTree as kdt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slicesim.BaseStation import BaseStation
+from slicesim.Client import Client
+from slicesim.Coverage import Coverage
+from slicesim.Distributor import Distributor
+from slicesim.Mobility import Mobility
+from slicesim.Slice import Slice
+from slicesim.Stats import Stats
+from slicesim.utils import Environment, LoadBalanceType
+
+CONF_FILENAME = os.path.join(os.path.dirname(__file__), '..', 'slicesim', 'istanbul-kapalicarsi.yml')
+
+
+class LegacySlice:
+    """
+    Attributes of the previous Slice.
+    """
+
+    def __init__(self, name, ratio, connected_users, user_share, delay_tolerance, qos_class,
+                 bandwidth_guaranteed, bandwidth_max, init_capacity, usage_pattern, env, index):
+        self.name = name
+        self.connected_users = connected_users
+        self.user_share = user_share
+        self.delay_tolerance = delay_tolerance
+        self.qos_class = qos_class
+        self.ratio = ratio
+        self.bandwidth_guaranteed = bandwidth_guaranteed
+        self.bandwidth_max = bandwidth_max
+        self.init_capacity = init_capacity
+        self.capacity = simpy.Container(env, init=init_capacity, capacity=init_capacity)
+        self.usage_pattern = usage_pattern
+        self.index = index
+
+
+class LegacyClient:
+    """
+    Attributes and process of the previous Client.
+    """
+
+    def __init__(self, pk, env, x, y, mobility_pattern, usage_freq, subscribed_slice_indices, stat_collector,
+                 lb_handover_type, lb_threshold=0.6, lb_margin=0.05, base_station=None):
+        self.pk = pk
+        self.env = env
+        self.x = x
+        self.y = y
+        self.mobility_pattern = mobility_pattern
+        self.usage_freq = usage_freq
+        self.base_station = base_station
+        self.stat_collector = stat_collector
+        self.subscribed_slice_indices = subscribed_slice_indices
+        self.usage_remaining = {}
+        self.last_usage = {}
+        for index in self.subscribed_slice_indices:
+            self.usage_remaining[index] = 0
+            self.last_usage[index] = 0
+        self.closest_base_stations = []
+        self.connected = False
+
+        self.total_connected_time = 0
+        self.total_unconnected_time = 0
+        self.total_request_count = 0
+        self.total_consume_time = 0
+        self.total_usage = 0
+
+        self.action = env.process(self.iter())
+        self.suppress_log = True
+        self.lb_handover_type = lb_handover_type
+        self.lb_threshold = lb_threshold
+        self.lb_margin = lb_margin
+
+    def iter(self):
+        yield self.env.timeout(0.25)
+        yield self.env.timeout(0.25)
+        yield self.env.timeout(0.25)
+        yield self.env.timeout(0.25)
+        yield self.env.process(self.iter())
+
+
+def build_base_stations(data, env, legacy=False):
+    """
+    :param legacy: Slices of the previous layout are built if set
+    """
+    base_stations = []
+    for i, b in enumerate(data['base_stations']):
+        slices = []
+        for slice_idx, (name, s) in enumerate(data['slices'].items()):
+            usage_pattern = Distributor(name, random.randint, *s['usage_pattern']['params'])
+            args = (name, b['ratios'][name], 0, s['client_weight'], s['delay_tolerance'], s['qos_class'],
+                    s['bandwidth_guaranteed'], s['bandwidth_max'], b['capacity_bandwidth'] * b['ratios'][name],
+                    usage_pattern)
+            slices.append((LegacySlice if legacy else Slice)(*args, env, slice_idx))
+        base_stations.append(BaseStation(i, Coverage((b['x'], b['y']), b['coverage']), b['capacity_bandwidth'], slices))
+    return base_stations
+
+
+def fill_closest_base_stations(clients, base_stations, limit):
+    """
+    Candidate lists of the previous layout, as the k-d tree refresh of each time unit filled them.
+    """
+    tree = kdt([bs.coverage.center for bs in base_stations], leaf_size=2)
+    distances, indices = tree.query([(c.x, c.y) for c in clients], k=min(limit, len(base_stations)))
+    for c, d, p in zip(clients, distances, indices):
+        c.closest_base_stations = [(a, base_stations[b]) for a, b in zip(d, p)]
+
+
+def measure(num_clients, legacy=False):
+    """
+    :return: (bytes per client, bytes per slice)
+    """
+    with open(CONF_FILENAME, 'r') as stream:
+        data = yaml.load(stream, Loader=yaml.FullLoader)
+    os.environ["SLICE_SIM_LOG_STAT_ONLY"] = "1"
+    random.seed(7)
+    np.random.seed(7)
+
+    env = Environment()
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    base_stations = build_base_stations(data, env, legacy)
+    gc.collect()
+    slice_count = sum(len(bs.slices) for bs in base_stations)
+    per_slice = (tracemalloc.get_traced_memory()[0] - start) / slice_count
+    tracemalloc.stop()
+
+    stats = Stats(env, base_stations, None, ((0, 1980), (0, 1980)))
+    mobility_pattern = Distributor('mb', random.randint, -4, 4)
+    slice_weights = [s['client_weight'] for s in data['slices'].values()]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    mobility = None if legacy else Mobility(env, np.zeros((num_clients, 2)))
+    clients = []
+    for i in range(num_clients):
+        subscribed = np.random.choice(len(slice_weights), np.random.randint(3) + 1, replace=False, p=slice_weights)
+        x, y, usage_freq = random.randint(0, 1980), random.randint(0, 1980), random.randint(0, 100000) / 1000000
+        if legacy:
+            clients.append(LegacyClient(i, env, x, y, mobility_pattern, usage_freq, subscribed, stats,
+                                        LoadBalanceType.disabled))
+        else:
+            clients.append(Client(i, env, x, y, mobility_pattern, usage_freq, subscribed, stats, mobility=mobility))
+    if legacy:
+        fill_closest_base_stations(clients, base_stations, data['settings']['limit_closest_base_stations'])
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / num_clients, per_slice
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 15000
+    before_client, before_slice = measure(n, legacy=True)
+    after_client, after_slice = measure(n)
+    print(f'{n} clients')
+    print(f'{"":<10}{"per client":>12}{"per slice":>12}')
+    print(f'{"before":<10}{before_client:>12.0f}{before_slice:>12.0f}')
+    print(f'{"after":<10}{after_client:>12.0f}{after_slice:>12.0f}')
+    print(f'{"saved":<10}{1 - after_client / before_client:>12.0%}{1 - after_slice / before_slice:>12.0%}')
@@ -0,0 +1,109 @@
+"""
+Times the chunked phase kernels of a time unit on the Kapalicarsi scenario with a growing number of threads, see
+parallel_params and ChunkExecutor: the handover context (coverage lookup, candidate rows and k-d tree queries on
+partitioned coordinates), the coverage ratio of the stats and random waypoint moves. The scenario is built and run
+for a few time units first, the kernels are then timed on its state and checked to give the same results with any
+number of threads.
+
+The kernels release the GIL only within the NumPy and scikit-learn calls of a chunk, so threads only pay off with
+several cores and large chunks, i.e. with hundreds of thousands of clients or more.
+
+Usage:
+    python benchmarks/parallel_chunks.py [num_clients] [--threads 1 2 4 8] [--chunk-size N] [--repeat N]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slicesim.Parallel import ChunkExecutor
+from slicesim.Simulation import Simulation
+
+CONF_FILENAME = os.path.join(os.path.dirname(__file__), '..', 'slicesim', 'istanbul-kapalicarsi.yml')
+WARMUP_TICKS = 2
+
+
+def build(num_clients, chunk_size):
+    with open(CONF_FILENAME, 'r') as stream:
+        data = yaml.load(stream, Loader=yaml.FullLoader)
+    settings = data['settings']
+    settings.update({'num_clients': num_clients, 'simulation_time': WARMUP_TICKS, 'logging': False,
+                     'load_balance_type': 'max', 'parallel_params': {'threads': 1, 'chunk_size': chunk_size},
+                     'mobility_params': {'model': 'random_waypoint', 'boundary': 'reflect'}})
+    settings['plotting_params']['plotting'] = False
+    simulation = Simulation(data, os.path.dirname(CONF_FILENAME))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulation.build()
+        simulation.env.run(until=WARMUP_TICKS)
+    return simulation
+
+
+def get_kernels(simulation):
+    """
+    :return: Dict of kernel name to a function of no arguments running it with the executor of the stats
+    """
+    stats = simulation.stats
+    now = int(simulation.env.now)
+    model = stats.mobility.model
+    positions = stats.mobility.positions
+
+    def handover_context():
+        ctx = stats.handover.get_context(now)
+        return ctx.in_coverage, ctx.candidates, ctx.mask, ctx.distances
+
+    def move():
+        moved = positions.copy()
+        arrived = np.concatenate(stats.executor.map(lambda lo, hi: model.move(moved, lo, hi), len(moved)))
+        return moved, arrived
+
+    return {
+        'handover context': handover_context,
+        'coverage ratio': lambda: (stats.get_coverage_ratio(),),
+        'random waypoint moves': move,
+    }
+
+
+def set_executor(simulation, executor):
+    simulation.stats.executor.shutdown()
+    simulation.stats.executor = executor
+    simulation.stats.mobility.executor = executor
+
+
+def best_time(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('clients', type=int, nargs='?', default=150000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    simulation = build(args.clients, args.chunk_size)
+    kernels = get_kernels(simulation)
+    print(f'{args.clients} clients, chunk size {args.chunk_size}, {os.cpu_count()} CPUs')
+    print(f'{"kernel":<24}{"threads":>8}{"ms":>10}{"speed-up":>10}  identical')
+    for name, kernel in kernels.items():
+        base_time, expected = None, None
+        for threads in args.threads:
+            set_executor(simulation, ChunkExecutor(threads=threads, chunk_size=args.chunk_size))
+            elapsed, result = best_time(kernel, args.repeat)
+            if base_time is None:
+                base_time, expected = elapsed, result
+            identical = all(np.array_equal(a, b) for a, b in zip(expected, result))
+            print(f'{name:<24}{threads:>8}{1000 * elapsed:>10.2f}{base_time / elapsed:>9.2f}x  {identical}')
+    simulation.stats.executor.shutdown()
@@ -0,0 +1,101 @@
+import numpy as np
+
+from .Kernels import admit_in_order
+
+ADMISSION_PRIORITIES = ('arrival', 'qos', 'random')
+
+
+def get_headrooms(capacities, connected_users, bandwidth_max, bandwidth_guaranteed):
+    """
+    Closed form of Slice.is_available applied repeatedly: the largest k with
+    min(capacity / (connected_users + k), bandwidth_max) >= bandwidth_guaranteed, for arrays of slices.
+    :return: Number of clients each slice can admit, inf if it has no guaranteed bandwidth
+    """
+    capacities = np.asarray(capacities, dtype=float)
+    users = np.asarray(connected_users, dtype=float)
+    guaranteed = np.asarray(bandwidth_guaranteed, dtype=float)
+    bandwidth_max = np.asarray(bandwidth_max, dtype=float)
+    unlimited = guaranteed <= 0
+    g = np.where(unlimited, 1.0, guaranteed)
+    k = np.maximum(np.floor(capacities / g) - users, 0)
+    # correct the rounding of the division, so that the result matches the per client check
+    too_many = (k > 0) & (capacities / np.maximum(users + k, 1) < g)
+    k[too_many] -= 1
+    k[capacities / np.maximum(users + k + 1, 1) >= g] += 1
+    k[bandwidth_max < g] = 0
+    return np.where(unlimited, np.inf, k)
+
+
+class AdmissionControl:
+    """
+    Batched admission. Connection requests of a time unit are collected at .00 and resolved together at .125.
+    The number of clients each (base station, slice) can still admit is computed in closed form, and requests
+    are admitted in a deterministic order of priority:
+        arrival:    order of the requests, as in the per client admission
+        qos:        lowest qos_class among the slices of the client first, in order of arrival for ties
+        random:     random order drawn from a generator seeded with seed
+    A client is admitted if all the slices it requests usage from can admit one more client. As in the per client
+    admission, it then counts as a user of all of its subscribed slices.
+    """
+
+    def __init__(self, env, stat_collector, priority='arrival', seed=None):
+        if priority not in ADMISSION_PRIORITIES:
+            raise NotImplementedError(f'Unknown admission priority: {priority}')
+        self.env = env
+        self.stat_collector = stat_collector
+        self.priority = priority
+        self.rng = np.random.RandomState(seed)
+        self.requests = []  # (client, handover performed)
+        self.action = env.process(self.iter())
+
+    def request(self, client, handover_performed=False):
+        self.requests.append((client, handover_performed))
+
+    def get_order(self, requests):
+        if self.priority == 'arrival':
+            return range(len(requests))
+        if self.priority == 'qos':
+            qos = np.fromiter((c.get_qos_class() for c, _ in requests),
+                              dtype=float, count=len(requests))
+            return np.argsort(qos, kind='stable').tolist()
+        return self.rng.permutation(len(requests)).tolist()
+
+    def resolve(self):
+        requests, self.requests = self.requests, []
+        requests = [(c, h) for c, h in requests if not c.connected and c.base_station is not None]
+        if len(requests) == 0:
+            return
+
+        # headroom of each (base station, slice) with a request, and the slices of the requests as indices of it
+        slices = {}
+        ptr, keys, needed = [0], [], []
+        for c, _ in requests:
+            pk = c.base_station.pk
+            for pos, s in enumerate(c.get_slices()):
+                keys.append(slices.setdefault((pk, s.index), (len(slices), s))[0])
+                needed.append(c.usage_remaining[pos] > 0)
+            ptr.append(len(keys))
+        values = [s for _, s in slices.values()]
+        headroom = get_headrooms([s.init_capacity for s in values], [s.connected_users for s in values],
+                                 [s.bandwidth_max for s in values], [s.bandwidth_guaranteed for s in values])
+
+        order = np.fromiter(self.get_order(requests), dtype=np.int64, count=len(requests))
+        admitted = admit_in_order(order, np.asarray(ptr, dtype=np.int64), np.asarray(keys, dtype=np.int64),
+                                  np.asarray(needed, dtype=bool), headroom)
+        for i in order.tolist():
+            client, handover_performed = requests[i]
+            self.stat_collector.incr_connect_attempt(client)
+            if admitted[i]:
+                client.admit()
+            else:
+                client.refuse(handover_performed)
+
+    def iter(self):
+        yield self.env.timeout(0.125)
+        while True:
+            # .125: resolve the requests of .00
+            self.resolve()
+            yield self.env.timeout(1)
+
+    def __str__(self):
+        return f'AdmissionControl(priority={self.priority})'
@@ -1,9 +1,12 @@
 class BaseStation:
+    __slots__ = ('pk', 'coverage', 'capacity_bandwidth', 'slices', 'color')
+
     def __init__(self, pk, coverage, capacity_bandwidth, slices=None):
         self.pk = pk
         self.coverage = coverage
         self.capacity_bandwidth = capacity_bandwidth
         self.slices = slices
+        self.color = None  # assigned by Graph
 
     def __str__(self):
         return f'BS_{self.pk:<2}\t cov:{self.coverage}\t with cap {self.capacity_bandwidth:<5}'
@@ -1,33 +1,41 @@
 import random
-import numpy as np
 import os
-from .utils import distance, KDTree, LoadBalanceType
-
-DEFAULT_PER_SLICE_THRESHOLD = 0.6
-DEFAULT_HAND_OVER_LOAD_MARGIN = 0.05
+from array import array
+from .IdleScheduler import sample_request_delays
+from .Mobility import Mobility
 
 
 class Client:
+    __slots__ = ('pk', 'env', 'mobility', 'row', 'mobility_pattern', 'usage_freq', '_base_station', 'stat_collector',
+                 'subscribed_slice_indices', 'usage_remaining', 'last_usage', '_connected',
+                 'total_connected_time', 'total_unconnected_time', 'total_request_count',
+                 'total_consume_time', 'total_usage',
+                 'action', 'suppress_log', 'idle_scheduler')
+
     def __init__(self, pk, env, x, y, mobility_pattern,
                  usage_freq,
                  subscribed_slice_indices, stat_collector,
-                 lb_handover_type, lb_threshold=DEFAULT_PER_SLICE_THRESHOLD,
-                 lb_margin=DEFAULT_HAND_OVER_LOAD_MARGIN, base_station=None):
+                 base_station=None, idle_scheduler=None, mobility=None):
         self.pk = pk
         self.env = env
-        self.x = x
-        self.y = y
+        # Position is kept in the positions array of mobility, at row pk if shared by all clients.
+        if mobility is None:
+            mobility = Mobility(env, [(x, y)])
+            self.row = 0
+        else:
+            self.row = pk
+            mobility.positions[pk] = (x, y)
+        self.mobility = mobility
         self.mobility_pattern = mobility_pattern
         self.usage_freq = usage_freq
-        self.base_station = base_station
         self.stat_collector = stat_collector
-        self.subscribed_slice_indices = subscribed_slice_indices
-        self.usage_remaining = {}
-        self.last_usage = {}
-        for index in self.subscribed_slice_indices:
-            self.usage_remaining[index] = 0
-            self.last_usage[index] = 0
-        self.closest_base_stations = []
+        # Base station and connected flag are also kept in the client arrays of stat_collector, if tracked.
+        self.base_station = base_station
+        # Per slice values are kept in fixed size arrays aligned with subscribed_slice_indices,
+        # i.e. usage_remaining[i] belongs to the slice with index subscribed_slice_indices[i].
+        self.subscribed_slice_indices = tuple(int(i) for i in subscribed_slice_indices)
+        self.usage_remaining = array('d', bytes(8 * len(self.subscribed_slice_indices)))
+        self.last_usage = array('d', bytes(8 * len(self.subscribed_slice_indices)))
         self.connected = False
 
         # Stats
@@ -37,81 +45,62 @@ class Client:
         self.total_consume_time = 0
         self.total_usage = 0
 
+        # Event driven usage model, see IdleScheduler. Clients poll at each time unit if None.
+        self.idle_scheduler = idle_scheduler
         self.action = env.process(self.iter())
         # print(self.usage_freq)
 
-        self.suppress_log = True if os.environ["SLICE_SIM_LOG_STAT_ONLY"] is "1" else False
-        self.lb_handover_type = lb_handover_type
-        self.lb_threshold = lb_threshold
-        self.lb_margin = lb_margin
+        self.suppress_log = True if os.environ["SLICE_SIM_LOG_STAT_ONLY"] == "1" else False
 
-    def get_slice_balance_load(self, station):
-        """
-        Returns the load level of a given station considering only the slices used by this client.
-        The returned value might differ according to the handover logic.
-        For instance, in LoadBalanceType.max, the maximum load of these slices are returned.
-        :param station: Base station of which load to be calculated
-        :return: Load value according to load balance logic
-        """
-        if self.lb_handover_type is LoadBalanceType.disabled:
-            return -1  # ignored
-        elif self.lb_handover_type is LoadBalanceType.max:
-            return max([s.get_load() for s in np.asarray(station.slices)[self.subscribed_slice_indices]])
-        elif self.lb_handover_type is LoadBalanceType.mean:
-            return np.mean([s.get_load() for s in np.asarray(station.slices)[self.subscribed_slice_indices]])
-        else:
-            raise NotImplementedError
+    @property
+    def x(self):
+        return self.mobility.positions[self.row, 0]
 
-    def get_current_bs_load(self):
-        """
-        Calculates the currently connected base station's slice load considering only the slices
-        used by this client.
-        :return: Load value according to load balance logic
-        """
-        current_slice_loads = [s.get_load() for s in self.get_slices()] if self.base_station is not None else []
-        if self.lb_handover_type is LoadBalanceType.disabled:
-            return -1  # ignored
-        elif self.lb_handover_type is LoadBalanceType.max:
-            return max(current_slice_loads) if len(current_slice_loads) is not 0 else -1
-        elif self.lb_handover_type is LoadBalanceType.mean:
-            return np.mean(current_slice_loads) if len(current_slice_loads) is not 0 else -1
-        else:
-            raise NotImplementedError
+    @x.setter
+    def x(self, value):
+        self.mobility.positions[self.row, 0] = value
 
-    def should_skip_lb_handover(self, current_load, candidate_load):
-        """
-        Decides if this client should handover in the next iteration or not.
-        :param current_load: result of self.get_current_lb_load
-        :param candidate_load: result of get_slice_balance_load for a candidate base station
-        :return: True if handover should be performed, False otherwise
-        """
-        if self.lb_handover_type is LoadBalanceType.disabled:
-            return True  # do not attempt to make load balance. Skip directly
-        elif self.lb_handover_type is LoadBalanceType.max or LoadBalanceType.mean:
-            return current_load < self.lb_threshold or \
-                   candidate_load > (current_load - self.lb_margin)
-        else:
-            raise NotImplementedError
+    @property
+    def y(self):
+        return self.mobility.positions[self.row, 1]
+
+    @y.setter
+    def y(self, value):
+        self.mobility.positions[self.row, 1] = value
+
+    @property
+    def base_station(self):
+        return self._base_station
+
+    @base_station.setter
+    def base_station(self, value):
+        self._base_station = value
+        serving = self.stat_collector.client_serving
+        if serving is not None:
+            serving[self.pk] = value.pk if value is not None else -1
+
+    @property
+    def connected(self):
+        return self._connected
+
+    @connected.setter
+    def connected(self, value):
+        self._connected = value
+        connected = self.stat_collector.client_connected
+        if connected is not None:
+            connected[self.pk] = value
 
     def get_next_base_station(self):
         """
-        Applies handover logic and chooses a base station among available ones including the current one
+        Applies the handover policy, see HandoverPolicy and HandoverController.
         :return: Base station to be connected inn the next time unit. Might be None or the same as the current one.
         """
-        in_coverage = self.base_station is not None and self.base_station.coverage.is_in_coverage(self.x, self.y)
-        current_load = self.get_current_bs_load()
-
-        st = self.get_candidate_base_stations(exclude=[self.base_station.pk] if self.base_station is not None else [])
-        st.sort(key=lambda x: self.get_slice_balance_load(x[1]))  # TODO: Pass lambda as param for distinct mechanisms
-        candidate_load = self.get_slice_balance_load(st[0][1]) if len(st) > 0 else 1
-
-        if in_coverage and self.should_skip_lb_handover(current_load, candidate_load):
-            return self.base_station
-
-        self.log(f'[{int(self.env.now)}] Client_{self.pk} old load was {current_load} at '
-                 f'BS:{self.base_station.pk if self.base_station is not None else None}, '
-                 f'new load is {candidate_load} at BS:{st[0][1].pk if len(st) > 0 else None}')
-        return st[0][1] if len(st) > 0 else None
+        next_bs = self.stat_collector.handover.get_next_base_station(self)
+        if next_bs is not self.base_station:
+            self.log(f'[{int(self.env.now)}] Client_{self.pk} moves from '
+                     f'BS:{self.base_station.pk if self.base_station is not None else None} to '
+                     f'BS:{next_bs.pk if next_bs is not None else None} by {self.stat_collector.handover.policy}')
+        return next_bs
 
     def assign_optimal_base_station(self):
         """
@@ -119,10 +108,6 @@ class Client:
         :return: True if handover is performed, False otherwise
         """
 
-        if KDTree.last_run_time is not int(self.env.now):
-            KDTree.run(self.stat_collector.clients, self.stat_collector.base_stations, int(self.env.now),
-                       assign=False, logging=(not self.suppress_log))
-
         next_bs = self.get_next_base_station()
         if self.base_station is next_bs:
             self.log(f'[{int(self.env.now)}] Client_{self.pk} continues to be assigned to {self.base_station}')
@@ -135,7 +120,7 @@ class Client:
 
         if self.connected:
             self.log(f'[{int(self.env.now)}] Client_{self.pk} disconnecting from {self.base_station.pk}')
-            self.disconnect()
+            self.disconnect('handover' if next_bs is not None else 'dropped')
 
         if next_bs is None:
             self.log(f'[{int(self.env.now)}] Client_{self.pk} could not assigned to any base station')
@@ -150,17 +135,34 @@ class Client:
         return True
 
     def is_all_remaining_usages_zero(self):
-        for _, v in self.usage_remaining.items():
-            if v is not 0:
+        for v in self.usage_remaining:
+            if v != 0:
                 return False
         return True
 
     def is_all_last_usages_zero(self):
-        for _, v in self.last_usage.items():
-            if v is not 0:
+        for v in self.last_usage:
+            if v != 0:
                 return False
         return True
 
+    def is_idle(self):
+        return not self.connected and self.is_all_remaining_usages_zero()
+
+    def get_next_request(self):
+        """
+        Samples the next usage request of an idle client for the event driven usage model.
+        :return: (number of time units until the request, positions of the requesting slices)
+        """
+        demand = self.stat_collector.demand
+        if demand is None:
+            delays = sample_request_delays(self.usage_freq, len(self.subscribed_slice_indices))
+        else:
+            delays = demand.sample_request_delays(self.usage_freq, self.subscribed_slice_indices, self.int_now(),
+                                                  self.base_station)
+        delay = min(delays)
+        return delay, [pos for pos, d in enumerate(delays) if d == delay]
+
     def iter(self):
         """
         There are four steps in a cycle:
@@ -168,11 +170,30 @@ class Client:
             2- .25: Stats
             3- .50: Release
             4- .75: Move
+        In the event driven usage model, idle clients sleep from .00 until the time unit of their next request.
+        Clients do not wake up at .25 as they have nothing to do there.
         """
 
         # .00: Lock
+        if self.mobility.is_removed(self.row):
+            self.leave()
+            return
         handover_performed = self.assign_optimal_base_station()
 
+        requested = None
+        while self.idle_scheduler is not None and self.is_idle():
+            delay, requested = self.get_next_request()
+            if delay == 0:
+                break
+            requested = yield self.idle_scheduler.sleep(self, delay, requested)
+            # .00 of the time unit woken up at
+            if self.mobility.is_removed(self.row):
+                self.leave()
+                return
+            handover_performed = self.assign_optimal_base_station()
+            if requested is not None:
+                break
+
         if self.base_station is not None:
             if not self.is_all_remaining_usages_zero():
                 self.generate_usage()
@@ -184,14 +205,11 @@ class Client:
                 if self.connected:
                     self.disconnect()
                 else:
-                    if self.generate_usage():
+                    if self.generate_usage(requested):
                         self.connect()
 
-        yield self.env.timeout(0.25)
-
-        # .25: Stats
-
-        yield self.env.timeout(0.25)
+        # .25: Stats, clients have nothing to do
+        yield self.env.timeout(0.5)
 
         # .50: Release
         # Base station check skipped as it's already implied by self.connected
@@ -203,10 +221,11 @@ class Client:
         yield self.env.timeout(0.25)
 
         # .75: Move
-        # Move the client
-        x, y = self.mobility_pattern.generate_movement()
-        self.x += x
-        self.y += y
+        # Move the client, unless all clients are moved at once by the mobility model
+        if not self.mobility.is_vectorized():
+            x, y = self.mobility_pattern.generate_movement()
+            self.x += x
+            self.y += y
         """
         if self.base_station is not None:
             if not self.base_station.coverage.is_in_coverage(self.x, self.y):
@@ -222,29 +241,58 @@ class Client:
 
         yield self.env.process(self.iter())
 
+    def get_qos_class(self):
+        """
+        :return: The lowest (i.e. the most prior) qos_class among the subscribed slices
+        """
+        return min(s.qos_class for s in self.get_slices())
+
     def get_slices(self):
+        """
+        :return: Subscribed slices of the current base station, in the order of subscribed_slice_indices.
+        """
         if self.base_station is None:
             return None
-        return np.asarray(self.base_station.slices)[self.subscribed_slice_indices]
+        slices = self.base_station.slices
+        return [slices[i] for i in self.subscribed_slice_indices]
 
-    def generate_usage(self):
+    def generate_usage(self, requested=None):
+        """
+        Request rates and usages are scaled by the demand profiles of the time unit if any, see DemandProfiles.
+        :param requested: Positions of the slices which request usage, drawn by the client itself if None.
+        :return: True if any usage is generated
+        """
         generated = False
-        if self.get_slices() is None:
+        if self.base_station is None:
             return generated
-        for slice_idx, remain in self.usage_remaining.items():
-            if remain is 0 and self.usage_freq < random.random():
-                sl = self.base_station.slices[slice_idx]
-                self.usage_remaining[slice_idx] = sl.usage_pattern.generate()
+        demand = self.stat_collector.demand
+        if demand is not None:
+            rates, volumes = demand.get_row(self.int_now(), self.base_station)
+        for pos, remain in enumerate(self.usage_remaining):
+            if remain != 0:
+                continue
+            index = self.subscribed_slice_indices[pos]
+            if requested is not None:
+                requesting = pos in requested
+            elif demand is None:
+                requesting = self.usage_freq < random.random()
+            else:
+                requesting = 1.0 - (1.0 - self.usage_freq) * rates[index] < random.random()
+            if requesting:
+                sl = self.base_station.slices[index]
+                self.usage_remaining[pos] = sl.usage_pattern.generate()
+                if demand is not None:
+                    self.usage_remaining[pos] *= volumes[index]
                 self.total_request_count += 1
                 self.log(
-                    f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] requests {self.usage_remaining[slice_idx]}'
+                    f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] requests {self.usage_remaining[pos]}'
                     f' usage from slice: {sl}')
                 generated = True
         return generated
 
     def is_bs_available(self):
-        for sl in self.get_slices():
-            if self.usage_remaining[sl.index] > 0 and not sl.is_available():
+        for pos, sl in enumerate(self.get_slices()):
+            if self.usage_remaining[pos] > 0 and not sl.is_available():
                 self.log(f'[{int(self.env.now)}] Client_{self.pk} is blocked at bs {self.base_station} for slice {sl.name} '
                       f'and its load={sl.get_load()}, its availability={sl.is_available()}')
                 sl.print_stats()
@@ -252,49 +300,79 @@ class Client:
         return True
 
     def connect(self, handover_performed=False):
+        """
+        Admits the client to its slices if they are available. With batched admission, the request is
+        resolved later in the time unit by AdmissionControl.
+        :return: True if connected, False if refused, None if the request is pending
+        """
         if self.connected:
             return
-        slices = self.get_slices()
+        admission = self.stat_collector.admission
+        if admission is not None:
+            admission.request(self, handover_performed)
+            return
         # increment connect attempt
         self.stat_collector.incr_connect_attempt(self)
         if self.is_bs_available():
-            for sl in slices:
-                sl.connected_users += 1
-            self.connected = True
-            self.log(
-                f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] connected to slices={[s.name for s in slices]}'
-                f' @ {self.base_station}')
+            self.admit()
             return True
         else:
-            """ from the old version of SliceSim:
-            
-            self.assign_closest_base_station(exclude=[self.base_station.pk])
-            if self.base_station is not None and self.get_slice().is_available():
-                # handover
-                self.stat_collector.incr_handover_count(self)
-            elif self.base_station is not None:
-                # block
-                self.stat_collector.incr_block_count(self)
-            else:
-                pass  # uncovered
-                
-            """
-            if handover_performed:
-                self.stat_collector.incr_drop_count(self)
-            else:
-                self.stat_collector.incr_block_count(self)
-            self.log(
-                f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] connection refused to '
-                f'slices={[s.name for s in slices]} @ {self.base_station}')
+            self.refuse(handover_performed)
             return False
 
-    def disconnect(self):
+    def admit(self):
+        slices = self.get_slices()
+        for sl in slices:
+            sl.connected_users += 1
+        self.connected = True
+        recorder = self.stat_collector.recorder
+        if recorder is not None:
+            recorder.open_session(self)
+        self.log(
+            f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] connected to slices={[s.name for s in slices]}'
+            f' @ {self.base_station}')
+
+    def refuse(self, handover_performed=False):
+        """ from the old version of SliceSim:
+
+        self.assign_closest_base_station(exclude=[self.base_station.pk])
+        if self.base_station is not None and self.get_slice().is_available():
+            # handover
+            self.stat_collector.incr_handover_count(self)
+        elif self.base_station is not None:
+            # block
+            self.stat_collector.incr_block_count(self)
+        else:
+            pass  # uncovered
+
+        """
+        if handover_performed:
+            self.stat_collector.incr_drop_count(self)
+        else:
+            self.stat_collector.incr_block_count(self)
+        recorder = self.stat_collector.recorder
+        if recorder is not None:
+            recorder.refuse_session(self, handover_performed)
+        hotspots = self.stat_collector.hotspots
+        if hotspots is not None and not handover_performed:
+            hotspots.record_block(self)
+        self.log(
+            f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] connection refused to '
+            f'slices={[s.name for s in self.get_slices()]} @ {self.base_station}')
+
+    def disconnect(self, outcome='completed'):
+        """
+        :param outcome: Reason of the disconnection, see Recorder.OUTCOMES
+        """
         slices = self.get_slices()
         if not self.connected:
             self.log(
                 f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] is already disconnected from '
                 f'slices={[s.name for s in slices]} @ {self.base_station}')
         else:
+            recorder = self.stat_collector.recorder
+            if recorder is not None:
+                recorder.close_session(self, outcome)
             for sl in slices:
                 sl.connected_users -= 1
             self.connected = False
@@ -303,41 +381,62 @@ class Client:
                 f' slices={[s.name for s in slices]} @ {self.base_station}')
         return not self.connected
 
+    def leave(self):
+        """
+        Leaves the simulation, after being removed by the boundary policy of the mobility model.
+        """
+        if self.connected:
+            self.disconnect('left')
+        self.base_station = None
+        self.log(f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] left the simulation area')
+
     def start_consume(self):
+        scheduler = self.stat_collector.scheduler
+        if scheduler is not None:
+            scheduler.request(self)  # allocated later in the time unit, see Scheduler
+            return
+
         slices = self.get_slices()
-        for s in slices:
-            amount = min(s.get_consumable_share(), self.usage_remaining[s.index])
+        for pos, s in enumerate(slices):
+            amount = min(s.get_consumable_share(), self.usage_remaining[pos])
             # Allocate resource and consume ongoing usage with given bandwidth
             if amount <= 0:
-                self.last_usage[s.index] = 0
+                self.last_usage[pos] = 0
                 continue
             s.capacity.get(amount)
             self.log(f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] gets {amount} usage from slice: {s}.')
-            self.last_usage[s.index] = amount
+            self.last_usage[pos] = amount
+
+    def hold_allocation(self, allocations):
+        """
+        Takes the allocations given by the scheduler for the current time unit.
+        :param allocations: List of (slice position, slice, amount) tuples
+        """
+        for pos, s, amount in allocations:
+            if amount <= 0:
+                continue
+            s.capacity.get(amount)
+            self.log(f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] gets {amount} usage from slice: {s}.')
+            self.last_usage[pos] = amount
 
     def release_consume(self):
         slices = self.get_slices()
-        for s in slices:
+        recorder = self.stat_collector.recorder
+        for pos, s in enumerate(slices):
             # Put the resource back
-            last_usage = self.last_usage[s.index]
+            last_usage = self.last_usage[pos]
             if last_usage > 0:  # note: s.capacity.put cannot take 0
                 s.capacity.put(last_usage)
                 self.log(f'[{int(self.env.now)}] Client_{self.pk} [{self.x}, {self.y}] puts back {last_usage} usage.')
                 self.total_consume_time += 1
                 self.total_usage += last_usage
-                self.usage_remaining[s.index] -= last_usage
-                self.last_usage[s.index] = 0
+                self.usage_remaining[pos] -= last_usage
+                if recorder is not None:
+                    recorder.add_usage(self, s.index, last_usage)
+                self.last_usage[pos] = 0
 
-    def get_candidate_base_stations(self, exclude=None):
-        updated_list = []
-        for d, b in self.closest_base_stations:
-            if exclude is not None and b.pk in exclude:
-                continue
-            d = distance((self.x, self.y), (b.coverage.center[0], b.coverage.center[1]))
-            updated_list.append((d, b))
-        # updated_list.sort(key=operator.itemgetter(0))  already sorted according to
-        filtered_list = [x for x in updated_list if x[0] <= x[1].coverage.radius]
-        return filtered_list
+    def int_now(self):
+        return int(self.env.now)
 
     def __str__(self):
         return f'Client_{self.pk} [{self.x:<5}, {self.y:>5}] connected to: slices={[s.name for s in self.get_slices()]} ' \
@@ -1,4 +1,105 @@
-from itertools import combinations
+import numpy as np
+from sklearn.neighbors import KDTree as kdt
+
+
+class Adjacency:
+    """
+    Sparse neighbourhood of base stations in CSR form.
+    Neighbours of the base station with pk i are indices[indptr[i]:indptr[i + 1]], sorted by pk.
+    Two base stations are neighbours if their coverage areas overlap. The neighbour lists are shared
+    by all slices, slice_mask[i][j] tells whether base station i has the j-th slice in slice_names.
+    Base stations taken down are left out of the neighbour lists, see set_station_state.
+    """
+
+    def __init__(self, indptr, indices, slice_mask, slice_names):
+        self.indptr = indptr
+        self.indices = indices
+        self.slice_mask = slice_mask
+        self.slice_names = list(slice_names)
+        self.up = np.ones(len(indptr) - 1, dtype=bool)
+        self.down_count = 0
+
+    def set_station_state(self, pk, up):
+        """
+        Takes the base station out of the neighbour lists or puts it back, see get_neighbours.
+        """
+        if self.up[pk] == up:
+            return
+        self.up[pk] = up
+        self.down_count += -1 if up else 1
+
+    def get_neighbours(self, pk, slice_name=None):
+        """
+        :param pk:          Base station pk
+        :param slice_name:  If given, only the neighbours sharing this slice are returned,
+                            none if the base station does not have it.
+        :return:            Array of neighbour pks
+        """
+        neighbours = self.indices[self.indptr[pk]:self.indptr[pk + 1]]
+        if self.down_count > 0:
+            neighbours = neighbours[self.up[neighbours]]
+        if slice_name is None:
+            return neighbours
+        s = self.slice_names.index(slice_name)
+        if not self.slice_mask[pk, s]:
+            return neighbours[:0]
+        return neighbours[self.slice_mask[neighbours, s]]
+
+    def get_matrix(self, slice_name):
+        """
+        :return: Dense connection matrix of the slice, see get_connection_matrices
+        """
+        n = len(self.indptr) - 1
+        result = [[0 for _ in range(n)] for _ in range(n)]
+        for i in range(n):
+            for j in self.get_neighbours(i, slice_name):
+                result[i][j] = 1
+        return result
+
+
+def get_adjacency(slices, base_stations):
+    """
+    Builds the sparse neighbourhood of base stations with a radius bounded query over
+    base station centers, instead of checking every pair.
+
+    :param slices:          List of slice names
+    :param base_stations:   List of base station objects, pk being the index in the list
+    :return:                Adjacency
+    """
+    n = len(base_stations)
+    slice_mask = np.zeros((n, len(slices)), dtype=bool)
+    for bs in base_stations:
+        names = {s.name for s in bs.slices}
+        slice_mask[bs.pk] = [s in names for s in slices]
+    centers = np.asarray([bs.coverage.center for bs in base_stations], dtype=float).reshape(-1, 2)
+    radii = np.asarray([bs.coverage.radius for bs in base_stations], dtype=float)
+    return get_adjacency_from_arrays(slices, centers, radii, slice_mask)
+
+
+def get_adjacency_from_arrays(slices, centers, radii, slice_mask):
+    """
+    :param centers:     (base stations, 2) array of the coverage centers
+    :param radii:       Array of the coverage radii
+    :param slice_mask:  (base stations, slices) array, True if the base station has the slice
+    :return:            Adjacency, see get_adjacency
+    """
+    n = len(radii)
+    if n == 0:
+        return Adjacency(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), slice_mask, slices)
+
+    # every neighbour of i is within radii[i] + max radius of its center
+    tree = kdt(centers)
+    candidates, distances = tree.query_radius(centers, r=radii + radii.max(), return_distance=True)
+
+    indices = []
+    counts = np.zeros(n, dtype=np.int64)
+    for i, (cand, dist) in enumerate(zip(candidates, distances)):
+        cand = np.sort(cand[(dist < radii[i] + radii[cand]) & (cand != i)])
+        indices.append(cand)
+        counts[i] = len(cand)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return Adjacency(indptr, np.concatenate(indices).astype(np.int64), slice_mask, slices)
 
 
 def get_connection_matrices(slices, base_stations):
@@ -8,18 +109,11 @@ def get_connection_matrices(slices, base_stations):
     i.e.
     if result['slice_1'][<bs1>][<bs2>] == 1 then
     bs1 and bs2 share a common area and both have slice_1.
+    Prefer get_adjacency for large deployments, these matrices are dense.
 
     :param slices:          List of slice names
     :param base_stations:   List of base station objects
     :return:                2d connection matrices for each slice.
     """
-    result = {}
-    for s in slices:
-        result[s] = [[0 for _ in range(len(base_stations))] for _ in (range(len(base_stations)))]
-        for comb in list(combinations(base_stations, 2)):
-            if comb[0].is_neighbour(comb[1]) \
-                    and comb[0].has_slice(s) \
-                    and comb[1].has_slice(s):
-                result[s][comb[0].pk][comb[1].pk] = 1
-                result[s][comb[1].pk][comb[0].pk] = 1
-    return result
+    adjacency = get_adjacency(slices, base_stations)
+    return {s: adjacency.get_matrix(s) for s in slices}
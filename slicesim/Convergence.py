@@ -0,0 +1,78 @@
+from collections import deque
+
+import numpy as np
+from scipy import stats
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_BATCHES = 10
+DEFAULT_METRICS = ('coverage_ratio', 'avg_slice_load_ratio', 'block_count_ratio')
+DEFAULT_WINDOW = 200
+DEFAULT_TOLERANCE = 0.01
+
+
+def get_confidence_interval(values, confidence=DEFAULT_CONFIDENCE):
+    """
+    Student t confidence interval of the mean of independent samples.
+    :return: (mean, sample std, half width), half width is nan with less than two samples
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = float(np.mean(values)) if n > 0 else float('nan')
+    if n < 2:
+        return mean, float('nan'), float('nan')
+    std = float(np.std(values, ddof=1))
+    return mean, std, float(stats.t.ppf((1 + confidence) / 2, n - 1) * std / np.sqrt(n))
+
+
+def get_batch_means(series, batches=DEFAULT_BATCHES):
+    """
+    Splits a series into contiguous batches, whose means are about independent for long runs.
+    """
+    batches = max(min(batches, len(series)), 1)
+    return [float(np.mean(b)) for b in np.array_split(series, batches) if len(b) > 0]
+
+
+class ConvergenceDetector:
+    """
+    Watches metrics of the general stats after the warmup, see Stats.get_last_stats. A metric is converged once
+    the confidence interval of the batch means of its last window values is narrower than tolerance.
+    The simulation is stopped when all the metrics are converged, see Stats.collect.
+    """
+
+    def __init__(self, warmup, metrics=DEFAULT_METRICS, window=DEFAULT_WINDOW, batches=DEFAULT_BATCHES,
+                 confidence=DEFAULT_CONFIDENCE, tolerance=DEFAULT_TOLERANCE):
+        """
+        :param warmup:      Number of time units not watched
+        :param tolerance:   Width of the confidence intervals, in the units of the metrics
+        """
+        self.warmup = int(warmup)
+        self.metrics = tuple(metrics)
+        self.window = int(window)
+        self.batches = int(batches)
+        self.confidence = confidence
+        self.tolerance = tolerance
+        self.values = {m: deque(maxlen=self.window) for m in self.metrics}  # last window values
+        self.converged_at = None
+
+    def update(self, now, last_stats):
+        """
+        :param now:         Time unit of the stats
+        :param last_stats:  Values of the metrics in the time unit
+        :return:            True if all the metrics are converged
+        """
+        if now < self.warmup:
+            return False
+        for m in self.metrics:
+            self.values[m].append(last_stats[m])
+        if len(self.values[self.metrics[0]]) < self.window:
+            return False
+        for m in self.metrics:
+            _, _, half_width = get_confidence_interval(
+                get_batch_means(np.asarray(self.values[m]), self.batches), self.confidence)
+            if not 2 * half_width < self.tolerance:
+                return False
+        self.converged_at = now
+        return True
+
+    def __str__(self):
+        return f'ConvergenceDetector(metrics={list(self.metrics)}, window={self.window}, tolerance={self.tolerance})'
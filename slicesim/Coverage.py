@@ -1,16 +1,13 @@
-import math
-
-
 class Coverage:
+    __slots__ = ('center', 'radius')
+
     def __init__(self, center, radius):
         self.center = center
         self.radius = radius
 
-    def _get_euclidean_distance(self, p):
-        return math.sqrt(sum((i-j)**2 for i,j in zip(p, self.center)))
-
     def is_in_coverage(self, x, y):
-        return self._get_euclidean_distance((x, y)) <= self.radius
+        dx, dy = x - self.center[0], y - self.center[1]
+        return dx * dx + dy * dy <= self.radius * self.radius
 
     def __str__(self):
         x, y = self.center
@@ -0,0 +1,207 @@
+import math
+
+import numpy as np
+
+DEFAULT_MAX_CELLS = 1000000
+
+# Cell states stored for each (cell, base station) pair
+OUT = 0  # the base station is down, see set_station_state
+PARTIAL = 1  # the cell intersects the coverage area, an exact check is needed
+FULL = 2  # the cell lies completely inside the coverage area
+
+
+class CoverageGrid:
+    """
+    Precomputed coverage raster over the statistics area.
+    Each cell keeps the base stations that fully or partly cover it. Entries are stored
+    as a sorted array of keys (cell * number of base stations + base station index), so
+    that both "does this station cover this point" and "which stations cover this point"
+    become table reads. Exact distance checks only run for cells on coverage boundaries.
+    Base stations taken down are left out by setting the states of their entries, see set_station_state.
+    """
+
+    def __init__(self, base_stations, area, cell_size=None):
+        self.setup(np.asarray([bs.coverage.center for bs in base_stations], dtype=float).reshape(-1, 2),
+                   np.asarray([bs.coverage.radius for bs in base_stations], dtype=float), area, cell_size)
+
+    @classmethod
+    def from_arrays(cls, centers, radii, area, cell_size=None, keys=None, states=None, cell_ptr=None):
+        """
+        Grid of the base stations with the given centers and radii. Entries built before, e.g. kept in
+        a shared Topology, are used as they are if given.
+        """
+        grid = cls.__new__(cls)
+        grid.setup(centers, radii, area, cell_size, keys, states, cell_ptr)
+        return grid
+
+    def setup(self, centers, radii, area, cell_size=None, keys=None, states=None, cell_ptr=None):
+        (self.x_min, x_max), (self.y_min, y_max) = area
+        self.centers = centers
+        self.radii = radii
+        self.bs_count = len(radii)
+
+        width, height = max(x_max - self.x_min, 1), max(y_max - self.y_min, 1)
+        if cell_size is None:
+            cell_size = self.radii.min() / 2 if self.bs_count > 0 else max(width, height)
+            cell_size = max(cell_size, math.sqrt(width * height / DEFAULT_MAX_CELLS))
+        self.cell_size = float(cell_size)
+        self.cols = int(math.ceil(width / self.cell_size))
+        self.rows = int(math.ceil(height / self.cell_size))
+
+        if keys is None:
+            keys, states = self._build()
+        self.keys, self.states = keys, states
+        # cell_ptr[c]:cell_ptr[c + 1] is the range of the entries of cell c
+        if cell_ptr is None:
+            cell_ptr = np.searchsorted(self.keys, np.arange(self.rows * self.cols + 1) * self.bs_count)
+        self.cell_ptr = cell_ptr
+        self.up = np.ones(self.bs_count, dtype=bool)
+        # states as built and the entries of each base station, once a station is taken down
+        self.built_states = None
+        self.station_entries = None
+        self.station_ptr = None
+
+    def _build(self):
+        keys, states = [], []
+        cs = self.cell_size
+        for i, ((cx, cy), r) in enumerate(zip(self.centers, self.radii)):
+            c0 = max(int((cx - r - self.x_min) // cs), 0)
+            c1 = min(int((cx + r - self.x_min) // cs), self.cols - 1)
+            r0 = max(int((cy - r - self.y_min) // cs), 0)
+            r1 = min(int((cy + r - self.y_min) // cs), self.rows - 1)
+            if c0 > c1 or r0 > r1:
+                continue
+            col, row = np.meshgrid(np.arange(c0, c1 + 1), np.arange(r0, r1 + 1))
+            col, row = col.ravel(), row.ravel()
+            left, bottom = self.x_min + col * cs, self.y_min + row * cs
+            # nearest and farthest points of each cell to the station center
+            near_x = np.clip(cx, left, left + cs) - cx
+            near_y = np.clip(cy, bottom, bottom + cs) - cy
+            far_x = np.maximum(np.abs(left - cx), np.abs(left + cs - cx))
+            far_y = np.maximum(np.abs(bottom - cy), np.abs(bottom + cs - cy))
+            r_sq = r * r
+            state = np.where(far_x ** 2 + far_y ** 2 <= r_sq, FULL,
+                             np.where(near_x ** 2 + near_y ** 2 <= r_sq, PARTIAL, 0))
+            mask = state != 0
+            keys.append((row[mask] * self.cols + col[mask]) * self.bs_count + i)
+            states.append(state[mask])
+        if len(keys) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+        keys = np.concatenate(keys).astype(np.int64)
+        states = np.concatenate(states).astype(np.int8)
+        order = np.argsort(keys, kind='stable')
+        return keys[order], states[order]
+
+    def set_station_state(self, pk, up):
+        """
+        Takes the base station out of the raster or puts it back, only touching the entries of its cells.
+        States are copied at the first change, as they might be shared by other runs, see Topology.
+        """
+        if self.up[pk] == up:
+            return
+        if self.built_states is None:
+            self.built_states = self.states
+            self.states = self.states.copy()
+            stations = self.keys % max(self.bs_count, 1)
+            self.station_entries = np.argsort(stations, kind='stable')
+            self.station_ptr = np.searchsorted(stations[self.station_entries], np.arange(self.bs_count + 1))
+        entries = self.station_entries[self.station_ptr[pk]:self.station_ptr[pk + 1]]
+        self.states[entries] = self.built_states[entries] if up else OUT
+        self.up[pk] = up
+
+    def get_cells(self, xs, ys):
+        """
+        :return: Cell ids of the given points, -1 for points outside of the raster.
+        """
+        col = np.floor((np.asarray(xs, dtype=float) - self.x_min) / self.cell_size).astype(np.int64)
+        row = np.floor((np.asarray(ys, dtype=float) - self.y_min) / self.cell_size).astype(np.int64)
+        inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+        return np.where(inside, row * self.cols + col, -1)
+
+    def get_cell(self, x, y):
+        col = int((x - self.x_min) // self.cell_size)
+        row = int((y - self.y_min) // self.cell_size)
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row * self.cols + col
+        return -1
+
+    def covers(self, xs, ys, bs_indices):
+        """
+        Batched coverage check.
+        :param xs:          x coordinates of the points
+        :param ys:          y coordinates of the points
+        :param bs_indices:  Base station index for each point, -1 for none.
+        :return:            Boolean array, True if the point is covered by its base station.
+        """
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        bs_indices = np.asarray(bs_indices, dtype=np.int64)
+        result = np.zeros(len(xs), dtype=bool)
+        has_bs = bs_indices >= 0
+        if len(self.keys) == 0 or not has_bs.any():
+            return result
+
+        cells = self.get_cells(xs, ys)
+        keys = cells * self.bs_count + bs_indices
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = has_bs & (cells >= 0) & (self.keys[pos] == keys)
+        state = np.where(found, self.states[pos], 0)
+        result[state == FULL] = True
+
+        # boundary cells and points outside of the raster need an exact check
+        exact = (state == PARTIAL) | (has_bs & (cells < 0))
+        if exact.any():
+            idx = bs_indices[exact]
+            dx = xs[exact] - self.centers[idx, 0]
+            dy = ys[exact] - self.centers[idx, 1]
+            result[exact] = (dx * dx + dy * dy <= self.radii[idx] ** 2) & self.up[idx]
+        return result
+
+    def covers_any(self, xs, ys):
+        """
+        Batched counterpart of get_covering_stations.
+        :return: Boolean array, True if any base station covers the point. False outside of the raster.
+        """
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        cells = self.get_cells(xs, ys)
+        inside = cells >= 0
+        cells = np.where(inside, cells, 0)
+        starts = self.cell_ptr[cells]
+        counts = np.where(inside, self.cell_ptr[cells + 1] - starts, 0)
+        width = int(counts.max()) if len(counts) > 0 else 0
+        # entries of the cell of each point, padded with OUT
+        valid = np.arange(width) < counts[:, None]
+        entries = np.where(valid, starts[:, None] + np.arange(width), 0)
+        states = np.where(valid, self.states[entries], OUT) if width > 0 else np.zeros((len(xs), 0), dtype=np.int8)
+        covered = (states == FULL).any(axis=1)
+        partial = states == PARTIAL
+        if partial.any():
+            idx = np.where(partial, self.keys[entries] - cells[:, None] * self.bs_count, 0)
+            dx = xs[:, None] - self.centers[idx, 0]
+            dy = ys[:, None] - self.centers[idx, 1]
+            covered |= (partial & (dx * dx + dy * dy <= self.radii[idx] ** 2)).any(axis=1)
+        return covered
+
+    def get_covering_stations(self, x, y):
+        """
+        :return: Indices of the base stations covering the point, or None if the point is outside of the raster.
+        """
+        cell = self.get_cell(x, y)
+        if cell < 0:
+            return None
+        lo, hi = self.cell_ptr[cell], self.cell_ptr[cell + 1]
+        offset = cell * self.bs_count
+        result = []
+        for key, state in zip(self.keys[lo:hi].tolist(), self.states[lo:hi].tolist()):
+            i = key - offset
+            if state == OUT:
+                continue
+            if state == FULL:
+                result.append(i)
+                continue
+            cx, cy = self.centers[i].tolist()
+            r = self.radii[i]
+            if (x - cx) * (x - cx) + (y - cy) * (y - cy) <= r * r:
+                result.append(i)
+        return result
@@ -0,0 +1,158 @@
+import math
+import random
+
+import numpy as np
+
+DEFAULT_REGION = 'default'
+
+
+def get_period(spec):
+    """
+    :return: Period of a profile, 0 for a constant one which fits any period, None if it is not periodic
+    """
+    if not isinstance(spec, dict):
+        return 0
+    return spec.get('period')
+
+
+def compile_profile(spec, length):
+    """
+    :param spec:    A number for a constant multiplier, or a dict of
+                        piecewise: points [[time unit, multiplier], ...], interpolation (step or linear) between them
+                                   and an optional period they repeat with
+                        periodic: a cosine with period, mean, amplitude and peak (time unit of the maximum)
+    :param length:  Number of time units
+    :return:        Array of the multipliers of the time units 0..length-1, clipped to be non-negative
+    """
+    t = np.arange(length, dtype=float)
+    if not isinstance(spec, dict):
+        values = np.full(length, float(spec))
+    elif spec.get('type', 'piecewise') == 'piecewise':
+        points = sorted((float(p), float(v)) for p, v in spec['points'])
+        times = np.asarray([p for p, _ in points])
+        multipliers = np.asarray([v for _, v in points])
+        period = spec.get('period')
+        if period is not None:
+            t = t % period
+        interpolation = spec.get('interpolation', 'step')
+        if interpolation == 'linear':
+            values = np.interp(t, times, multipliers, period=period)
+        elif interpolation == 'step':
+            # before the first point: the last one of the previous period if periodic, the first one otherwise
+            indices = np.searchsorted(times, t, side='right') - 1
+            values = multipliers[indices if period is not None else np.maximum(indices, 0)]
+        else:
+            raise NotImplementedError(f'Unknown interpolation: {interpolation}')
+    elif spec['type'] == 'periodic':
+        values = spec.get('mean', 1.0) + spec.get('amplitude', 0.0) * np.cos(
+            2 * np.pi * (t - spec.get('peak', 0)) / spec['period'])
+    else:
+        raise NotImplementedError(f'Unknown demand profile type: {spec["type"]}')
+    return np.maximum(values, 0.0)
+
+
+class DemandProfiles:
+    """
+    Time-varying demand per slice and region, compiled at start into tables of multipliers of shape
+    (time units, regions, slices), one for the request rate and one for the requested volume:
+        a client with usage frequency f requests usage from a slice in a time unit with probability
+        min(1, (1 - f) * rate), and the usage drawn from the usage pattern of the slice is multiplied by volume.
+    The region of a client is the one of its base station. Base stations belong to the first region containing
+    their center, or to default. Tables cover a single period if all profiles share it, the simulation time otherwise.
+    Clients look up the row of the current time unit, which is converted once per time unit, see get_row.
+    """
+
+    def __init__(self, base_stations, slice_names, simulation_time, profiles, regions=None):
+        """
+        :param profiles:    List of dicts with rate and/or volume profiles (see compile_profile), and the slices and
+                            regions they apply to, all of them if not given. Later profiles override earlier ones.
+        :param regions:     Dict of region name to its rectangle {x: [min, max], y: [min, max]}
+        """
+        regions = regions or {}
+        self.slice_names = list(slice_names)
+        self.region_names = [DEFAULT_REGION] + [name for name in regions if name != DEFAULT_REGION]
+        self.bs_regions = [self.get_region(bs.coverage.center, regions) for bs in base_stations]
+        self.end = int(simulation_time)
+
+        periods = {get_period(p[k]) for p in profiles for k in ('rate', 'volume') if k in p} - {0}
+        period = periods.pop() if len(periods) == 1 else None
+        if period is not None and float(period).is_integer() and period > 0:
+            self.length = int(period)
+        else:
+            self.length = max(self.end, 1)
+
+        shape = (self.length, len(self.region_names), len(self.slice_names))
+        self.rate = np.ones(shape)
+        self.volume = np.ones(shape)
+        for profile in profiles:
+            slice_indices = [self.get_index(self.slice_names, name, 'slice')
+                             for name in profile.get('slices', self.slice_names)]
+            region_indices = [self.get_index(self.region_names, name, 'region')
+                              for name in profile.get('regions', self.region_names)]
+            for key, table in (('rate', self.rate), ('volume', self.volume)):
+                if key not in profile:
+                    continue
+                values = compile_profile(profile[key], self.length)
+                for r in region_indices:
+                    table[:, r, slice_indices] = values[:, None]
+        self.max_rate = self.rate.max(axis=0)
+
+        self.tick = None
+        self.rate_row = None
+        self.volume_row = None
+
+    @staticmethod
+    def get_index(names, name, kind):
+        if name not in names:
+            raise ValueError(f'Unknown {kind} in demand profiles: {name}')
+        return names.index(name)
+
+    def get_region(self, center, regions):
+        x, y = center
+        for index, name in enumerate(self.region_names[1:], 1):
+            (x_min, x_max), (y_min, y_max) = regions[name]['x'], regions[name]['y']
+            if x_min <= x <= x_max and y_min <= y <= y_max:
+                return index
+        return 0
+
+    def get_row(self, now, base_station):
+        """
+        :return: (rate multipliers, volume multipliers) of the slices in the region of base_station at time unit now
+        """
+        t = now % self.length
+        if t != self.tick:
+            self.tick = t
+            self.rate_row = self.rate[t].tolist()
+            self.volume_row = self.volume[t].tolist()
+        region = self.bs_regions[base_station.pk] if base_station is not None else 0
+        return self.rate_row[region], self.volume_row[region]
+
+    def sample_request_delays(self, usage_freq, slice_indices, now, base_station):
+        """
+        Time-varying counterpart of IdleScheduler.sample_request_delays, by thinning: candidate time units are
+        drawn geometrically with the max request probability of the slice, and accepted with the ratio of the
+        probability at the candidate to the max. The region is the one of base_station at the time of sampling.
+        :return: List of delays, 0 meaning a request in the current time unit
+        """
+        region = self.bs_regions[base_station.pk] if base_station is not None else 0
+        p = 1.0 - usage_freq
+        delays = []
+        for index in slice_indices:
+            q_max = min(1.0, p * self.max_rate[region, index])
+            if q_max <= 0:
+                delays.append(math.inf)
+                continue
+            log_q = math.log(1.0 - q_max) if q_max < 1 else None
+            t = now
+            while True:
+                if log_q is not None:
+                    t += int(math.log(1.0 - random.random()) // log_q)
+                if t >= self.end:
+                    delays.append(math.inf)
+                    break
+                q = min(1.0, p * self.rate[t % self.length, region, index])
+                if q >= q_max or random.random() * q_max < q:
+                    delays.append(t - now)
+                    break
+                t += 1
+        return delays
@@ -1,3 +1,29 @@
+import random
+
+import numpy as np
+
+# numpy counterparts of the distributions in random, called as f(size, *dist_params)
+NUMPY_DISTRIBUTIONS = {
+    random.randrange: lambda size, start, stop=None, step=1:
+        np.random.randint(0, start, size) if stop is None else
+        start + step * np.random.randint(0, -(-(stop - start) // step), size),
+    random.randint: lambda size, a, b: np.random.randint(a, b + 1, size),
+    random.random: lambda size: np.random.random(size),
+    random.uniform: lambda size, a, b: np.random.uniform(a, b, size),
+    random.triangular: lambda size, low=0.0, high=1.0, mode=None:
+        np.random.triangular(low, (low + high) / 2 if mode is None else mode, high, size),
+    random.betavariate: lambda size, alpha, beta: np.random.beta(alpha, beta, size),
+    random.expovariate: lambda size, lambd: np.random.exponential(1 / lambd, size),
+    random.gammavariate: lambda size, alpha, beta: np.random.gamma(alpha, beta, size),
+    random.gauss: lambda size, mu, sigma: np.random.normal(mu, sigma, size),
+    random.lognormvariate: lambda size, mu, sigma: np.random.lognormal(mu, sigma, size),
+    random.normalvariate: lambda size, mu, sigma: np.random.normal(mu, sigma, size),
+    random.vonmisesvariate: lambda size, mu, kappa: np.random.vonmises(mu, kappa, size) % (2 * np.pi),
+    random.paretovariate: lambda size, alpha: np.random.pareto(alpha, size) + 1,
+    random.weibullvariate: lambda size, alpha, beta: alpha * np.random.weibull(beta, size),
+}
+
+
 class Distributor:
     def __init__(self, name, distribution, *dist_params, divide_scale=1):
         self.name = name
@@ -16,5 +42,22 @@ class Distributor:
         y = self.distribution(*self.dist_params) / self.divide_scale
         return x, y
 
+    def generate_array(self, size):
+        """
+        Vectorized counterpart of generate_scaled, drawing from numpy.random.
+        :param size: Shape of the result
+        """
+        generator = NUMPY_DISTRIBUTIONS.get(self.distribution)
+        if generator is None:
+            raise NotImplementedError(f'No vectorized version of {self}')
+        return generator(size, *self.dist_params) / self.divide_scale
+
+    def generate_movements(self, count):
+        """
+        Vectorized counterpart of generate_movement.
+        :return: (count, 2) array of x and y displacements
+        """
+        return self.generate_array((count, 2))
+
     def __str__(self):
-        return f'[{self.name}: {self.distribution.__name__}: {self.dist_params}]'
\ No newline at end of file
+        return f'[{self.name}: {self.distribution.__name__}: {self.dist_params}]'
@@ -0,0 +1,268 @@
+"""
+Differential equivalence harness: runs a configuration with the reference engine and with a candidate engine mode
+on the same seed, compares all the per time unit series of the stats within tolerances, and reports the first
+divergent time unit and metric together with the speed-up of the candidate.
+Modes which draw or admit in another order can only match statistically. With --replications, both engines run on
+paired seeds, and the mean and std over time of each series and each per base station value are compared by the
+confidence interval of their paired differences.
+
+Usage:
+    python -m slicesim.Equivalence <config.yml> [--mode event|parallel|batched_admission]
+                                   [--candidate '{"setting": value}'] [--rtol R] [--atol A] [--repeat N]
+                                   [--replications N] [--confidence C]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import yaml
+
+from .Convergence import get_confidence_interval, DEFAULT_CONFIDENCE
+from .Replication import get_seeds
+from .Simulation import apply_overrides, run_simulation
+
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 1e-12
+# Series indexed by base station instead of time unit
+PER_BASE_STATION = 'slice_mean_loads/'
+DEFAULT_REPLICATIONS = 8
+# Statistics of the per time unit series compared over replications
+SUMMARIES = {'mean': np.nanmean, 'std': np.nanstd}
+
+# Settings of the candidate engine modes, applied over the reference configuration
+MODES = {
+    'event': {'usage_model': 'event'},
+    'parallel': {'parallel_params': {'threads': 4, 'chunk_size': 1024}},
+    'batched_admission': {'admission_params': {'mode': 'batched', 'priority': 'arrival'}},
+}
+
+
+def get_series(general_stats, per_slice_stats):
+    """
+    :return: Dict of metric name to per time unit series, and the per base station mean loads of the slices
+    """
+    series = {name: np.asarray(values, dtype=float) for name, values in general_stats.items()}
+    slice_stats, load_per_time = per_slice_stats
+    for name, values in load_per_time.items():
+        series[f'load_per_time/{name}'] = np.asarray(values, dtype=float)
+    for name, (_, _, values) in slice_stats.items():
+        series[f'{PER_BASE_STATION}{name}'] = np.asarray(values, dtype=float)
+    return series
+
+
+def compare(reference, candidate, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    :param reference:   Series of the reference run, see get_series
+    :param candidate:   Series of the candidate run
+    :return:            List of divergences, dicts with metric, axis (time or base_station), first divergent index,
+                        the values there and the max absolute difference. Ordered by index, per time unit series first.
+    """
+    divergences = []
+    for name in list(reference) + [n for n in candidate if n not in reference]:
+        ref, cand = reference.get(name), candidate.get(name)
+        axis = 'base_station' if name.startswith(PER_BASE_STATION) else 'time'
+        if ref is None or cand is None:
+            divergences.append({'metric': name, 'axis': axis, 'index': 0, 'reference': None if ref is None else 'present',
+                                'candidate': None if cand is None else 'present', 'max_abs_diff': None})
+            continue
+        n = min(len(ref), len(cand))
+        close = np.isclose(ref[:n], cand[:n], rtol=rtol, atol=atol, equal_nan=True)
+        if close.all() and len(ref) == len(cand):
+            continue
+        index = int(np.argmin(close)) if not close.all() else n
+        diff = np.abs(ref[:n] - cand[:n])
+        divergences.append({'metric': name, 'axis': axis, 'index': index,
+                            'reference': float(ref[index]) if index < len(ref) else None,
+                            'candidate': float(cand[index]) if index < len(cand) else None,
+                            'max_abs_diff': float(np.nanmax(diff)) if n > 0 else None})
+    return sorted(divergences, key=lambda d: (d['axis'] != 'time', d['index']))
+
+
+def summarize(series):
+    """
+    :return: Dict of (metric, statistic) to value: the mean and std over time of the per time unit series, and each
+             value of the per base station ones
+    """
+    result = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all nan series
+        for name, values in series.items():
+            if name.startswith(PER_BASE_STATION):
+                for i, value in enumerate(values):
+                    result[(name, f'base_station_{i}')] = float(value)
+                continue
+            for statistic, function in SUMMARIES.items():
+                result[(name, statistic)] = float(function(values)) if len(values) > 0 else float('nan')
+    return result
+
+
+def compare_replications(reference, candidate, confidence=DEFAULT_CONFIDENCE):
+    """
+    Paired comparison of replications: a statistic diverges if the confidence interval of the mean of its differences
+    over the replications leaves out 0. The confidence is Bonferroni corrected for the number of statistics.
+    :param reference:   Summaries of the reference replications, see summarize
+    :param candidate:   Summaries of the candidate replications, run on the same seeds in the same order
+    :return:            List of divergences, dicts with metric, statistic, the means over the replications, the mean
+                        difference and its confidence interval. Ordered by the size of the difference relative to the
+                        interval.
+    """
+    keys = list(dict.fromkeys(key for summary in reference + candidate for key in summary))
+    level = 1 - (1 - confidence) / max(len(keys), 1)
+    divergences = []
+    for key in keys:
+        ref = np.asarray([summary.get(key, np.nan) for summary in reference])
+        cand = np.asarray([summary.get(key, np.nan) for summary in candidate])
+        if np.array_equal(ref, cand, equal_nan=True):
+            continue
+        diff = cand - ref
+        mean, _, half_width = get_confidence_interval(diff, level)
+        if not np.isnan(diff).any() and abs(mean) <= half_width:
+            continue
+        divergences.append({'metric': key[0], 'statistic': key[1],
+                            'reference': float(np.mean(ref)), 'candidate': float(np.mean(cand)),
+                            'mean_diff': mean, 'ci_low': mean - half_width, 'ci_high': mean + half_width,
+                            'ratio': abs(mean) / half_width if half_width > 0 else float('inf')})
+    return sorted(divergences, key=lambda d: -d['ratio'])
+
+
+def timed_run(data, conf_dir, repeat=1):
+    """
+    :return: (series of the run, best wall time over repeat runs)
+    """
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            general_stats, per_slice_stats, _ = run_simulation(data, conf_dir)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        result = get_series(general_stats, per_slice_stats)
+    return result, best
+
+
+def check_equivalence(data, conf_dir='.', candidate=None, reference=None, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL,
+                      repeat=1):
+    """
+    :param candidate:   Settings overrides of the candidate engine, see MODES
+    :param reference:   Settings overrides of the reference engine, the configuration as it is if None
+    :return:            Report dict with equivalent, divergences (see compare), the first one, the wall times and
+                        the speed-up of the candidate
+    """
+    # side outputs and the cache are left out, both runs have to simulate
+    ignored = {'recorder_params': None, 'hotspot_params': None, 'cache_params': None}
+    reference_data = apply_overrides(data, dict(ignored, **(reference or {})))
+    candidate_data = apply_overrides(reference_data, candidate or {})
+    reference_series, reference_time = timed_run(reference_data, conf_dir, repeat)
+    candidate_series, candidate_time = timed_run(candidate_data, conf_dir, repeat)
+    divergences = compare(reference_series, candidate_series, rtol, atol)
+    return {'equivalent': len(divergences) == 0,
+            'first_divergence': divergences[0] if divergences else None,
+            'divergences': divergences,
+            'reference_time': reference_time,
+            'candidate_time': candidate_time,
+            'speed_up': reference_time / candidate_time if candidate_time > 0 else float('inf')}
+
+
+def run_replications(data, conf_dir, seeds):
+    """
+    :return: (summaries of the runs on the given seeds, see summarize, total wall time)
+    """
+    summaries, total = [], 0.0
+    for seed in seeds:
+        series, elapsed = timed_run(apply_overrides(data, {'seed': seed}), conf_dir)
+        summaries.append(summarize(series))
+        total += elapsed
+    return summaries, total
+
+
+def check_statistical_equivalence(data, conf_dir='.', candidate=None, reference=None,
+                                  replications=DEFAULT_REPLICATIONS, confidence=DEFAULT_CONFIDENCE):
+    """
+    Runs the reference and candidate engines on the same replication seeds, see Replication.get_seeds, and compares
+    the summaries of their series, see compare_replications.
+    :param candidate:   Settings overrides of the candidate engine, see MODES
+    :param reference:   Settings overrides of the reference engine, the configuration as it is if None
+    :return:            Report dict with equivalent, divergences (see compare_replications), the first one, the total
+                        wall times and the speed-up of the candidate
+    """
+    if replications < 2:
+        raise ValueError(f'Statistical comparison needs at least two replications, got {replications}')
+    ignored = {'recorder_params': None, 'hotspot_params': None, 'cache_params': None}
+    reference_data = apply_overrides(data, dict(ignored, **(reference or {})))
+    candidate_data = apply_overrides(reference_data, candidate or {})
+    seeds = get_seeds(reference_data['settings']['seed'], replications)
+    reference_summaries, reference_time = run_replications(reference_data, conf_dir, seeds)
+    candidate_summaries, candidate_time = run_replications(candidate_data, conf_dir, seeds)
+    divergences = compare_replications(reference_summaries, candidate_summaries, confidence)
+    return {'equivalent': len(divergences) == 0,
+            'first_divergence': divergences[0] if divergences else None,
+            'divergences': divergences,
+            'replications': replications,
+            'confidence': confidence,
+            'reference_time': reference_time,
+            'candidate_time': candidate_time,
+            'speed_up': reference_time / candidate_time if candidate_time > 0 else float('inf')}
+
+
+def print_report(report):
+    print(f'Reference: {report["reference_time"]:.3f}s, candidate: {report["candidate_time"]:.3f}s, '
+          f'speed-up: {report["speed_up"]:.2f}x')
+    if report['equivalent']:
+        print('Equivalent: all series match within the tolerances')
+        return
+    first = report['first_divergence']
+    print(f'Diverged at {first["axis"]} {first["index"]} in {first["metric"]}: '
+          f'reference={first["reference"]}, candidate={first["candidate"]}')
+    for d in report['divergences']:
+        print(f'  [{d["metric"]}] first at {d["axis"]} {d["index"]}, max abs diff: {d["max_abs_diff"]}')
+
+
+def print_statistical_report(report):
+    print(f'Reference: {report["reference_time"]:.3f}s, candidate: {report["candidate_time"]:.3f}s over '
+          f'{report["replications"]} replications, speed-up: {report["speed_up"]:.2f}x')
+    if report['equivalent']:
+        print(f'Equivalent: no statistic differs at {report["confidence"]} confidence')
+        return
+    for d in report['divergences']:
+        print(f'  [{d["metric"]}] {d["statistic"]}: reference={d["reference"]:.6g}, candidate={d["candidate"]:.6g}, '
+              f'difference in [{d["ci_low"]:.6g}, {d["ci_high"]:.6g}]')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares a candidate engine mode with the reference one.')
+    parser.add_argument('config')
+    parser.add_argument('--mode', choices=sorted(MODES), default=None)
+    parser.add_argument('--candidate', default=None, help='JSON settings overrides of the candidate, over --mode')
+    parser.add_argument('--reference', default=None, help='JSON settings overrides of the reference')
+    parser.add_argument('--rtol', type=float, default=DEFAULT_RTOL)
+    parser.add_argument('--atol', type=float, default=DEFAULT_ATOL)
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each, the best wall time is used')
+    parser.add_argument('--replications', type=int, default=None,
+                        help='compare statistically over this many paired replications instead of exactly')
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as stream:
+        data = yaml.load(stream, Loader=yaml.FullLoader)
+    candidate = dict(MODES[args.mode]) if args.mode is not None else {}
+    candidate.update(json.loads(args.candidate) if args.candidate else {})
+    reference = json.loads(args.reference) if args.reference else None
+    conf_dir = os.path.dirname(os.path.abspath(args.config))
+    if args.replications is not None:
+        report = check_statistical_equivalence(data, conf_dir, candidate, reference, args.replications,
+                                               args.confidence)
+        print_statistical_report(report)
+        sys.exit(0 if report['equivalent'] else 1)
+    report = check_equivalence(data, conf_dir, candidate, reference,
+                               args.rtol, args.atol, args.repeat)
+    print_report(report)
+    sys.exit(0 if report['equivalent'] else 1)
+
+
+if __name__ == '__main__':
+    main()
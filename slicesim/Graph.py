@@ -7,6 +7,7 @@ from matplotlib.ticker import FormatStrFormatter, FuncFormatter
 import randomcolor
 import random
 
+from .ConnectionUtils import Adjacency
 from .utils import format_bps
 
 
@@ -49,7 +50,7 @@ class Graph:
         slice_names = list(slice_load_series.keys())
         for i in range(4):
             for j in range(2):
-                if len(slice_names) is 0:
+                if len(slice_names) == 0:
                     return
                 current_slice = slice_names.pop()
                 ax = plt.subplot(self.gs[i, j])
@@ -70,7 +71,8 @@ class Graph:
         """
         Draws only base stations having a particular slice and puts a line
         between the centers if any two of them are neighbour.
-        :param connection_matrix:   Connection matrix from ConnectionUtils for a single slice.
+        :param connection_matrix:   Adjacency from ConnectionUtils.get_adjacency,
+                                    or connection matrix from ConnectionUtils for a single slice.
         :param slice_name:          Slices to be connected
         """
         self.ax = plt.subplot(self.gs[:, 0])
@@ -87,7 +89,12 @@ class Graph:
                 circle = plt.Circle(bs.coverage.center, bs.coverage.radius,
                                     fill=False, linewidth=2, alpha=0.9, color=bs.color)
                 self.ax.add_artist(circle)
-                connection_lines[bs.pk] = [i for i, x in enumerate(connection_matrix[bs.pk]) if x == 1 and i > bs.pk]
+                if isinstance(connection_matrix, Adjacency):
+                    neighbours = connection_matrix.get_neighbours(bs.pk, slice_name)
+                    connection_lines[bs.pk] = [i for i in neighbours.tolist() if i > bs.pk]
+                else:
+                    connection_lines[bs.pk] = [i for i, x in enumerate(connection_matrix[bs.pk])
+                                               if x == 1 and i > bs.pk]
 
         for src, dest in connection_lines.items():
             for target in dest:
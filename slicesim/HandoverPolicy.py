@@ -0,0 +1,465 @@
+import numpy as np
+from sklearn.neighbors import KDTree as kdt
+
+from .Kernels import decide_threshold_margin, get_candidate_loads
+from .utils import gather_rows, KDTree, LoadBalanceType, scatter_rows
+
+DEFAULT_PER_SLICE_THRESHOLD = 0.6
+DEFAULT_HAND_OVER_LOAD_MARGIN = 0.05
+DEFAULT_HYSTERESIS = 3.0  # dB
+DEFAULT_PATH_LOSS_EXPONENT = 3.5
+
+
+class HandoverContext:
+    """
+    State of all clients a handover policy decides on. Row i belongs to the client with pk i.
+    Candidates are the base stations other than the serving one covering the client, sorted by distance,
+    and padded with -1 (mask is False for the padding).
+    Loads are only filled in for policies with a load_reduction, -1 standing for no base station.
+    Rows of the clients sleeping through the time unit are left out of coverage without candidates unless the
+    policy is stateful, as they take no decision, see IdleScheduler.
+    """
+    __slots__ = ('tick', 'serving', 'in_coverage', 'current_distance', 'current_radius', 'current_load',
+                 'candidates', 'mask', 'distances', 'radii', 'candidate_load')
+
+    def __init__(self, tick, serving, in_coverage, current_distance, current_radius,
+                 candidates, mask, distances, radii):
+        self.tick = tick
+        self.serving = serving
+        self.in_coverage = in_coverage
+        self.current_distance = current_distance
+        self.current_radius = current_radius
+        self.candidates = candidates
+        self.mask = mask
+        self.distances = distances
+        self.radii = radii
+        self.current_load = None
+        self.candidate_load = None
+
+
+class HandoverPolicy:
+    """
+    Base class of handover policies.
+    A policy ranks the candidates of every client with get_scores (lower is better) and tells with
+    should_handover whether the clients in the coverage of their base station leave it for their best
+    candidate. Clients out of coverage always move to their best candidate, if any.
+    Ties are broken by distance.
+    Policies deciding for all clients at once are batched. Others decide for each client at its turn
+    with decide_client, on the live loads, see HandoverController.
+    """
+    load_reduction = None  # max or mean over the subscribed slices, if the policy uses loads
+    batched = True
+    stateful = False  # decisions depend on the previous time units, all clients are decided on in each of them
+
+    def get_scores(self, ctx):
+        raise NotImplementedError
+
+    def should_handover(self, ctx, best_scores):
+        raise NotImplementedError
+
+    def decide(self, ctx):
+        """
+        :param ctx: HandoverContext
+        :return:    Column of the chosen candidate of each client, -1 to stay with the current base station
+                    (or to have none, if the client is out of coverage)
+        """
+        n, k = ctx.candidates.shape
+        if k == 0:
+            return np.full(n, -1, dtype=np.int64)
+        scores = np.where(ctx.mask, self.get_scores(ctx), np.inf)
+        best = np.argmin(scores, axis=1)
+        best_scores = scores[np.arange(n), best]
+        move = ~ctx.in_coverage | self.should_handover(ctx, best_scores)
+        return np.where(np.isfinite(best_scores) & move, best, -1)
+
+    def __str__(self):
+        return self.__class__.__name__
+
+
+class DisabledPolicy(HandoverPolicy):
+    """
+    No load balancing: clients stay with their base station while in its coverage,
+    and move to the closest covering one otherwise.
+    """
+
+    def get_scores(self, ctx):
+        return np.zeros(ctx.candidates.shape)
+
+    def should_handover(self, ctx, best_scores):
+        return np.zeros(len(best_scores), dtype=bool)
+
+
+class LoadBalancePolicy(HandoverPolicy):
+    """
+    Candidates are ranked by the load of the slices subscribed by the client, reduced with max or mean.
+    A client hands over if the load of its base station is at least threshold and the best candidate
+    is less loaded by margin.
+    If batched, all clients decide at once on the loads measured at .25 of the previous time unit, with the
+    same decisions decide_client takes on those loads. Otherwise each client decides at its turn on the loads
+    it sees then, which include the allocations taken by the clients before it in the time unit.
+    """
+
+    def __init__(self, reduction, threshold=DEFAULT_PER_SLICE_THRESHOLD, margin=DEFAULT_HAND_OVER_LOAD_MARGIN,
+                 batched=True):
+        if reduction not in ('max', 'mean'):
+            raise NotImplementedError(f'Unknown load reduction: {reduction}')
+        self.load_reduction = reduction
+        self.threshold = threshold
+        self.margin = margin
+        self.batched = batched
+
+    def get_scores(self, ctx):
+        return ctx.candidate_load
+
+    def should_handover(self, ctx, best_scores):
+        return (ctx.current_load >= self.threshold) & (best_scores <= ctx.current_load - self.margin)
+
+    def decide(self, ctx):
+        return decide_threshold_margin(ctx.candidate_load, ctx.mask, ctx.in_coverage, ctx.current_load,
+                                       float(self.threshold), float(self.margin))
+
+    def decide_client(self, in_coverage, current_load, candidate_loads):
+        """
+        Decision of a single client, see decide.
+        :param in_coverage:     True if the client is in the coverage of its base station
+        :param current_load:    Load of its base station, -1 for none
+        :param candidate_loads: Loads of its candidates, sorted by distance
+        :return:                Position of the chosen candidate, -1 to stay
+        """
+        if len(candidate_loads) == 0:
+            return -1
+        best = min(range(len(candidate_loads)), key=candidate_loads.__getitem__)
+        if in_coverage and (current_load < self.threshold or candidate_loads[best] > current_load - self.margin):
+            return -1
+        return best
+
+    def __str__(self):
+        per_client = '' if self.batched else ', per client'
+        return f'{self.__class__.__name__}({self.load_reduction}, threshold={self.threshold}, margin={self.margin}' \
+               f'{per_client})'
+
+
+class SignalStrengthPolicy(HandoverPolicy):
+    """
+    Candidates are ranked by received signal strength, modelled with log-distance path loss relative to the
+    coverage radius, i.e. 0 dB at the coverage border. A client hands over if the best candidate is stronger
+    than its base station by hysteresis dB.
+    """
+
+    def __init__(self, hysteresis=DEFAULT_HYSTERESIS, exponent=DEFAULT_PATH_LOSS_EXPONENT):
+        self.hysteresis = hysteresis
+        self.exponent = exponent
+
+    def get_strength(self, distances, radii):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -10 * self.exponent * np.log10(np.maximum(distances, 1e-9) / radii)
+
+    def get_scores(self, ctx):
+        return -self.get_strength(ctx.distances, ctx.radii)
+
+    def should_handover(self, ctx, best_scores):
+        current = self.get_strength(ctx.current_distance, ctx.current_radius)
+        return -best_scores > current + self.hysteresis
+
+    def __str__(self):
+        return f'{self.__class__.__name__}(hysteresis={self.hysteresis}, exponent={self.exponent})'
+
+
+class TimeToTriggerPolicy(HandoverPolicy):
+    """
+    Delays the handovers of another policy until it has chosen the same target for ticks consecutive
+    time units. Clients out of coverage hand over at once.
+    """
+
+    def __init__(self, policy, ticks):
+        self.policy = policy
+        self.ticks = ticks
+        self.load_reduction = policy.load_reduction
+        self.stateful = True
+        self.target = None
+        self.count = None
+
+    def decide(self, ctx):
+        choice = self.policy.decide(ctx)
+        n = len(choice)
+        target = np.full(n, -1, dtype=np.int64)
+        chosen = choice >= 0
+        target[chosen] = ctx.candidates[np.flatnonzero(chosen), choice[chosen]]
+        if self.target is None or len(self.target) != n:
+            self.target = np.full(n, -1, dtype=np.int64)
+            self.count = np.zeros(n, dtype=np.int64)
+
+        same = chosen & (target == self.target)
+        self.count = np.where(same, self.count + 1, chosen.astype(np.int64))
+        self.target = target
+        ready = chosen & (~ctx.in_coverage | (self.count >= self.ticks))
+        self.count[ready] = 0
+        self.target[ready] = -1
+        return np.where(ready, choice, -1)
+
+    def __str__(self):
+        return f'{self.__class__.__name__}({self.policy}, ticks={self.ticks})'
+
+
+def get_policy(params=None, lb_type=LoadBalanceType.disabled, threshold=DEFAULT_PER_SLICE_THRESHOLD,
+               margin=DEFAULT_HAND_OVER_LOAD_MARGIN):
+    """
+    :param params:      handover_policy settings, the policy is built from the load balance settings if None
+    :param lb_type:     LoadBalanceType
+    :param threshold:   Load balance threshold
+    :param margin:      Load balance margin
+    :return:            HandoverPolicy
+    """
+    params = params or {}
+    name = params.get('type', lb_type.name)
+    if name == 'disabled':
+        policy = DisabledPolicy()
+    elif name in ('max', 'mean'):
+        policy = LoadBalancePolicy(name, threshold=params.get('threshold', threshold),
+                                   margin=params.get('margin', margin), batched=params.get('batched', True))
+    elif name == 'signal_strength':
+        policy = SignalStrengthPolicy(hysteresis=params.get('hysteresis', DEFAULT_HYSTERESIS),
+                                      exponent=params.get('path_loss_exponent', DEFAULT_PATH_LOSS_EXPONENT))
+    else:
+        raise NotImplementedError(f'Unknown handover policy: {name}')
+    ticks = params.get('time_to_trigger', 0)
+    if ticks > 1:
+        policy.batched = True
+        policy = TimeToTriggerPolicy(policy, ticks)
+    return policy
+
+
+class HandoverController:
+    """
+    Takes the handover decisions of all clients at once with the state at the start of each time unit.
+    Decisions are computed by the first client asking for one in a time unit, the others read theirs.
+    As allocations are released at .50, slice loads of batched policies are measured at .25 and used in the
+    next time unit. Policies which are not batched only get the candidates from the state at the start of
+    the time unit, and each client decides at its turn on the live loads of the slices.
+    Clients have no candidates in the first time unit, as the candidate lists of the k-d tree were only
+    filled from the second one on, so they get their first base station then.
+    """
+
+    def __init__(self, stat_collector, policy):
+        self.stat_collector = stat_collector
+        self.policy = policy
+        self.last_run_time = 0
+        self.next_pks = None
+        self.context = None
+        self.loads = None
+        # static topology and subscriptions, see prepare
+        self.centers = None
+        self.radii = None
+        self.values = None
+        self.grid_offset = 0
+        self.tree = None
+        self.slice_indices = None
+        self.up = None  # base stations which are up, all of them if None
+        self.action = None
+        if policy.load_reduction is not None and policy.batched:
+            self.action = stat_collector.env.process(self.iter())
+
+    def get_slice_loads(self):
+        """
+        :return: (base stations, slices) array of slice loads
+        """
+        return np.asarray([[sl.get_load() for sl in bs.slices] for bs in self.stat_collector.base_stations],
+                          dtype=float)
+
+    def get_next_base_station(self, client):
+        """
+        :return: Base station of the client in the current time unit. Might be None or the current one.
+        """
+        now = int(self.stat_collector.env.now)
+        if self.last_run_time != now:
+            self.run(now)
+        if self.context is None:
+            return client.base_station
+        pk = self.next_pks[client.pk] if self.policy.batched else self.decide_client(client)
+        return self.stat_collector.base_stations[pk] if pk >= 0 else None
+
+    def decide_client(self, client):
+        """
+        Decides on the loads of the slices at the turn of the client, as they fill up during .00.
+        :return: pk of the next base station, -1 for none
+        """
+        ctx, row = self.context, client.pk
+        candidates = ctx.candidates[row][ctx.mask[row]].tolist()
+        stations = self.stat_collector.base_stations
+        indices = client.subscribed_slice_indices
+        current_load = self.get_live_load(client.base_station, indices) if client.base_station is not None else -1
+        loads = [self.get_live_load(stations[pk], indices) for pk in candidates]
+        choice = self.policy.decide_client(ctx.in_coverage[row], current_load, loads)
+        if choice >= 0:
+            return candidates[choice]
+        return ctx.serving[row] if ctx.in_coverage[row] else -1
+
+    def get_live_load(self, station, indices):
+        """
+        :return: Current load of the slices of the station with the given indices, reduced with max or mean
+        """
+        loads = [station.slices[i].get_load() for i in indices]
+        return max(loads) if self.policy.load_reduction == 'max' else sum(loads) / len(loads)
+
+    def run(self, now):
+        self.last_run_time = now
+        ctx = self.get_context(now)
+        self.context = ctx
+        if not self.policy.batched:
+            return
+        choice = self.policy.decide(ctx)
+        next_pks = np.where(ctx.in_coverage, ctx.serving, -1)
+        chosen = choice >= 0
+        next_pks[chosen] = ctx.candidates[np.flatnonzero(chosen), choice[chosen]]
+        self.next_pks = next_pks
+
+    def set_station_state(self, pk, up):
+        """
+        Leaves the base station out of the candidates of the clients, or takes it back.
+        """
+        if self.up is None:
+            self.up = np.ones(len(self.stat_collector.base_stations), dtype=bool)
+        self.up[pk] = up
+
+    def prepare(self):
+        stats = self.stat_collector
+        adjacency, grid = stats.adjacency, stats.coverage_grid
+        if stats.topology is not None:
+            topology = stats.topology
+            self.centers, self.radii, self.values = topology.centers, topology.radii, topology.handover_values
+        else:
+            self.centers = np.asarray([bs.coverage.center for bs in stats.base_stations], dtype=float).reshape(-1, 2)
+            self.radii = np.asarray([bs.coverage.radius for bs in stats.base_stations], dtype=float)
+            # neighbour lists and grid cells are rows of a single flat array of base station pks
+            grid_stations = grid.keys % max(grid.bs_count, 1)
+            self.values = np.concatenate((adjacency.indices, grid_stations)).astype(np.int64)
+        self.grid_offset = len(adjacency.indices)
+        if len(stats.base_stations) > 0:
+            self.tree = kdt(self.centers, leaf_size=2)
+        m = max((len(c.subscribed_slice_indices) for c in stats.clients), default=0)
+        self.slice_indices = np.full((len(stats.clients), m), -1, dtype=np.int64)
+        for c in stats.clients:
+            self.slice_indices[c.pk, :len(c.subscribed_slice_indices)] = c.subscribed_slice_indices
+
+    def get_context(self, now):
+        stats = self.stat_collector
+        if self.centers is None:
+            self.prepare()
+        xs, ys, serving, _ = stats.get_client_arrays()
+        loads = None
+        fill = (False, np.inf, np.inf, -1, False, np.inf, np.inf)
+        if self.policy.load_reduction is not None and self.policy.batched:
+            loads = self.loads if self.loads is not None else self.get_slice_loads()
+            fill += (-1.0, np.inf)
+        active = self.get_active_rows(now)
+        if active is None:
+            rows = stats.executor.map_rows(lambda lo, hi: self.get_rows(xs, ys, serving, loads, lo, hi), len(xs),
+                                           fill)
+        else:
+            rows = stats.executor.map_rows(lambda lo, hi: self.get_rows(xs, ys, serving, loads, lo, hi, active),
+                                           len(active), fill)
+            rows = tuple(scatter_rows(active, values, len(xs), f) for values, f in zip(rows, fill))
+        ctx = HandoverContext(now, serving, *rows[:7])
+        if loads is not None:
+            ctx.current_load, ctx.candidate_load = rows[7:]
+        return ctx
+
+    def get_active_rows(self, now):
+        """
+        :return: pks of the clients awake in the time unit, or None to decide on all clients
+        """
+        idle_scheduler = self.stat_collector.idle_scheduler
+        if idle_scheduler is None or self.policy.stateful:
+            return None
+        awake = idle_scheduler.get_awake(now)
+        return None if awake.all() else np.flatnonzero(awake)
+
+    def get_rows(self, xs, ys, serving, loads, lo, hi, active=None):
+        """
+        Computes the rows lo:hi of the handover context, or the rows of the clients active[lo:hi] if given.
+        :return: in_coverage, current_distance, current_radius, candidates, mask, distances, radii
+                 followed by current_load and candidate_load if loads are given
+        """
+        pks = slice(lo, hi) if active is None else active[lo:hi]
+        xs, ys, serving = xs[pks], ys[pks], serving[pks]
+        in_coverage = self.stat_collector.coverage_grid.covers(xs, ys, serving)
+
+        candidates = self.get_candidates(xs, ys, serving, in_coverage)
+        mask = (candidates >= 0) & (candidates != serving[:, None])
+        idx = np.where(mask, candidates, 0)
+        if self.up is not None:
+            mask &= self.up[idx]
+        dx = self.centers[idx, 0] - xs[:, None]
+        dy = self.centers[idx, 1] - ys[:, None]
+        dist_sq = dx * dx + dy * dy
+        mask &= dist_sq <= self.radii[idx] ** 2
+        # sort the candidates by distance, keeping the order of equally distant ones
+        order = np.argsort(np.where(mask, dist_sq, np.inf), axis=1, kind='stable')
+        candidates = np.take_along_axis(np.where(mask, candidates, -1), order, axis=1)
+        mask = np.take_along_axis(mask, order, axis=1)
+        distances = np.sqrt(np.take_along_axis(dist_sq, order, axis=1))
+        radii = np.where(mask, self.radii[np.where(mask, candidates, 0)], np.inf)
+
+        has_bs = serving >= 0
+        cur = np.where(has_bs, serving, 0)
+        current_distance = np.where(has_bs, np.hypot(self.centers[cur, 0] - xs, self.centers[cur, 1] - ys), np.inf)
+        current_radius = np.where(has_bs, self.radii[cur], np.inf)
+        result = (in_coverage, current_distance, current_radius, candidates, mask, distances, radii)
+        if loads is None:
+            return result
+        slice_indices = self.slice_indices[pks]
+        current_load = np.where(has_bs, self.get_loads(loads, serving[:, None], slice_indices)[:, 0], -1)
+        return result + (current_load, self.get_loads(loads, candidates, slice_indices))
+
+    def get_candidates(self, xs, ys, serving, in_coverage):
+        """
+        Candidate base stations of each client, not yet filtered by coverage. While a client is in the coverage
+        of its base station, any other covering station overlaps it, so they are taken from the neighbours of
+        the serving station. Otherwise they are read from the coverage grid, and the k-d tree is only queried
+        (limited to KDTree.limit) outside of the grid.
+        :return: (clients, k) array of base station pks padded with -1
+        """
+        stats = self.stat_collector
+        adjacency, grid = stats.adjacency, stats.coverage_grid
+        n = len(xs)
+        cells = grid.get_cells(xs, ys)
+        use_neighbours = in_coverage
+        use_grid = ~in_coverage & (cells >= 0)
+
+        starts = np.zeros(n, dtype=np.int64)
+        counts = np.zeros(n, dtype=np.int64)
+        s = serving[use_neighbours]
+        starts[use_neighbours] = adjacency.indptr[s]
+        counts[use_neighbours] = adjacency.indptr[s + 1] - adjacency.indptr[s]
+        c = cells[use_grid]
+        starts[use_grid] = grid.cell_ptr[c] + self.grid_offset
+        counts[use_grid] = grid.cell_ptr[c + 1] - grid.cell_ptr[c]
+        candidates = gather_rows(starts, counts, self.values)
+
+        outside = np.flatnonzero(~use_neighbours & ~use_grid)
+        if len(outside) > 0 and self.tree is not None:
+            k = min(KDTree.limit or len(stats.base_stations), len(stats.base_stations))
+            closest = self.tree.query(np.column_stack((xs[outside], ys[outside])), k=k, return_distance=False)
+            if closest.shape[1] > candidates.shape[1]:
+                candidates = np.pad(candidates, ((0, 0), (0, closest.shape[1] - candidates.shape[1])),
+                                    constant_values=-1)
+            candidates[outside] = -1
+            candidates[outside, :k] = closest
+        return candidates
+
+    def get_loads(self, loads, stations, slice_indices):
+        """
+        :param loads:           (base stations, slices) array of slice loads
+        :param stations:        (clients, k) array of base station pks, -1 for none
+        :param slice_indices:   (clients, m) array of the subscribed slice indices, padded with -1
+        :return:                (clients, k) loads of the stations over the subscribed slices of each client,
+                                equal to get_live_load on the same loads
+        """
+        return get_candidate_loads(loads, stations, slice_indices, self.policy.load_reduction == 'max')
+
+    def iter(self):
+        yield self.stat_collector.env.timeout(0.25)
+        while True:
+            # .25: measure the loads
+            self.loads = self.get_slice_loads()
+            yield self.stat_collector.env.timeout(1)
@@ -0,0 +1,184 @@
+import heapq
+import json
+from collections import deque
+
+import numpy as np
+
+DEFAULT_TOP_K = 10
+DEFAULT_WINDOW = 60
+METRICS = ('load', 'blocks')
+
+
+class HotspotTracker:
+    """
+    Keeps the top k (base station, slice) pairs by mean load and by block count over a sliding window of time units.
+    Capacities of the slices mark their pairs as changed, and refused clients record blocks, so that the update at
+    .25 of each time unit only touches the pairs changed within the window:
+        the windowed load sum S of a pair changes by v(t) - v(t - window), which is the sum of the load changes of
+        the pair within the window, kept in load_delta for the pairs changed in it and zero for the others.
+    Time units before the start count with the initial loads, i.e. zero. Rankings are lazily invalidated heaps.
+    """
+
+    def __init__(self, env, base_stations, k=DEFAULT_TOP_K, window=DEFAULT_WINDOW, stream=None, interval=1,
+                 callback=None):
+        """
+        :param stream:      File the top k pairs are written to as JSON lines every interval time units
+        :param callback:    Called with the same dicts as the stream lines
+        """
+        self.env = env
+        self.k = int(k)
+        self.window = int(window)
+        self.interval = max(int(interval), 1)
+        self.callback = callback
+        self.stream = open(stream, 'w') if stream is not None else None
+
+        self.n_slices = max((len(bs.slices) for bs in base_stations), default=0)
+        n = len(base_stations) * self.n_slices
+        self.slices = [None] * n
+        self.names = [None] * n
+        # keys of the pairs whose capacity changed, filled by Capacity
+        self.dirty = set()
+        for bs in base_stations:
+            for sl in bs.slices:
+                key = self.get_key(bs, sl)
+                self.slices[key] = sl
+                self.names[key] = (bs.pk, sl.name)
+                sl.capacity.watch = (self.dirty, key)
+
+        self.load = np.zeros(n)
+        self.load_sum = np.zeros(n)
+        self.load_delta = np.zeros(n)
+        self.blocks = np.zeros(n, dtype=np.int64)
+        self.changes = deque()  # (time unit, keys, load changes)
+        self.block_log = deque()  # (time unit, keys)
+        self.active = {}  # key -> number of load changes within the window
+        self.new_blocks = []
+        self.heaps = {m: [] for m in METRICS}
+        self.versions = {m: np.zeros(n, dtype=np.int64) for m in METRICS}
+        self.action = env.process(self.iter())
+
+    def get_key(self, bs, sl):
+        return bs.pk * self.n_slices + sl.index
+
+    def record_block(self, client):
+        """
+        Counts a refused connection for the slices of the client which are not available, or for all the slices
+        it requests usage from if none is.
+        """
+        requested = [s for pos, s in enumerate(client.get_slices()) if client.usage_remaining[pos] > 0]
+        blocking = [s for s in requested if not s.is_available()] or requested
+        self.new_blocks.extend(self.get_key(client.base_station, s) for s in blocking)
+
+    def get_scores(self, metric):
+        return self.load_sum / self.window if metric == 'load' else self.blocks
+
+    def push(self, metric, keys):
+        if len(keys) == 0:
+            return
+        heap, versions = self.heaps[metric], self.versions[metric]
+        versions[keys] += 1
+        scores = self.get_scores(metric)[keys]
+        for key, score, version in zip(keys.tolist(), scores.tolist(), versions[keys].tolist()):
+            heapq.heappush(heap, (-score, key, version))
+        if len(heap) > 4 * len(self.slices) + 1024:
+            self.compact(metric)
+
+    def compact(self, metric):
+        scores, versions = self.get_scores(metric), self.versions[metric]
+        keys = np.flatnonzero(scores > 0)
+        heap = [(-s, k, v) for s, k, v in zip(scores[keys].tolist(), keys.tolist(), versions[keys].tolist())]
+        heapq.heapify(heap)
+        self.heaps[metric] = heap
+
+    def update(self, now):
+        # load changes of this time unit
+        keys = np.fromiter(self.dirty, dtype=np.int64, count=len(self.dirty))
+        self.dirty.clear()
+        if len(keys) > 0:
+            loads = np.fromiter((self.slices[k].get_load() for k in keys.tolist()), dtype=float, count=len(keys))
+            delta = loads - self.load[keys]
+            changed = delta != 0
+            keys, delta = keys[changed], delta[changed]
+            self.load[keys] = loads[changed]
+            self.load_delta[keys] += delta
+            self.changes.append((now, keys, delta))
+            for k in keys.tolist():
+                self.active[k] = self.active.get(k, 0) + 1
+        # load changes leaving the window
+        while self.changes and self.changes[0][0] <= now - self.window:
+            _, old_keys, old_delta = self.changes.popleft()
+            self.load_delta[old_keys] -= old_delta
+            for k in old_keys.tolist():
+                self.active[k] -= 1
+                if self.active[k] == 0:
+                    del self.active[k]
+                    self.load_delta[k] = 0.0  # no rounding residue for unchanged pairs
+        active = np.fromiter(self.active, dtype=np.int64, count=len(self.active))
+        self.load_sum[active] += self.load_delta[active]
+        self.push('load', active)
+
+        # blocks of this time unit and the ones leaving the window
+        block_keys = np.asarray(self.new_blocks, dtype=np.int64)
+        self.new_blocks = []
+        np.add.at(self.blocks, block_keys, 1)
+        self.block_log.append((now, block_keys))
+        changed = [block_keys]
+        while self.block_log and self.block_log[0][0] <= now - self.window:
+            _, old_keys = self.block_log.popleft()
+            np.subtract.at(self.blocks, old_keys, 1)
+            changed.append(old_keys)
+        self.push('blocks', np.unique(np.concatenate(changed)))
+
+    def get_top(self, metric, k=None):
+        """
+        :param metric:  load (mean load over the window) or blocks (block count over the window)
+        :return:        List of (base station pk, slice name, value) of the top k pairs, pairs with 0 left out
+        """
+        k = self.k if k is None else k
+        heap, versions = self.heaps[metric], self.versions[metric]
+        result, valid = [], []
+        while heap and len(result) < k:
+            entry = heapq.heappop(heap)
+            neg_score, key, version = entry
+            if version != versions[key]:
+                continue  # stale
+            valid.append(entry)
+            if neg_score < 0:
+                result.append((*self.names[key], -neg_score))
+        for entry in valid:
+            heapq.heappush(heap, entry)
+        return result
+
+    def get_summary(self):
+        return {'time': int(self.env.now), 'window': self.window,
+                **{m: [{'base_station': pk, 'slice': name, 'value': value} for pk, name, value in self.get_top(m)]
+                   for m in METRICS}}
+
+    def print_summary(self):
+        print()
+        print(50 * '-', "HOTSPOTS", 50 * '-')
+        print(f'Top {self.k} (base station, slice) pairs over the last {self.window} time units\n')
+        for metric, label in (('load', 'Mean load'), ('blocks', 'Block count')):
+            print(f'[{label}]')
+            for pk, name, value in self.get_top(metric):
+                print(f'BS_{pk} {name}: {round(value, 4)}')
+            print()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def iter(self):
+        yield self.env.timeout(0.25)
+        while True:
+            # .25: update with the changes of the time unit
+            now = int(self.env.now)
+            self.update(now)
+            if (self.stream is not None or self.callback is not None) and now % self.interval == 0:
+                summary = self.get_summary()
+                if self.stream is not None:
+                    self.stream.write(json.dumps(summary) + '\n')
+                if self.callback is not None:
+                    self.callback(summary)
+            yield self.env.timeout(1)
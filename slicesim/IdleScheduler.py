@@ -0,0 +1,139 @@
+import heapq
+import math
+import random
+
+import numpy as np
+
+
+def sample_request_delays(usage_freq, count):
+    """
+    Samples the number of time units until the next usage request of each slice of an idle client.
+    In the polling model a slice requests usage in a time unit with probability (1 - usage_freq),
+    so the waiting time is geometrically distributed.
+    :param usage_freq:  Usage frequency of the client
+    :param count:       Number of subscribed slices
+    :return:            List of delays, 0 meaning a request in the current time unit
+    """
+    if usage_freq <= 0:
+        return [0] * count
+    if usage_freq >= 1:
+        return [math.inf] * count
+    log_q = math.log(usage_freq)
+    return [int(math.log(1.0 - random.random()) // log_q) for _ in range(count)]
+
+
+class IdleScheduler:
+    """
+    Event driven usage model.
+    Idle clients (disconnected and without pending usage) are put to sleep until the time unit of their
+    next usage request instead of waking up at each quarter time unit. While they sleep, this scheduler
+    moves them and wakes them up at the next time unit if they cross a coverage boundary, i.e. leave the
+    coverage of their base station or enter a covered area without having a base station.
+    Sleeping and waking a client costs more than a polling step, so this only pays off when clients are idle
+    for long stretches, i.e. with usage frequencies close to 1.
+    Sleeping clients are moved at once, with the displacements of each mobility pattern drawn from numpy.random.
+    """
+
+    def __init__(self, env, stat_collector, num_clients):
+        """
+        :param num_clients: Number of clients, pks are rows of wake_times
+        """
+        self.env = env
+        self.stat_collector = stat_collector
+        self.sleeping = {}  # client pk -> [client, wake up event, wake up time, requested slice positions]
+        self.queue = []  # heap of (wake up time, client pk)
+        # time unit each client wakes up at, clients with one up to the current time unit are awake
+        self.wake_times = np.zeros(num_clients)
+        # mobility patterns of the clients and the index of the pattern of each client, see move
+        self.patterns = None
+        self.pattern_indices = None
+        self.action = env.process(self.iter())
+
+    def get_awake(self, tick):
+        """
+        :return: Boolean array, True for the clients awake in the time unit, woken up later in it included
+        """
+        return self.wake_times <= tick
+
+    def sleep(self, client, delay, requested):
+        """
+        :param client:      Idle client to be put to sleep
+        :param delay:       Number of time units to sleep
+        :param requested:   Positions of the slices to request usage from at wake up
+        :return:            Event that is triggered with the requested positions, or None if the client
+                            is woken up due to a coverage change.
+        """
+        event = self.env.event()
+        wake_at = int(self.env.now) + delay
+        self.sleeping[client.pk] = [client, event, wake_at, requested]
+        self.wake_times[client.pk] = wake_at
+        heapq.heappush(self.queue, (wake_at, client.pk))
+        return event
+
+    def wake_due(self):
+        now = int(self.env.now)
+        while self.queue and self.queue[0][0] <= now:
+            wake_at, pk = heapq.heappop(self.queue)
+            entry = self.sleeping.get(pk)
+            if entry is None or entry[2] != wake_at:
+                continue  # rescheduled earlier
+            del self.sleeping[pk]
+            entry[1].succeed(entry[3])
+
+    def move_sleeping(self):
+        if len(self.sleeping) == 0:
+            return
+        stats = self.stat_collector
+        rows = np.flatnonzero(self.wake_times > int(self.env.now))
+        if not stats.mobility.is_vectorized():
+            self.move(rows)
+
+        positions = stats.get_positions()
+        xs, ys = positions[rows, 0], positions[rows, 1]
+        serving = stats.get_serving(rows)
+        grid = stats.coverage_grid
+        crossed = (serving >= 0) & ~grid.covers(xs, ys, serving)
+        # clients without a base station wake up in covered areas, and outside of the raster
+        none = serving < 0
+        crossed[none] = (grid.get_cells(xs[none], ys[none]) < 0) | grid.covers_any(xs[none], ys[none])
+
+        self.wake(rows[crossed].tolist(), int(self.env.now) + 1)
+
+    def move(self, rows):
+        """
+        Moves the clients at rows, drawing the displacements of each mobility pattern at once, as DistributionModel.
+        """
+        if self.patterns is None:
+            clients = self.stat_collector.clients
+            self.patterns = list({id(c.mobility_pattern): c.mobility_pattern for c in clients}.values())
+            index = {id(pattern): i for i, pattern in enumerate(self.patterns)}
+            self.pattern_indices = np.fromiter((index[id(c.mobility_pattern)] for c in clients), dtype=np.int64,
+                                               count=len(clients))
+        positions = self.stat_collector.mobility.positions
+        indices = self.pattern_indices[rows]
+        for i, pattern in enumerate(self.patterns):
+            group = rows[indices == i]
+            if len(group) > 0:
+                positions[group] += pattern.generate_movements(len(group))
+
+    def wake(self, pks, tick):
+        """
+        Wakes the sleeping clients among pks up at tick at the latest, without a usage request.
+        """
+        for pk in pks:
+            entry = self.sleeping.get(pk)
+            if entry is not None and entry[2] > tick:
+                entry[2] = tick
+                entry[3] = None
+                self.wake_times[pk] = tick
+                heapq.heappush(self.queue, (tick, pk))
+
+    def iter(self):
+        while True:
+            # .00: wake up clients, they act in the same time unit
+            self.wake_due()
+            yield self.env.timeout(0.75)
+
+            # .75: move sleeping clients
+            self.move_sleeping()
+            yield self.env.timeout(0.25)
@@ -0,0 +1,218 @@
+"""
+Local job server running simulations of a configuration with overrides on a pool of warm worker processes.
+Jobs are sent as JSON lines {"id": ..., "overrides": {"seed": 3, "num_clients": 1000, ...}} and the results
+are streamed back as JSON lines as they finish, see handle_connection.
+
+Usage:
+    python -m slicesim.JobServer <config.yml> [--socket path | --port N] [--workers N] [--max-queue N]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+
+import numpy as np
+import yaml
+
+from .Replication import get_series
+from .ResultCache import get_cache
+from .Simulation import apply_overrides, run_simulation
+from .Topology import Topology
+
+DEFAULT_MAX_QUEUE = 64
+
+# State of a worker process, set once by init_worker
+_worker_data = None
+_worker_conf_dir = None
+_worker_topology = None
+
+
+def get_summary(settings, general_stats, per_slice_stats):
+    """
+    :return: Mean of each metric after the warmup and cooldown, and the number of time units collected
+    """
+    summary = {name: float(np.mean(values)) if len(values) > 0 else None
+               for name, values in get_series(settings, general_stats, per_slice_stats).items()}
+    summary['time_units'] = len(general_stats['coverage_ratio'])
+    return summary
+
+
+def init_worker(data, conf_dir, descriptor):
+    """
+    Keeps the parsed configuration in the worker, and attaches the topology of its base stations.
+    """
+    global _worker_data, _worker_conf_dir, _worker_topology
+    _worker_data = data
+    _worker_conf_dir = conf_dir
+    _worker_topology = Topology.attach(descriptor)
+
+
+def run_job(overrides):
+    data = apply_overrides(_worker_data, overrides)
+    settings = data['settings']
+    settings.pop('recorder_params', None)  # jobs would write to the same recording
+    settings.pop('hotspot_params', None)  # and to the same hotspot stream
+    cache, refresh = get_cache(settings)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        general_stats, per_slice_stats, simulation = run_simulation(data, _worker_conf_dir, cache=cache,
+                                                                    refresh=refresh, topology=_worker_topology)
+    return {'summary': get_summary(settings, general_stats, per_slice_stats),
+            'cached': simulation is None, 'elapsed': time.perf_counter() - start}
+
+
+def ping():
+    return os.getpid()
+
+
+class JobServer:
+    """
+    Runs jobs on a process pool of workers, at most workers at a time and max_queue waiting.
+    Workers are started and initialized with the configuration before the server accepts connections.
+    The topology of the base stations is built once and shared by the workers, see Topology.
+    """
+
+    def __init__(self, data, conf_dir='.', workers=None, max_queue=DEFAULT_MAX_QUEUE):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.topology = Topology.from_data(data, conf_dir)
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                                           initargs=(data, conf_dir, self.topology.pack()))
+        self.running = None
+        self.pending = 0
+
+    async def warm_up(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, ping) for _ in range(self.workers)))
+        self.running = asyncio.Semaphore(self.workers)
+
+    async def submit(self, overrides):
+        """
+        :return: Result of run_job
+        :raise RuntimeError: If the queue is full
+        """
+        if self.pending >= self.workers + self.max_queue:
+            raise RuntimeError('Queue is full')
+        self.pending += 1
+        try:
+            async with self.running:
+                return await asyncio.get_running_loop().run_in_executor(self.pool, run_job, overrides)
+        finally:
+            self.pending -= 1
+
+    async def handle_connection(self, reader, writer):
+        """
+        Each line read is a job, answered by a queued line and by a done or error line once finished.
+        Jobs of a connection run concurrently, the connection is closed after the last one once the client is done.
+        """
+        lock = asyncio.Lock()
+
+        async def send(message):
+            async with lock:
+                writer.write((json.dumps(message) + '\n').encode('utf-8'))
+                await writer.drain()
+
+        async def run(job_id, overrides):
+            try:
+                result = await self.submit(overrides)
+            except Exception as e:
+                await send({'id': job_id, 'status': 'error', 'error': f'{type(e).__name__}: {e}'})
+            else:
+                await send(dict(result, id=job_id, status='done'))
+
+        tasks = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                job_id, overrides = job.get('id'), job.get('overrides') or {}
+            except (ValueError, AttributeError) as e:
+                await send({'id': None, 'status': 'error', 'error': f'Invalid job: {e}'})
+                continue
+            await send({'id': job_id, 'status': 'queued'})
+            tasks.append(asyncio.ensure_future(run(job_id, overrides)))
+        await asyncio.gather(*tasks)
+        writer.close()
+        await writer.wait_closed()
+
+    async def serve(self, socket_path=None, host='127.0.0.1', port=None):
+        await self.warm_up()
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self):
+        self.pool.shutdown()
+        self.topology.unlink()
+
+
+def submit_jobs(jobs, socket_path=None, host='127.0.0.1', port=None, callback=None):
+    """
+    Sends jobs to a running server and waits until all of them are finished.
+    :param jobs:        List of dicts with id and overrides
+    :param callback:    Called with each answer of the server as it arrives
+    :return:            Answers of the server, in order of arrival
+    """
+    async def communicate():
+        if socket_path is not None:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        for job in jobs:
+            writer.write((json.dumps(job) + '\n').encode('utf-8'))
+        await writer.drain()
+        writer.write_eof()
+        messages = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if callback is not None:
+                callback(message)
+            messages.append(message)
+        writer.close()
+        await writer.wait_closed()
+        return messages
+
+    return asyncio.run(communicate())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs simulations of a configuration on warm worker processes.')
+    parser.add_argument('config')
+    parser.add_argument('--socket', default=None, help='Unix socket path, localhost TCP is used if not given')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as stream:
+        data = yaml.load(stream, Loader=yaml.FullLoader)
+    server = JobServer(data, os.path.dirname(os.path.abspath(args.config)), workers=args.workers,
+                       max_queue=args.max_queue)
+    print(f'Serving {args.config} on {args.socket or f"127.0.0.1:{args.port}"} with {server.workers} workers')
+    # the shared topology is removed on termination as well
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(server.serve(socket_path=args.socket, port=args.port))
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Kernels of the per client inner loops, over flat arrays. They are compiled with numba if it is installed,
+unless the environment variable SLICE_SIM_JIT is 0, and run with NumPy otherwise (plain Python for the
+sequential admission, which has no array form). Both give identical results: the compiled loops perform the
+same floating point operations in the same order, sums included, see pairwise_sum.
+"""
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+JIT = numba is not None and os.environ.get('SLICE_SIM_JIT', '1') != '0'
+PAIRWISE_BLOCKSIZE = 128
+
+
+def jit(function):
+    return numba.njit(cache=True)(function) if JIT else function
+
+
+def admit_in_order_python(order, ptr, keys, needed, headroom):
+    """
+    Sequential admission of batched requests, see AdmissionControl.
+    :param order:       Order the requests are resolved in
+    :param ptr:         Slices of request i are keys[ptr[i]:ptr[i + 1]]
+    :param keys:        Index of each (base station, slice) in headroom
+    :param needed:      Aligned with keys, True if usage is requested from the slice
+    :param headroom:    Number of clients each (base station, slice) can still admit, see get_headrooms
+    :return:            Boolean array, True if request i is admitted
+    """
+    ptr, keys, needed, headroom = ptr.tolist(), keys.tolist(), needed.tolist(), headroom.tolist()
+    admitted = [False] * (len(ptr) - 1)
+    for i in order.tolist():
+        lo, hi = ptr[i], ptr[i + 1]
+        if all(headroom[keys[j]] > 0 for j in range(lo, hi) if needed[j]):
+            for j in range(lo, hi):
+                headroom[keys[j]] -= 1
+            admitted[i] = True
+    return np.asarray(admitted, dtype=bool)
+
+
+def admit_in_order_loop(order, ptr, keys, needed, headroom):
+    headroom = headroom.copy()
+    admitted = np.zeros(len(ptr) - 1, dtype=np.bool_)
+    for i in order:
+        lo, hi = ptr[i], ptr[i + 1]
+        available = True
+        for j in range(lo, hi):
+            if needed[j] and headroom[keys[j]] <= 0:
+                available = False
+                break
+        if available:
+            for j in range(lo, hi):
+                headroom[keys[j]] -= 1
+            admitted[i] = True
+    return admitted
+
+
+def get_candidate_loads_numpy(loads, stations, slice_indices, use_max):
+    """
+    :param loads:           (base stations, slices) array of slice loads
+    :param stations:        (clients, k) array of base station pks, -1 for none
+    :param slice_indices:   (clients, m) array of the subscribed slice indices of each client, in the order of
+                            its subscription, padded with -1. Means are summed in that order, as by the clients.
+    :param use_max:         Reduce the loads of the subscribed slices with max, mean otherwise
+    :return:                (clients, k) loads of the stations over the subscribed slices of each client
+    """
+    stations = np.where(stations >= 0, stations, 0)
+    result = np.full(stations.shape, -np.inf) if use_max else np.zeros(stations.shape)
+    for j in range(slice_indices.shape[1]):
+        valid = slice_indices[:, j, None] >= 0
+        values = loads[stations, np.where(valid, slice_indices[:, j, None], 0)]
+        if use_max:
+            result = np.maximum(result, np.where(valid, values, -np.inf))
+        else:
+            result += np.where(valid, values, 0.0)
+    if use_max:
+        return result
+    return result / np.maximum((slice_indices >= 0).sum(axis=1), 1)[:, None]
+
+
+def get_candidate_loads_loop(loads, stations, slice_indices, use_max):
+    n, k = stations.shape
+    m = slice_indices.shape[1]
+    result = np.empty((n, k))
+    for i in range(n):
+        count = 0
+        for s in range(m):
+            if slice_indices[i, s] >= 0:
+                count += 1
+        for j in range(k):
+            station = max(stations[i, j], 0)
+            if use_max:
+                value = -np.inf
+                for s in range(m):
+                    if slice_indices[i, s] >= 0 and loads[station, slice_indices[i, s]] > value:
+                        value = loads[station, slice_indices[i, s]]
+            else:
+                value = 0.0
+                for s in range(m):
+                    value += loads[station, slice_indices[i, s]] if slice_indices[i, s] >= 0 else 0.0
+                value /= max(count, 1)
+            result[i, j] = value
+    return result
+
+
+def decide_threshold_margin_numpy(candidate_load, mask, in_coverage, current_load, threshold, margin):
+    """
+    Decisions of LoadBalancePolicy: the least loaded candidate, taken if the client is out of coverage, or if the
+    load of its base station is at least threshold and the candidate is less loaded by margin.
+    :return: Column of the chosen candidate of each client, -1 for none, see HandoverPolicy.decide
+    """
+    n, k = candidate_load.shape
+    if k == 0:
+        return np.full(n, -1, dtype=np.int64)
+    scores = np.where(mask, candidate_load, np.inf)
+    best = np.argmin(scores, axis=1)
+    best_scores = scores[np.arange(n), best]
+    move = ~in_coverage | ((current_load >= threshold) & (best_scores <= current_load - margin))
+    return np.where(np.isfinite(best_scores) & move, best, -1)
+
+
+def decide_threshold_margin_loop(candidate_load, mask, in_coverage, current_load, threshold, margin):
+    n, k = candidate_load.shape
+    result = np.full(n, -1, dtype=np.int64)
+    for i in range(n):
+        best, best_score = 0, np.inf
+        for j in range(k):
+            if mask[i, j] and candidate_load[i, j] < best_score:
+                best, best_score = j, candidate_load[i, j]
+        if not np.isfinite(best_score):
+            continue
+        if not in_coverage[i] or (current_load[i] >= threshold and best_score <= current_load[i] - margin):
+            result[i] = best
+    return result
+
+
+def water_fill(capacity, demands, weights=None):
+    """
+    Weighted max-min fair allocation by water-filling: the allocation of each client is
+    min(demand, weight * level), the level being the highest one the capacity allows.
+    Share unused by clients with small demands is spread over the others.
+    :param capacity:    Capacity to be shared
+    :param demands:     Array of demands
+    :param weights:     Array of weights, all equal if None
+    :return:            Array of allocations
+    """
+    demands = np.asarray(demands, dtype=float)
+    n = len(demands)
+    if n == 0 or demands.sum() <= capacity:
+        return demands.copy()
+    if capacity <= 0:
+        return np.zeros(n)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    ratio = demands / weights
+    order = np.argsort(ratio, kind='stable')
+    d, w, r = demands[order], weights[order], ratio[order]
+    # the level if the first i clients are fully served and the rest get weight * level
+    served = np.concatenate(([0.0], np.cumsum(d)[:-1]))
+    rest = np.cumsum(w[::-1])[::-1]
+    level = (capacity - served) / rest
+    i = int(np.argmax(r > level))
+    result = np.empty(n)
+    result[order] = np.where(np.arange(n) < i, d, w * level[i])
+    return result
+
+
+def water_fill_groups_numpy(capacities, ptr, demands, weights):
+    """
+    Water-filling of many groups, scaled down to the capacity if rounding exceeds it, see Scheduler.
+    :param capacities:  Capacity of each group
+    :param ptr:         Demands and weights of group g are demands[ptr[g]:ptr[g + 1]]
+    :return:            Array of allocations, aligned with demands
+    """
+    result = np.empty(len(demands))
+    for g in range(len(capacities)):
+        lo, hi = ptr[g], ptr[g + 1]
+        amounts = water_fill(capacities[g], demands[lo:hi], weights[lo:hi])
+        total = amounts.sum()
+        if total > capacities[g] > 0:
+            amounts *= capacities[g] / total
+        result[lo:hi] = amounts
+    return result
+
+
+def block_sum(a, lo, n):
+    """
+    Sum of a[lo:lo + n] for n <= PAIRWISE_BLOCKSIZE, unrolled by 8 as in NumPy.
+    """
+    if n < 8:
+        result = 0.0
+        for i in range(lo, lo + n):
+            result += a[i]
+        return result
+    r = a[lo:lo + 8].copy()
+    i = 8
+    while i < n - n % 8:
+        for j in range(8):
+            r[j] += a[lo + i + j]
+        i += 8
+    result = ((r[0] + r[1]) + (r[2] + r[3])) + ((r[4] + r[5]) + (r[6] + r[7]))
+    while i < n:
+        result += a[lo + i]
+        i += 1
+    return result
+
+
+def pairwise_sum(a, lo, n):
+    """
+    Sum of a[lo:lo + n] in the order of the pairwise summation of NumPy, so that compiled sums match ndarray.sum:
+    ranges above PAIRWISE_BLOCKSIZE are split in halves (multiples of 8) summed separately. The recursion is
+    unrolled with a stack, as recursive functions are not cached by numba.
+    """
+    if n <= PAIRWISE_BLOCKSIZE:
+        return block_sum(a, lo, n)
+    # ranges being split, whether their first half is summed, and its sum
+    los = np.empty(64, dtype=np.int64)
+    ns = np.empty(64, dtype=np.int64)
+    halves = np.zeros(64, dtype=np.bool_)
+    sums = np.zeros(64)
+    top = 0
+    los[0], ns[0], halves[0] = lo, n, False
+    while True:
+        # descend into the first halves down to a block
+        while ns[top] > PAIRWISE_BLOCKSIZE:
+            half = ns[top] // 2
+            half -= half % 8
+            los[top + 1], ns[top + 1], halves[top + 1] = los[top], half, False
+            top += 1
+        value = block_sum(a, los[top], ns[top])
+        top -= 1
+        # combine with the finished first halves, then continue with the next second half
+        while top >= 0 and halves[top]:
+            value = sums[top] + value
+            top -= 1
+        if top < 0:
+            return value
+        sums[top] = value
+        halves[top] = True
+        half = ns[top] // 2
+        half -= half % 8
+        los[top + 1], ns[top + 1], halves[top + 1] = los[top] + half, ns[top] - half, False
+        top += 1
+
+
+def water_fill_groups_loop(capacities, ptr, demands, weights):
+    result = np.empty(len(demands))
+    for g in range(len(capacities)):
+        lo, hi = ptr[g], ptr[g + 1]
+        n = hi - lo
+        capacity = capacities[g]
+        if n == 0:
+            continue
+        if pairwise_sum(demands, lo, n) <= capacity:
+            result[lo:hi] = demands[lo:hi]
+            continue
+        if capacity <= 0:
+            result[lo:hi] = 0.0
+            continue
+        ratio = demands[lo:hi] / weights[lo:hi]
+        order = np.argsort(ratio, kind='mergesort')
+        served = np.empty(n)
+        rest = np.empty(n)
+        total = 0.0
+        for j in range(n):
+            served[j] = total
+            total += demands[lo + order[j]]
+        total = 0.0
+        for j in range(n - 1, -1, -1):
+            total += weights[lo + order[j]]
+            rest[j] = total
+        first = 0
+        for j in range(n):
+            if ratio[order[j]] > (capacity - served[j]) / rest[j]:
+                first = j
+                break
+        level = (capacity - served[first]) / rest[first]
+        amounts = np.empty(n)
+        for j in range(n):
+            c = order[j]
+            amounts[c] = demands[lo + c] if j < first else weights[lo + c] * level
+        total = pairwise_sum(amounts, 0, n)
+        if total > capacity > 0:
+            amounts *= capacity / total
+        result[lo:hi] = amounts
+    return result
+
+
+if JIT:
+    block_sum = jit(block_sum)
+    pairwise_sum = jit(pairwise_sum)
+    admit_in_order = jit(admit_in_order_loop)
+    get_candidate_loads = jit(get_candidate_loads_loop)
+    decide_threshold_margin = jit(decide_threshold_margin_loop)
+    water_fill_groups = jit(water_fill_groups_loop)
+else:
+    admit_in_order = admit_in_order_python
+    get_candidate_loads = get_candidate_loads_numpy
+    decide_threshold_margin = decide_threshold_margin_numpy
+    water_fill_groups = water_fill_groups_numpy
@@ -0,0 +1,178 @@
+import numpy as np
+
+BOUNDARY_POLICIES = ('none', 'reflect', 'wrap', 'remove')
+
+
+class DistributionModel:
+    """
+    Independent x/y displacements per time unit drawn from the mobility pattern of each client.
+    """
+
+    def __init__(self, patterns, pattern_indices):
+        """
+        :param patterns:        List of mobility pattern Distributors
+        :param pattern_indices: Index of the mobility pattern of each client
+        """
+        self.patterns = patterns
+        self.groups = [np.flatnonzero(pattern_indices == i) for i in range(len(patterns))]
+
+    def step(self, positions, tick, executor=None):
+        for pattern, group in zip(self.patterns, self.groups):
+            if len(group) > 0:
+                positions[group] += pattern.generate_movements(len(group))
+
+
+class RandomWaypointModel:
+    """
+    Each client walks to a uniformly chosen waypoint in the area with a uniformly chosen speed,
+    pauses there for a uniformly chosen number of time units and picks the next waypoint.
+    """
+
+    def __init__(self, count, area, speed=(1, 5), pause=(0, 0)):
+        self.area = area
+        self.speed_range = speed
+        self.pause_range = pause
+        self.waypoints = self.generate_waypoints(count)
+        self.speeds = np.random.uniform(*self.speed_range, count)
+        self.pauses = np.zeros(count, dtype=np.int64)
+
+    def generate_waypoints(self, count):
+        (x_min, x_max), (y_min, y_max) = self.area
+        return np.column_stack((np.random.uniform(x_min, x_max, count), np.random.uniform(y_min, y_max, count)))
+
+    def step(self, positions, tick, executor=None):
+        if executor is None:
+            arrived = self.move(positions, 0, len(positions))
+        else:
+            arrived = np.concatenate(executor.map(lambda lo, hi: self.move(positions, lo, hi), len(positions)))
+
+        # new waypoints for the arrived clients, drawn in order
+        idx = np.flatnonzero(arrived)
+        if len(idx) > 0:
+            self.waypoints[idx] = self.generate_waypoints(len(idx))
+            self.speeds[idx] = np.random.uniform(*self.speed_range, len(idx))
+            self.pauses[idx] = np.random.randint(self.pause_range[0], self.pause_range[1] + 1, len(idx))
+
+    def move(self, positions, lo, hi):
+        """
+        Moves the clients lo:hi towards their waypoints.
+        :return: Boolean array, True for the clients arrived at their waypoint
+        """
+        pauses = self.pauses[lo:hi]
+        paused = pauses > 0
+        pauses[paused] -= 1
+
+        moving = ~paused
+        rows = positions[lo:hi]
+        delta = self.waypoints[lo:hi][moving] - rows[moving]
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        speed = self.speeds[lo:hi][moving]
+        arrived = dist <= speed
+        ratio = np.where(arrived, 1.0, speed / np.where(dist > 0, dist, 1.0))
+        rows[moving] += delta * ratio[:, None]
+
+        result = np.zeros(hi - lo, dtype=bool)
+        result[np.flatnonzero(moving)[arrived]] = True
+        return result
+
+
+class TraceModel:
+    """
+    Replays recorded positions from a .npy file of shape (time units, clients, 2).
+    The file is memory-mapped, so only the frames in use are loaded.
+    """
+
+    def __init__(self, filename, count, loop=False):
+        self.trace = np.load(filename, mmap_mode='r')
+        if self.trace.ndim != 3 or self.trace.shape[2] != 2:
+            raise ValueError(f'Trace must be of shape (time units, clients, 2), found {self.trace.shape}')
+        if self.trace.shape[1] < count:
+            raise ValueError(f'Trace has {self.trace.shape[1]} clients, {count} needed')
+        self.count = count
+        self.loop = loop
+
+    def get_frame(self, tick):
+        length = self.trace.shape[0]
+        tick = tick % length if self.loop else min(tick, length - 1)
+        return self.trace[tick, :self.count]
+
+    def step(self, positions, tick, executor=None):
+        positions[:] = self.get_frame(tick + 1)
+
+
+class Mobility:
+    """
+    Positions of all clients, kept in a single (clients, 2) array.
+    If a mobility model is given, all positions are advanced at once at .75 of each time unit and the
+    boundary policy is applied with respect to the area. Otherwise clients move themselves.
+    Boundary policies:
+        none:       clients may leave the area
+        reflect:    clients bounce back from the borders
+        wrap:       clients leaving from one side enter from the opposite one
+        remove:     clients leaving the area are removed from the simulation
+    """
+
+    def __init__(self, env, positions, area=None, model=None, boundary='none', executor=None):
+        if boundary not in BOUNDARY_POLICIES:
+            raise NotImplementedError(f'Unknown boundary policy: {boundary}')
+        if boundary != 'none' and area is None:
+            raise ValueError(f'Boundary policy {boundary} needs an area')
+        self.env = env
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.area = area
+        self.model = model
+        self.boundary = boundary
+        self.executor = executor  # runs the model and the boundary policy in chunks, see ChunkExecutor
+        self.removed = np.zeros(len(self.positions), dtype=bool)
+        self.action = None
+        if model is not None:
+            self.set_model(model)
+
+    def set_model(self, model):
+        self.model = model
+        if self.action is None:
+            self.action = self.env.process(self.iter())
+
+    def is_vectorized(self):
+        return self.model is not None
+
+    def is_removed(self, row):
+        return self.removed[row]
+
+    def step(self):
+        active = ~self.removed
+        if active.all():
+            self.model.step(self.positions, int(self.env.now), self.executor)
+        else:
+            # removed clients stay where they left the area
+            frozen = self.positions[~active].copy()
+            self.model.step(self.positions, int(self.env.now), self.executor)
+            self.positions[~active] = frozen
+        self.apply_boundary()
+
+    def apply_boundary(self):
+        if self.boundary == 'none':
+            return
+        if self.executor is None:
+            self.apply_boundary_rows(0, len(self.positions))
+        else:
+            self.executor.map(self.apply_boundary_rows, len(self.positions))
+
+    def apply_boundary_rows(self, lo, hi):
+        for axis, (low, high) in enumerate(self.area):
+            values = self.positions[lo:hi, axis]
+            width = high - low
+            if self.boundary == 'wrap':
+                values[:] = low + np.mod(values - low, width)
+            elif self.boundary == 'reflect':
+                t = np.mod(values - low, 2 * width)
+                values[:] = low + np.where(t > width, 2 * width - t, t)
+            elif self.boundary == 'remove':
+                self.removed[lo:hi] |= (values < low) | (values > high)
+
+    def iter(self):
+        yield self.env.timeout(0.75)
+        while True:
+            # .75: Move
+            self.step()
+            yield self.env.timeout(1)
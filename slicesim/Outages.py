@@ -0,0 +1,139 @@
+import heapq
+
+import numpy as np
+
+DEFAULT_MTTR = 60
+
+
+class OutageController:
+    """
+    Takes base stations down and back up, by maintenance windows and by random failures.
+    Changes of a time unit take effect at .875 of the previous one, i.e. after the clients move and before
+    the handover decisions at .00:
+        only the entries of the changed stations are updated in the coverage raster, the neighbour lists and
+        the handover candidates, see set_station_state of CoverageGrid, Adjacency and HandoverController.
+        Clients of a station taken down are then out of coverage, and are re-homed in a single batch by the
+        handover decisions of the time unit, counted as handovers or as drops if no other station covers them.
+    Random failures of a station happen after an exponential time with mean mtbf, and last an exponential time with
+    mean mttr, at least a time unit. A station is up once all its windows and failures are over.
+    Events are kept in a heap, the cost of a time unit only depends on the stations changing in it.
+    """
+
+    def __init__(self, env, stats, windows=None, mtbf=None, mttr=DEFAULT_MTTR, base_stations=None, seed=None,
+                 idle_scheduler=None):
+        """
+        :param windows:         List of dicts with base_stations, start and end (exclusive, the end of the simulation
+                                if not given) of maintenance windows
+        :param mtbf:            Mean time units between failures of a base station, no random failures if None
+        :param mttr:            Mean time units to restore a failed base station
+        :param base_stations:   pks of the base stations failing randomly, all of them if None
+        :param idle_scheduler:  Sleeping clients of the stations taken down are woken up, see IdleScheduler
+        """
+        self.env = env
+        self.stats = stats
+        self.mtbf = mtbf
+        self.mttr = mttr
+        self.idle_scheduler = idle_scheduler
+        self.rng = np.random.RandomState(seed)
+        n = len(stats.base_stations)
+        self.down = np.zeros(n, dtype=np.int64)  # number of windows and failures each station is down for
+        self.queue = []  # heap of (time unit, sequence, pk, +1 down / -1 up, random failure)
+        self.sequence = 0
+
+        self.outage_count = 0
+        self.restore_count = 0
+        self.affected_count = 0  # clients served by the stations at the time they are taken down
+        self.down_time = 0  # time units the restored stations were down, summed over the stations
+        self.down_since = {}  # pk -> time unit of the stations which are down
+
+        for window in windows or []:
+            for pk in window['base_stations']:
+                self.push(int(window['start']), pk, 1)
+                if window.get('end') is not None:
+                    self.push(int(window['end']), pk, -1)
+        if mtbf is not None:
+            for pk in (base_stations if base_stations is not None else range(n)):
+                self.push(self.get_failure_time(0), pk, 1, True)
+
+        # changes at the start are in effect before the first decisions
+        if self.queue and self.queue[0][0] <= 0:
+            self.apply(0)
+        self.action = env.process(self.iter())
+
+    def push(self, at, pk, delta, failure=False):
+        heapq.heappush(self.queue, (at, self.sequence, pk, delta, failure))
+        self.sequence += 1
+
+    def get_failure_time(self, now):
+        return now + max(int(np.ceil(self.rng.exponential(self.mtbf))), 1)
+
+    def get_repair_time(self, now):
+        return now + max(int(round(self.rng.exponential(self.mttr))), 1)
+
+    def set_station_state(self, pk, up):
+        self.stats.coverage_grid.set_station_state(pk, up)
+        self.stats.adjacency.set_station_state(pk, up)
+        self.stats.handover.set_station_state(pk, up)
+
+    def apply(self, now):
+        """
+        Applies the events of time unit now.
+        :return: (pks taken down, pks put back up)
+        """
+        was_down = {}
+        while self.queue and self.queue[0][0] <= now:
+            _, _, pk, delta, failure = heapq.heappop(self.queue)
+            was_down.setdefault(pk, self.down[pk] > 0)
+            self.down[pk] += delta
+            if failure:
+                # a failed station is repaired, and fails again after it is repaired
+                if delta > 0:
+                    self.push(self.get_repair_time(now), pk, -1, True)
+                else:
+                    self.push(self.get_failure_time(now), pk, 1, True)
+
+        taken_down = [pk for pk, down in was_down.items() if not down and self.down[pk] > 0]
+        put_up = [pk for pk, down in was_down.items() if down and self.down[pk] == 0]
+        for pk in taken_down:
+            self.set_station_state(pk, False)
+            self.down_since[pk] = now
+        for pk in put_up:
+            self.set_station_state(pk, True)
+            self.down_time += now - self.down_since.pop(pk)
+        self.outage_count += len(taken_down)
+        self.restore_count += len(put_up)
+
+        if taken_down and self.stats.clients:
+            serving = np.fromiter((c.base_station.pk if c.base_station is not None else -1
+                                   for c in self.stats.clients), dtype=np.int64, count=len(self.stats.clients))
+            affected = np.flatnonzero(np.isin(serving, taken_down))
+            self.affected_count += len(affected)
+            if self.idle_scheduler is not None:
+                self.idle_scheduler.wake(affected.tolist(), now)
+        return taken_down, put_up
+
+    def get_down(self):
+        """
+        :return: pks of the base stations which are down
+        """
+        return np.flatnonzero(self.down > 0)
+
+    def get_down_time(self):
+        """
+        :return: Time units the base stations were down until now, summed over the stations
+        """
+        now = int(self.env.now)
+        return self.down_time + sum(now - since for since in self.down_since.values())
+
+    def print_summary(self):
+        print()
+        print(50 * '-', "OUTAGES", 50 * '-')
+        print(f'Outages: {self.outage_count}, restores: {self.restore_count}, '
+              f'clients affected: {self.affected_count}')
+        print(f'Base station time units down: {self.get_down_time()}, down at the end: {len(self.down_since)}')
+
+    def iter(self):
+        while self.queue:
+            # .875 of the time unit before the events
+            yield self.env.timeout(self.queue[0][0] - 0.125 - self.env.now)
+            self.apply(self.queue[0][0])
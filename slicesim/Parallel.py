@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def concat_rows(parts, fill):
+    """
+    Concatenates the results of the chunks of a row-wise kernel.
+    Two dimensional results may have a different number of columns per chunk, narrower ones are padded.
+    :param parts:   Results of the chunks, in order
+    :param fill:    Value of the padding
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if parts[0].ndim == 2:
+        width = max(p.shape[1] for p in parts)
+        parts = [p if p.shape[1] == width else
+                 np.pad(p, ((0, 0), (0, width - p.shape[1])), constant_values=fill) for p in parts]
+    return np.concatenate(parts)
+
+
+class ChunkExecutor:
+    """
+    Runs row-wise kernels over the client arrays in chunks of a fixed size, on a thread pool if more than
+    one thread is given. Kernels are NumPy and scikit-learn routines which release the GIL.
+    Chunk boundaries only depend on chunk_size, so the results do not depend on the number of threads.
+    Kernels must not draw random numbers or touch the simulation objects, these stay in the main thread.
+    """
+
+    def __init__(self, threads=1, chunk_size=DEFAULT_CHUNK_SIZE):
+        if chunk_size <= 0:
+            raise ValueError(f'chunk_size(={chunk_size}) must be > 0.')
+        self.threads = max(int(threads), 1)
+        self.chunk_size = int(chunk_size)
+        self.pool = ThreadPoolExecutor(self.threads) if self.threads > 1 else None
+
+    def get_chunks(self, n):
+        return [(lo, min(lo + self.chunk_size, n)) for lo in range(0, n, self.chunk_size)] or [(0, 0)]
+
+    def map(self, kernel, n):
+        """
+        :param kernel:  Function of (lo, hi) computing the rows lo:hi
+        :param n:       Number of rows
+        :return:        Results of the chunks, in order
+        """
+        chunks = self.get_chunks(n)
+        if self.pool is None or len(chunks) == 1:
+            return [kernel(lo, hi) for lo, hi in chunks]
+        return list(self.pool.map(lambda c: kernel(*c), chunks))
+
+    def map_rows(self, kernel, n, fill=0):
+        """
+        Same as map, the results of the chunks are concatenated.
+        A kernel returning a tuple gives a tuple of concatenated arrays, fill being a tuple as well.
+        """
+        parts = self.map(kernel, n)
+        if isinstance(parts[0], tuple):
+            fills = fill if isinstance(fill, tuple) else (fill,) * len(parts[0])
+            return tuple(concat_rows([p[i] for p in parts], f) for i, f in enumerate(fills))
+        return concat_rows(parts, fill)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __str__(self):
+        return f'ChunkExecutor(threads={self.threads}, chunk_size={self.chunk_size})'
@@ -0,0 +1,183 @@
+import json
+import os
+
+import numpy as np
+
+# Outcomes of the sessions in the session table
+OUTCOMES = ('completed', 'handover', 'dropped', 'left', 'blocked', 'refused_after_handover', 'open')
+
+# Per time unit client snapshot columns
+SNAPSHOT_COLUMNS = (('x', np.float32), ('y', np.float32), ('base_station', np.int32),
+                    ('connected', np.bool_), ('usage', np.float64))
+SESSION_COLUMNS = (('client', np.int32), ('slice', np.int16), ('base_station', np.int32),
+                   ('start', np.int32), ('end', np.int32), ('usage', np.float64), ('outcome', np.int8))
+
+DEFAULT_CHUNK_TICKS = 100
+DEFAULT_SESSION_CHUNK = 65536
+
+
+class Recorder:
+    """
+    Streams per client data of a simulation into chunked .npy files, which can be memory-mapped.
+    A snapshot of all (or a sampled subset of) clients is taken at .25 of each time unit and written every
+    chunk_ticks time units to <directory>/snapshots/<column>/<chunk>.npy, each of shape (time units, clients).
+    Sessions, i.e. connections of a client to a slice, are written to <directory>/sessions/<column>/<chunk>.npy
+    once they end, with the usage consumed and the outcome (index in OUTCOMES). A refused connection is a session
+    of zero length. Memory use is bounded by the chunk sizes.
+    """
+
+    def __init__(self, env, stat_collector, directory, num_clients, num_slices, sample=None, seed=None,
+                 chunk_ticks=DEFAULT_CHUNK_TICKS, sessions=True):
+        """
+        :param sample:  Fraction (if <= 1) or number of the clients to be recorded, all of them if None
+        :param seed:    Seed of the sampling
+        """
+        self.env = env
+        self.stat_collector = stat_collector
+        self.directory = directory
+        self.chunk_ticks = int(chunk_ticks)
+        self.record_sessions = sessions
+
+        if sample is None:
+            clients = np.arange(num_clients)
+        else:
+            count = int(round(sample * num_clients)) if sample <= 1 else min(int(sample), num_clients)
+            clients = np.sort(np.random.RandomState(seed).choice(num_clients, count, replace=False))
+        self.clients = clients
+        # column of each client in the snapshots, -1 if not recorded
+        self.columns = np.full(num_clients, -1, dtype=np.int64)
+        self.columns[clients] = np.arange(len(clients))
+
+        self.snapshots = {name: np.zeros((self.chunk_ticks, len(clients)), dtype=dtype)
+                          for name, dtype in SNAPSHOT_COLUMNS}
+        self.snapshot_rows = 0
+        self.snapshot_chunks = 0
+
+        # open sessions of the recorded clients
+        self.session_start = np.full(len(clients), -1, dtype=np.int64)
+        self.session_usage = np.zeros((len(clients), num_slices))
+        self.sessions = {name: [] for name, _ in SESSION_COLUMNS}
+        self.session_chunks = 0
+
+        for name, _ in SNAPSHOT_COLUMNS:
+            os.makedirs(os.path.join(directory, 'snapshots', name), exist_ok=True)
+        for name, _ in SESSION_COLUMNS:
+            os.makedirs(os.path.join(directory, 'sessions', name), exist_ok=True)
+        self.action = env.process(self.iter())
+
+    def get_column(self, client):
+        return self.columns[client.pk]
+
+    def snapshot(self):
+        clients = self.stat_collector.clients
+        positions = self.stat_collector.get_positions()
+        row = self.snapshot_rows
+        self.snapshots['x'][row] = positions[self.clients, 0]
+        self.snapshots['y'][row] = positions[self.clients, 1]
+        self.snapshots['base_station'][row] = np.fromiter(
+            (clients[i].base_station.pk if clients[i].base_station is not None else -1 for i in self.clients.tolist()),
+            dtype=np.int32, count=len(self.clients))
+        self.snapshots['connected'][row] = np.fromiter((clients[i].connected for i in self.clients.tolist()),
+                                                       dtype=bool, count=len(self.clients))
+        self.snapshots['usage'][row] = np.fromiter((sum(clients[i].last_usage) for i in self.clients.tolist()),
+                                                   dtype=float, count=len(self.clients))
+        self.snapshot_rows += 1
+        if self.snapshot_rows == self.chunk_ticks:
+            self.flush_snapshots()
+
+    def flush_snapshots(self):
+        if self.snapshot_rows == 0:
+            return
+        for name, values in self.snapshots.items():
+            np.save(self.get_filename('snapshots', name, self.snapshot_chunks), values[:self.snapshot_rows])
+        self.snapshot_chunks += 1
+        self.snapshot_rows = 0
+
+    def get_filename(self, table, name, chunk):
+        return os.path.join(self.directory, table, name, f'{chunk:05d}.npy')
+
+    def open_session(self, client):
+        col = self.get_column(client)
+        if col < 0 or not self.record_sessions:
+            return
+        self.session_start[col] = int(self.env.now)
+        self.session_usage[col] = 0
+
+    def add_usage(self, client, slice_index, amount):
+        col = self.get_column(client)
+        if col < 0 or not self.record_sessions:
+            return
+        self.session_usage[col, slice_index] += amount
+
+    def close_session(self, client, outcome):
+        col = self.get_column(client)
+        if col < 0 or not self.record_sessions or self.session_start[col] < 0:
+            return
+        for s in client.get_slices():
+            self.add_session(client.pk, s.index, client.base_station.pk, self.session_start[col], int(self.env.now),
+                             self.session_usage[col, s.index], outcome)
+        self.session_start[col] = -1
+
+    def refuse_session(self, client, handover_performed):
+        col = self.get_column(client)
+        if col < 0 or not self.record_sessions:
+            return
+        now = int(self.env.now)
+        outcome = 'refused_after_handover' if handover_performed else 'blocked'
+        for s in client.get_slices():
+            self.add_session(client.pk, s.index, client.base_station.pk, now, now, 0.0, outcome)
+
+    def add_session(self, client, slice_index, base_station, start, end, usage, outcome):
+        row = (client, slice_index, base_station, start, end, usage, OUTCOMES.index(outcome))
+        for (name, _), value in zip(SESSION_COLUMNS, row):
+            self.sessions[name].append(value)
+        if len(self.sessions['client']) >= DEFAULT_SESSION_CHUNK:
+            self.flush_sessions()
+
+    def flush_sessions(self):
+        if len(self.sessions['client']) == 0:
+            return
+        for name, dtype in SESSION_COLUMNS:
+            np.save(self.get_filename('sessions', name, self.session_chunks), np.asarray(self.sessions[name], dtype=dtype))
+            self.sessions[name] = []
+        self.session_chunks += 1
+
+    def close(self):
+        """
+        Writes the remaining snapshots, the sessions still open as 'open' ones and the description of the recording.
+        """
+        clients = self.stat_collector.clients
+        for col in np.flatnonzero(self.session_start >= 0).tolist():
+            c = clients[self.clients[col]]
+            if c.base_station is None:
+                continue
+            self.close_session(c, 'open')
+        self.flush_snapshots()
+        self.flush_sessions()
+        with open(os.path.join(self.directory, 'recording.json'), 'w') as f:
+            json.dump({'clients': self.clients.tolist(),
+                       'chunk_ticks': self.chunk_ticks,
+                       'snapshot_chunks': self.snapshot_chunks,
+                       'session_chunks': self.session_chunks,
+                       'snapshot_columns': [name for name, _ in SNAPSHOT_COLUMNS],
+                       'session_columns': [name for name, _ in SESSION_COLUMNS],
+                       'outcomes': list(OUTCOMES)}, f)
+
+    def iter(self):
+        yield self.env.timeout(0.25)
+        while True:
+            # .25: snapshot
+            self.snapshot()
+            yield self.env.timeout(1)
+
+
+def load_recording(directory, table, name, mmap=True):
+    """
+    :param directory:   Directory of the recording
+    :param table:       snapshots or sessions
+    :param name:        Column name
+    :param mmap:        Memory-map the chunks instead of reading them
+    :return:            Chunks of the column, in order
+    """
+    path = os.path.join(directory, table, name)
+    return [np.load(os.path.join(path, f), mmap_mode='r' if mmap else None) for f in sorted(os.listdir(path))]
@@ -0,0 +1,128 @@
+import contextlib
+import copy
+import csv
+import multiprocessing
+import os
+
+import numpy as np
+
+from .Convergence import get_batch_means, get_confidence_interval, DEFAULT_BATCHES, DEFAULT_CONFIDENCE
+from .Simulation import run_simulation
+from .Topology import Topology
+
+COLUMNS = ('metric', 'method', 'n', 'mean', 'std', 'ci_low', 'ci_high', 'half_width')
+
+
+def get_seeds(seed, replications):
+    """
+    :return: Independent seeds of the replications, spawned from seed
+    """
+    children = np.random.SeedSequence(int(seed)).spawn(replications)
+    return [int(c.generate_state(1)[0]) for c in children]
+
+
+def truncate(series, settings):
+    """
+    Drops the warmup and cooldown periods of a per time unit series, the same time units left out of the plots.
+    """
+    simulation_time = settings['simulation_time']
+    statistics_params = settings['statistics_params']
+    left = int(simulation_time * statistics_params.get('warmup_ratio', 0))
+    right = int(simulation_time * (1 - statistics_params.get('cooldown_ratio', 0))) + 1
+    return np.asarray(series, dtype=float)[left:right]
+
+
+def get_series(settings, general_stats, per_slice_stats):
+    """
+    :return: Truncated per time unit series of the metrics of a run, the general stats and the loads of slices
+    """
+    series = {name: truncate(values, settings) for name, values in general_stats.items()}
+    for name, values in per_slice_stats[1].items():
+        series[f'slice_load/{name}'] = truncate(values, settings)
+    return series
+
+
+# Topology attached by a worker process, kept for its next replications
+_attached = {}
+
+
+def get_topology(descriptor):
+    if descriptor is None:
+        return None
+    key = descriptor['shm'] or descriptor['file']
+    if key not in _attached:
+        _attached.clear()
+        _attached[key] = Topology.attach(descriptor)
+    return _attached[key]
+
+
+def run_replication(args):
+    data, conf_dir, seed, cache, refresh, topology = args
+    data = copy.deepcopy(data)
+    settings = data['settings']
+    settings['seed'] = seed
+    settings.pop('recorder_params', None)  # replications would write to the same recording
+    settings.pop('hotspot_params', None)  # and to the same hotspot stream
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        general_stats, per_slice_stats, _ = run_simulation(data, conf_dir, cache=cache, refresh=refresh,
+                                                           topology=get_topology(topology))
+    return get_series(settings, general_stats, per_slice_stats)
+
+
+def replicate(data, conf_dir='.', replications=10, processes=None, confidence=DEFAULT_CONFIDENCE,
+              batches=DEFAULT_BATCHES, cache=None, refresh=False):
+    """
+    Runs independent replications of a configuration in parallel processes, each with a seed spawned from
+    the configured one. The mean of each metric over the time units left after the warmup and cooldown is taken
+    as one sample per replication. With a single replication, the samples are the means of batches of
+    the time units instead (batch means).
+    The topology of the base stations is built once and shared by the processes, see Topology.
+    :param processes:   Number of processes, min(replications, cpu count) if None
+    :param cache:       ResultCache, replications are cached separately as their seeds differ
+    :return:            Rows of the result table, dicts with the keys in COLUMNS
+    """
+    settings = data['settings']
+    seeds = get_seeds(settings['seed'], replications)
+    if processes is None:
+        processes = min(replications, os.cpu_count() or 1)
+    if processes > 1 and replications > 1:
+        topology = Topology.from_data(data, conf_dir)
+        descriptor = topology.pack()
+        try:
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.map(run_replication, [(data, conf_dir, seed, cache, refresh, descriptor)
+                                                     for seed in seeds])
+        finally:
+            topology.unlink()
+    else:
+        results = [run_replication((data, conf_dir, seed, cache, refresh, None)) for seed in seeds]
+
+    if replications > 1:
+        method = 'replications'
+        samples = {name: [float(np.mean(r[name])) for r in results] for name in results[0]}
+    else:
+        method = 'batch_means'
+        samples = {name: get_batch_means(values, batches) for name, values in results[0].items()}
+
+    rows = []
+    for name, values in samples.items():
+        mean, std, half_width = get_confidence_interval(values, confidence)
+        rows.append({'metric': name, 'method': method, 'n': len(values), 'mean': mean, 'std': std,
+                     'ci_low': mean - half_width, 'ci_high': mean + half_width, 'half_width': half_width})
+    return rows
+
+
+def write_table(rows, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_table(rows, confidence=DEFAULT_CONFIDENCE):
+    print(50 * '-', "REPLICATIONS", 50 * '-')
+    print(f'Mean and {round(confidence * 100, 2)}% confidence interval per metric, '
+          f'method: {rows[0]["method"] if rows else None}, samples: {rows[0]["n"] if rows else 0}\n')
+    for row in rows:
+        print(f'[{row["metric"]}] mean: {round(row["mean"], 4)}, '
+              f'ci: [{round(row["ci_low"], 4)}, {round(row["ci_high"], 4)}], std: {round(row["std"], 4)}')
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = '.slicesim_cache'
+DEFAULT_MAX_SIZE_MB = 256
+
+# Settings not affecting the results of a simulation, left out of cache keys
+IGNORED_SETTINGS = ('logging', 'log_file', 'log_stat_only', 'plotting_params', 'cache_params', 'parallel_params',
+                   'recorder_params', 'hotspot_params')
+# Keys of the configuration referring to files, whose size and modification time are part of cache keys
+FILE_KEYS = (('settings', 'mobility_params', 'trace_file'), ('base_stations_file',),
+             ('clients', 'location', 'density_map'))
+
+
+def get_file_stamp(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def get_cache_key(data, version, conf_dir='.'):
+    """
+    :param data:        Parsed YAML configuration
+    :param version:     Version of the simulation results, see Simulation.RESULT_VERSION
+    :param conf_dir:    Directory of the configuration, files referred by it are relative to this one
+    :return:            Hash of the canonical form of the configuration and the version
+    """
+    settings = {k: v for k, v in data['settings'].items() if k not in IGNORED_SETTINGS}
+    files = {}
+    for keys in FILE_KEYS:
+        filename = data
+        for key in keys:
+            filename = filename.get(key) if isinstance(filename, dict) else None
+        if filename is not None:
+            files['.'.join(keys)] = get_file_stamp(os.path.join(conf_dir, filename))
+    canonical = dict(data, settings=settings)
+    text = json.dumps([version, canonical, files], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of simulation results, one compressed .npz file per configuration.
+    Files are touched on each hit and the least recently used ones are removed once the total size
+    exceeds max_size_mb.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        os.makedirs(directory, exist_ok=True)
+
+    def get_filename(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def load(self, key):
+        """
+        :return: (general stats, per slice stats) as returned by Simulation.run, None if not cached
+        """
+        filename = self.get_filename(key)
+        try:
+            with np.load(filename, allow_pickle=False) as f:
+                result = self.decode(f)
+        except (OSError, KeyError, ValueError):
+            return None
+        os.utime(filename)
+        return result
+
+    def store(self, key, general_stats, per_slice_stats):
+        filename = self.get_filename(key)
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **self.encode(general_stats, per_slice_stats))
+        os.replace(tmp, filename)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    @staticmethod
+    def encode(general_stats, per_slice_stats):
+        arrays = {}
+        for name, series in general_stats.items():
+            arrays[f'general/{name}'] = np.asarray(series, dtype=float)
+            # counters of the last time unit are ints, kept to print the same
+            arrays[f'general_ints/{name}'] = np.asarray([i for i, v in enumerate(series) if isinstance(v, int)],
+                                                        dtype=np.int64)
+        slice_stats, load_per_time = per_slice_stats
+        arrays['slice_names'] = np.asarray(list(slice_stats), dtype=str)
+        for name, (mean, std, values) in slice_stats.items():
+            arrays[f'slice/{name}'] = np.asarray([mean, std] + list(values), dtype=float)
+        for name, series in load_per_time.items():
+            arrays[f'load_per_time/{name}'] = np.asarray(series, dtype=float)
+        return arrays
+
+    @staticmethod
+    def decode(f):
+        general_stats = {}
+        for key in f.files:
+            if key.startswith('general/'):
+                name = key[len('general/'):]
+                series = f[key].tolist()
+                for i in f[f'general_ints/{name}'].tolist():
+                    series[i] = int(series[i])
+                general_stats[name] = series
+        slice_stats, load_per_time = {}, {}
+        for name in f['slice_names'].tolist():
+            values = f[f'slice/{name}'].tolist()
+            slice_stats[name] = (values[0], values[1], values[2:])
+            if f'load_per_time/{name}' in f.files:
+                load_per_time[name] = f[f'load_per_time/{name}']
+        return general_stats, (slice_stats, load_per_time)
+
+
+def get_cache(settings):
+    """
+    :param settings:    settings of the configuration
+    :return:            (ResultCache or None if caching is disabled, True if cached results are to be refreshed)
+    Results are refreshed if cache_params.refresh is set or SLICE_SIM_REFRESH_CACHE is 1.
+    """
+    params = settings.get('cache_params') or {}
+    if not params.get('enabled', False):
+        return None, False
+    refresh = bool(params.get('refresh', False)) or os.environ.get('SLICE_SIM_REFRESH_CACHE', '0') == '1'
+    cache = ResultCache(params.get('directory', DEFAULT_CACHE_DIR), params.get('max_size_mb', DEFAULT_MAX_SIZE_MB))
+    return cache, refresh
@@ -0,0 +1,228 @@
+"""
+Generates large scenarios: base stations on a hex grid, Poisson placed or clustered macro and small cells, with
+per cell slice ratios and capacity tiers and a client density map. Base stations and the density map are written
+to a compact .npz file, referred by a small YAML configuration built from a template one.
+
+Usage:
+    python -m slicesim.ScenarioGenerator <template.yml> <output.yml> [--layout hex|poisson|clustered] [--cells N]
+"""
+import argparse
+import copy
+import math
+import os
+
+import numpy as np
+import yaml
+
+LAYOUTS = ('hex', 'poisson', 'clustered')
+DEFAULT_CAPACITY_TIERS = (20000000000, 10000000000, 5000000000)
+DEFAULT_SMALL_CELL_CAPACITY = 2000000000
+DEFAULT_RATIO_CONCENTRATION = 50
+DEFAULT_DENSITY_CELL_SIZE = 100
+MIN_RATIO = 1e-6  # slices need some capacity
+
+
+class ScenarioGenerator:
+    """
+    Base stations are added by the add_* methods. The slice ratios of each cell are drawn from a Dirichlet
+    distribution around the mean ratios, concentration controlling how close they are.
+    The command line uses the client_weight of the slices in the template as the mean ratios.
+    """
+
+    def __init__(self, area, slice_ratios, seed=None, concentration=DEFAULT_RATIO_CONCENTRATION):
+        """
+        :param area:            ((x_min, x_max), (y_min, y_max))
+        :param slice_ratios:    Dict of slice name to mean ratio
+        """
+        self.area = area
+        self.slice_names = list(slice_ratios)
+        ratios = np.asarray(list(slice_ratios.values()), dtype=float)
+        self.mean_ratios = ratios / ratios.sum()
+        self.concentration = concentration
+        self.rng = np.random.RandomState(seed)
+        self.cells = []  # (x, y, coverage, capacity) arrays of each add_* call
+        self.hotspots = []  # (x, y, radius) of the clusters, dense areas of the density map
+
+    def get_size(self):
+        (x_min, x_max), (y_min, y_max) = self.area
+        return x_max - x_min, y_max - y_min
+
+    def get_capacities(self, n, capacity_tiers, tier_weights=None):
+        tiers = np.atleast_1d(np.asarray(capacity_tiers, dtype=float))
+        p = None if tier_weights is None else np.asarray(tier_weights, dtype=float) / np.sum(tier_weights)
+        return tiers[self.rng.choice(len(tiers), n, p=p)]
+
+    def add_cells(self, xs, ys, coverage, capacities):
+        (x_min, x_max), (y_min, y_max) = self.area
+        inside = (xs >= x_min) & (xs <= x_max) & (ys >= y_min) & (ys <= y_max)
+        xs, ys, capacities = xs[inside], ys[inside], capacities[inside]
+        self.cells.append((xs, ys, np.full(len(xs), float(coverage)), capacities))
+        return len(xs)
+
+    def add_hex_grid(self, cells, capacity_tiers=DEFAULT_CAPACITY_TIERS, tier_weights=None):
+        """
+        Places about cells base stations at the centers of a hex grid, covering their hexagons.
+        :return: Number of base stations added
+        """
+        width, height = self.get_size()
+        radius = math.sqrt(width * height / (cells * 1.5 * math.sqrt(3)))
+        (x_min, _), (y_min, _) = self.area
+        rows = np.arange(int(height / (1.5 * radius)) + 2)
+        columns = np.arange(int(width / (math.sqrt(3) * radius)) + 2)
+        row_grid, column_grid = np.meshgrid(rows, columns, indexing='ij')
+        xs = x_min + (column_grid + 0.5 * (row_grid % 2)) * math.sqrt(3) * radius
+        ys = y_min + row_grid * 1.5 * radius
+        xs, ys = xs.ravel(), ys.ravel()
+        return self.add_cells(xs, ys, radius, self.get_capacities(len(xs), capacity_tiers, tier_weights))
+
+    def add_poisson(self, cells, capacity_tiers=DEFAULT_CAPACITY_TIERS, tier_weights=None, overlap=1.5):
+        """
+        Places a Poisson distributed number of base stations with mean cells uniformly over the area.
+        Coverage radius is overlap times the radius of the mean area per cell.
+        :return: Number of base stations added
+        """
+        width, height = self.get_size()
+        (x_min, _), (y_min, _) = self.area
+        n = self.rng.poisson(cells)
+        xs = x_min + self.rng.uniform(0, width, n)
+        ys = y_min + self.rng.uniform(0, height, n)
+        radius = overlap * math.sqrt(width * height / (math.pi * cells))
+        return self.add_cells(xs, ys, radius, self.get_capacities(n, capacity_tiers, tier_weights))
+
+    def add_clustered(self, cells, macro_fraction=0.1, clusters=None, cluster_radius=None,
+                      capacity_tiers=DEFAULT_CAPACITY_TIERS, small_cell_capacity=DEFAULT_SMALL_CELL_CAPACITY):
+        """
+        Macro cells on a hex grid, and small cells normally distributed around cluster centers, i.e. hotspots.
+        :param clusters:        Number of clusters, one per macro cell if None
+        :param cluster_radius:  Standard deviation of the small cell positions, half of the macro radius if None
+        :return:                Number of base stations added
+        """
+        macro = max(int(cells * macro_fraction), 1)
+        added = self.add_hex_grid(macro, capacity_tiers)
+        macro_radius = self.cells[-1][2][0]
+        clusters = macro if clusters is None else clusters
+        cluster_radius = macro_radius / 2 if cluster_radius is None else cluster_radius
+        width, height = self.get_size()
+        (x_min, _), (y_min, _) = self.area
+        centers_x = x_min + self.rng.uniform(0, width, clusters)
+        centers_y = y_min + self.rng.uniform(0, height, clusters)
+        self.hotspots.extend(zip(centers_x.tolist(), centers_y.tolist(), [cluster_radius] * clusters))
+
+        small = cells - added
+        owners = self.rng.randint(0, clusters, small)
+        xs = centers_x[owners] + self.rng.normal(0, cluster_radius, small)
+        ys = centers_y[owners] + self.rng.normal(0, cluster_radius, small)
+        return added + self.add_cells(xs, ys, macro_radius / 4, self.get_capacities(small, small_cell_capacity))
+
+    def get_density_map(self, cell_size=DEFAULT_DENSITY_CELL_SIZE, background=0.2):
+        """
+        :param background:  Share of the clients placed uniformly, the rest are around the hotspots
+        :return:            (rows, columns) array of client probabilities per cell_size x cell_size raster cell
+        """
+        width, height = self.get_size()
+        (x_min, _), (y_min, _) = self.area
+        columns, rows = max(int(math.ceil(width / cell_size)), 1), max(int(math.ceil(height / cell_size)), 1)
+        density = np.full((rows, columns), 1.0 / (rows * columns))
+        if self.hotspots:
+            xs = x_min + (np.arange(columns) + 0.5) * cell_size
+            ys = y_min + (np.arange(rows) + 0.5) * cell_size
+            hot = np.zeros((rows, columns))
+            for x, y, radius in self.hotspots:
+                hot += np.exp(-((ys[:, None] - y) ** 2 + (xs[None, :] - x) ** 2) / (2 * radius ** 2))
+            density = background * density + (1 - background) * hot / hot.sum()
+        return density / density.sum()
+
+    def get_arrays(self, density_cell_size=DEFAULT_DENSITY_CELL_SIZE):
+        """
+        :return: Arrays of the compact scenario form, see load_base_stations and sample_locations
+        """
+        xs, ys, coverages, capacities = (np.concatenate(column) for column in zip(*self.cells))
+        ratios = np.maximum(self.rng.dirichlet(self.mean_ratios * self.concentration, len(xs)), MIN_RATIO)
+        ratios /= ratios.sum(axis=1, keepdims=True)
+        return {'x': xs, 'y': ys, 'coverage': coverages, 'capacity_bandwidth': capacities,
+                'ratios': ratios, 'slice_names': np.asarray(self.slice_names, dtype=str),
+                'density': self.get_density_map(density_cell_size),
+                'area': np.asarray(self.area, dtype=float)}
+
+    def write(self, template, filename, num_clients=None, density_cell_size=DEFAULT_DENSITY_CELL_SIZE):
+        """
+        Writes the base stations and the density map to <filename without extension>.npz, and the configuration
+        of the template referring to it to filename.
+        :param template:    Parsed YAML configuration, its base_stations and client locations are replaced
+        """
+        data = copy.deepcopy(template)
+        data.pop('base_stations', None)
+        npz_filename = os.path.splitext(filename)[0] + '.npz'
+        np.savez_compressed(npz_filename, **self.get_arrays(density_cell_size))
+
+        settings = data['settings']
+        (x_min, x_max), (y_min, y_max) = self.area
+        settings['statistics_params']['x'] = {'min': x_min, 'max': x_max}
+        settings['statistics_params']['y'] = {'min': y_min, 'max': y_max}
+        if num_clients is not None:
+            settings['num_clients'] = num_clients
+        data['base_stations_file'] = os.path.basename(npz_filename)
+        data['clients']['location'] = {'density_map': os.path.basename(npz_filename)}
+        with open(filename, 'w') as f:
+            yaml.safe_dump(data, f, sort_keys=False)
+
+
+def load_base_stations(filename):
+    """
+    :return: Base stations of a compact scenario file, in the form of the base_stations entries of a configuration
+    """
+    with np.load(filename, allow_pickle=False) as f:
+        names = f['slice_names'].tolist()
+        columns = [f[k].tolist() for k in ('x', 'y', 'capacity_bandwidth', 'coverage')]
+        ratios = f['ratios'].tolist()
+    for (x, y, capacity, coverage), r in zip(zip(*columns), ratios):
+        yield {'x': x, 'y': y, 'capacity_bandwidth': capacity, 'coverage': coverage, 'ratios': dict(zip(names, r))}
+
+
+def sample_locations(filename, n):
+    """
+    Draws client locations from the density map of a compact scenario file, uniform within raster cells.
+    Uses the numpy global random state.
+    :return: (n, 2) array of locations
+    """
+    with np.load(filename, allow_pickle=False) as f:
+        density = f['density']
+        (x_min, x_max), (y_min, y_max) = f['area']
+    rows, columns = density.shape
+    cells = np.random.choice(rows * columns, n, p=density.ravel() / density.sum())
+    cell_width, cell_height = (x_max - x_min) / columns, (y_max - y_min) / rows
+    xs = x_min + (cells % columns + np.random.random_sample(n)) * cell_width
+    ys = y_min + (cells // columns + np.random.random_sample(n)) * cell_height
+    return np.column_stack((np.minimum(xs, x_max), np.minimum(ys, y_max)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates a large scenario from a template configuration.')
+    parser.add_argument('template')
+    parser.add_argument('output')
+    parser.add_argument('--layout', choices=LAYOUTS, default='hex')
+    parser.add_argument('--cells', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=None)
+    parser.add_argument('--width', type=float, default=20000)
+    parser.add_argument('--height', type=float, default=20000)
+    parser.add_argument('--density-cell-size', type=float, default=DEFAULT_DENSITY_CELL_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.template, 'r') as stream:
+        template = yaml.load(stream, Loader=yaml.FullLoader)
+    seed = args.seed if args.seed is not None else template['settings'].get('seed')
+    generator = ScenarioGenerator(((0, args.width), (0, args.height)),
+                                  {name: s['client_weight'] for name, s in template['slices'].items()}, seed=seed)
+    if args.layout == 'hex':
+        added = generator.add_hex_grid(args.cells)
+    elif args.layout == 'poisson':
+        added = generator.add_poisson(args.cells)
+    else:
+        added = generator.add_clustered(args.cells)
+    generator.write(template, args.output, num_clients=args.clients, density_cell_size=args.density_cell_size)
+    print(f'{added} base stations written to {os.path.splitext(args.output)[0]}.npz')
+
+
+if __name__ == '__main__':
+    main()
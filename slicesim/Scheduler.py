@@ -0,0 +1,98 @@
+import numpy as np
+
+from .Kernels import water_fill, water_fill_groups
+
+SCHEDULER_MODES = ('fair', 'weighted', 'priority')
+
+
+class Scheduler:
+    """
+    Shares the capacity of each slice among the clients consuming from it, instead of giving each connected
+    client init_capacity / connected_users. Consumption requests of a time unit are collected at .00 and
+    scheduled together at .125. The demand of a client is its remaining usage capped by bandwidth_max, and the
+    free capacity of the slice is shared according to mode:
+        fair:       max-min fair share, the share unused by small demands is spread over the others
+        weighted:   max-min fair share weighted by 1 / qos class of the client
+        priority:   clients are served in order of qos class, fair share within a class
+    The qos class of a client is the lowest qos_class of its subscribed slices.
+    Allocations last for a single time unit.
+    """
+
+    def __init__(self, env, stat_collector, mode='fair'):
+        if mode not in SCHEDULER_MODES:
+            raise NotImplementedError(f'Unknown scheduler mode: {mode}')
+        self.env = env
+        self.stat_collector = stat_collector
+        self.mode = mode
+        self.requests = []
+        self.action = env.process(self.iter())
+
+    def request(self, client):
+        self.requests.append(client)
+
+    @staticmethod
+    def allocate_by_priority(capacity, demands, qos):
+        """
+        :return: Allocations of the priority mode, fair and weighted ones are shared by water_fill_groups
+        """
+        result = np.zeros(len(demands))
+        for q in np.unique(qos):
+            group = qos == q
+            result[group] = water_fill(capacity, demands[group])
+            capacity -= result[group].sum()
+        return result
+
+    def resolve(self):
+        requests, self.requests = self.requests, []
+        requests = [c for c in requests if c.connected and c.base_station is not None]
+        if len(requests) == 0:
+            return
+
+        # demands grouped by (base station, slice)
+        groups = {}
+        for c in requests:
+            qos = c.get_qos_class()
+            for pos, s in enumerate(c.get_slices()):
+                remaining = c.usage_remaining[pos]
+                if remaining > 0:
+                    groups.setdefault((c.base_station.pk, s.index), (s, []))[1].append(
+                        (c, pos, min(remaining, s.bandwidth_max), qos))
+
+        allocations = {}
+        if self.mode == 'priority':
+            for s, entries in groups.values():
+                demands = np.fromiter((e[2] for e in entries), dtype=float, count=len(entries))
+                qos = np.fromiter((e[3] for e in entries), dtype=float, count=len(entries))
+                level = s.capacity.level
+                amounts = self.allocate_by_priority(level, demands, qos)
+                total = amounts.sum()
+                if total > level > 0:
+                    amounts *= level / total  # rounding
+                for (c, pos, _, _), amount in zip(entries, amounts.tolist()):
+                    allocations.setdefault(c, []).append((pos, s, amount))
+        else:
+            # all the groups at once, see water_fill_groups
+            entries = [e for _, group in groups.values() for e in group]
+            ptr = np.zeros(len(groups) + 1, dtype=np.int64)
+            np.cumsum([len(group) for _, group in groups.values()], out=ptr[1:])
+            demands = np.fromiter((e[2] for e in entries), dtype=float, count=len(entries))
+            qos = np.fromiter((e[3] for e in entries), dtype=float, count=len(entries))
+            weights = np.ones(len(entries)) if self.mode == 'fair' else 1.0 / np.maximum(qos, 1)
+            capacities = np.fromiter((s.capacity.level for s, _ in groups.values()), dtype=float, count=len(groups))
+            amounts = water_fill_groups(capacities, ptr, demands, weights).tolist()
+            slices = [s for s, group in groups.values() for _ in group]
+            for (c, pos, _, _), s, amount in zip(entries, slices, amounts):
+                allocations.setdefault(c, []).append((pos, s, amount))
+
+        for c in requests:
+            c.hold_allocation(allocations.get(c, []))
+
+    def iter(self):
+        yield self.env.timeout(0.125)
+        while True:
+            # .125: schedule the consumption requests of .00
+            self.resolve()
+            yield self.env.timeout(1)
+
+    def __str__(self):
+        return f'Scheduler(mode={self.mode})'
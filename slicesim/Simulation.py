@@ -0,0 +1,431 @@
+import copy
+import os
+import random
+
+import numpy as np
+import simpy
+
+from .Admission import AdmissionControl
+from .Convergence import ConvergenceDetector
+from .BaseStation import BaseStation
+from .Client import Client
+from .Coverage import Coverage
+from .Demand import DemandProfiles
+from .Distributor import Distributor
+from .Graph import Graph
+from .Hotspots import HotspotTracker, DEFAULT_TOP_K, DEFAULT_WINDOW
+from .HandoverPolicy import get_policy
+from .IdleScheduler import IdleScheduler
+from .Mobility import Mobility, DistributionModel, RandomWaypointModel, TraceModel
+from .Outages import OutageController, DEFAULT_MTTR
+from .Parallel import ChunkExecutor, DEFAULT_CHUNK_SIZE
+from .Recorder import Recorder, DEFAULT_CHUNK_TICKS
+from .ResultCache import get_cache_key
+from .ScenarioGenerator import load_base_stations, sample_locations
+from .Scheduler import Scheduler
+from .Slice import Slice
+from .Stats import Stats
+
+from .utils import Environment
+from .utils import KDTree
+from .utils import LoadBalanceType
+
+# Version of the simulation results. Increase it with any change altering the results of a configuration,
+# cached results of the previous versions are not used then.
+RESULT_VERSION = 1
+
+
+def log(verbose, message):
+    if not verbose:
+        return
+    print(message)
+
+
+def get_dist(d):
+    return {
+        'randrange': random.randrange,  # start, stop, step
+        'randint': random.randint,  # a, b
+        'random': random.random,
+        'uniform': random,  # a, b
+        'triangular': random.triangular,  # low, high, mode
+        'beta': random.betavariate,  # alpha, beta
+        'expo': random.expovariate,  # lambda
+        'gamma': random.gammavariate,  # alpha, beta
+        'gauss': random.gauss,  # mu, sigma
+        'lognorm': random.lognormvariate,  # mu, sigma
+        'normal': random.normalvariate,  # mu, sigma
+        'vonmises': random.vonmisesvariate,  # mu, kappa
+        'pareto': random.paretovariate,  # alpha
+        'weibull': random.weibullvariate  # alpha, beta
+    }.get(d)
+
+
+def get_random_mobility_pattern(vals, mobility_patterns):
+
+    i = 0
+    r = random.random()
+
+    while vals[i] < r:
+        i += 1
+
+    return mobility_patterns[i]
+
+
+def get_random_slice_indices(vals):
+    subscribed_slices_count = np.random.randint(3, size=1)[0] + 1
+    result = np.random.choice(len(vals), subscribed_slices_count, replace=False, p=vals)
+    return result
+
+
+def get_handover_policy(settings):
+    return get_policy(settings.get('handover_policy'), LoadBalanceType[settings['load_balance_type']],
+                      settings['load_balance_threshold'], settings['load_balance_margin'])
+
+
+class Simulation:
+    """
+    A single simulation run of a parsed configuration.
+    """
+
+    def __init__(self, data, conf_dir='.', topology=None):
+        """
+        :param data:        Parsed YAML configuration
+        :param conf_dir:    Directory of the configuration, files referred by it are relative to this one
+        :param topology:    Topology of the base stations of the configuration, shared by processes
+        """
+        self.data = data
+        self.conf_dir = conf_dir
+        self.topology = topology
+        self.settings = data['settings']
+        self.seed = int(self.settings['seed'])
+        self.env = None
+        self.base_stations = None
+        self.clients = None
+        self.stats = None
+        self.executor = None
+
+    def build(self):
+        settings = self.settings
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        env = Environment()
+        self.env = env
+
+        slices_info = self.data['slices']
+        num_clients = settings['num_clients']
+        mobility_params = settings.get('mobility_params')
+        parallel_params = settings.get('parallel_params') or {}
+        admission_params = settings.get('admission_params') or {}
+        scheduler_params = settings.get('scheduler_params')
+        recorder_params = settings.get('recorder_params')
+        convergence_params = settings.get('convergence_params')
+        hotspot_params = settings.get('hotspot_params')
+        demand_profiles = settings.get('demand_profiles')
+        outage_params = settings.get('outage_params')
+        usage_model = settings.get('usage_model', 'polling')
+        clients_info = self.data['clients']
+
+        os.environ["SLICE_SIM_LOG_STAT_ONLY"] = "1" if settings['log_stat_only'] else "0"
+        verbose = False if settings['log_stat_only'] else True
+
+        collected, slice_weights = 0, []
+        for __, s in slices_info.items():
+            # collected += s['client_weight']
+            slice_weights.append(s['client_weight'])
+
+        collected, mb_weights = 0, []
+        for __, mb in self.data['mobility_patterns'].items():
+            collected += mb['client_weight']
+            mb_weights.append(collected)
+
+        mobility_patterns = []
+        for name, mb in self.data['mobility_patterns'].items():
+            mobility_pattern = Distributor(name, get_dist(mb['distribution']), *mb['params'])
+            mobility_patterns.append(mobility_pattern)
+
+        usage_patterns = {}
+        for name, s in slices_info.items():
+            usage_patterns[name] = Distributor(name, get_dist(s['usage_pattern']['distribution']),
+                                               *s['usage_pattern']['params'])
+
+        log(verbose, '-' * 20 + "Base Stations" + '-' * 20)
+        base_stations = []
+        i = 0
+        if self.topology is not None:
+            base_stations_info = self.topology.get_base_stations_info()
+        elif 'base_stations_file' in self.data:
+            base_stations_info = load_base_stations(os.path.join(self.conf_dir, self.data['base_stations_file']))
+        else:
+            base_stations_info = self.data['base_stations']
+        for b in base_stations_info:
+            slices = []
+            ratios = b['ratios']
+            capacity = b['capacity_bandwidth']
+            slice_idx = 0
+            for name, s in slices_info.items():
+                s_cap = capacity * ratios[name]
+                # TODO remove bandwidth max
+                s = Slice(name, ratios[name], 0, s['client_weight'],
+                          s['delay_tolerance'],
+                          s['qos_class'], s['bandwidth_guaranteed'],
+                          s['bandwidth_max'], s_cap, usage_patterns[name], env, slice_idx)
+                slices.append(s)
+                slice_idx += 1
+            base_station = BaseStation(i, Coverage((b['x'], b['y']), b['coverage']), capacity, slices)
+            base_stations.append(base_station)
+            log(verbose, base_station)
+            i += 1
+        log(verbose, '-' * 60)
+        self.base_stations = base_stations
+
+        ufp = clients_info['usage_frequency']
+        usage_freq_pattern = Distributor(f'ufp', get_dist(ufp['distribution']), *ufp['params'],
+                                         divide_scale=ufp['divide_scale'])
+
+        area = self.get_area()
+        self.executor = ChunkExecutor(threads=parallel_params.get('threads', 1),
+                                      chunk_size=parallel_params.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        stats = Stats(env, base_stations, None, area,
+                      grid_cell_size=settings['statistics_params'].get('coverage_grid_cell_size'),
+                      handover_policy=get_handover_policy(settings), executor=self.executor, topology=self.topology)
+        self.stats = stats
+
+        mobility = Mobility(env, np.zeros((num_clients, 2)), area=area,
+                            boundary=mobility_params.get('boundary', 'none') if mobility_params else 'none',
+                            executor=self.executor)
+        stats.mobility = mobility
+
+        admission_mode = admission_params.get('mode', 'legacy')
+        if admission_mode == 'batched':
+            stats.admission = AdmissionControl(env, stats, priority=admission_params.get('priority', 'arrival'),
+                                               seed=self.seed)
+        elif admission_mode != 'legacy':
+            raise NotImplementedError(f'Unknown admission mode: {admission_mode}')
+        if scheduler_params:
+            stats.scheduler = Scheduler(env, stats, mode=scheduler_params.get('mode', 'fair'))
+
+        if demand_profiles:
+            stats.demand = DemandProfiles(base_stations, list(slices_info), settings['simulation_time'],
+                                          demand_profiles.get('profiles') or [], regions=demand_profiles.get('regions'))
+
+        if usage_model == 'event':
+            idle_scheduler = IdleScheduler(env, stats, num_clients)
+        elif usage_model == 'polling':
+            idle_scheduler = None
+        else:
+            raise NotImplementedError(f'Unknown usage model: {usage_model}')
+        stats.idle_scheduler = idle_scheduler
+        stats.track_clients(num_clients)
+
+        clients = []
+        client_mobility_patterns = []
+
+        density_map = clients_info['location'].get('density_map')
+        if density_map is not None:
+            locations = sample_locations(os.path.join(self.conf_dir, density_map), num_clients).tolist()
+
+        for i in range(num_clients):
+            if density_map is not None:
+                location_x, location_y = locations[i]
+            else:
+                loc_x = clients_info['location']['x']
+                loc_y = clients_info['location']['y']
+                location_x = get_dist(loc_x['distribution'])(*loc_x['params'])
+                location_y = get_dist(loc_y['distribution'])(*loc_y['params'])
+
+            mobility_pattern = get_random_mobility_pattern(mb_weights, mobility_patterns)
+            client_mobility_patterns.append(mobility_patterns.index(mobility_pattern))
+            connected_slice_indices = get_random_slice_indices(slice_weights)
+            c = Client(i, env, location_x, location_y,
+                       mobility_pattern, usage_freq_pattern.generate_scaled(), connected_slice_indices, stats,
+                       idle_scheduler=idle_scheduler, mobility=mobility)
+            clients.append(c)
+        self.clients = clients
+
+        if mobility_params:
+            model_name = mobility_params.get('model', 'distribution')
+            if model_name == 'distribution':
+                model = DistributionModel(mobility_patterns, np.asarray(client_mobility_patterns))
+            elif model_name == 'random_waypoint':
+                model = RandomWaypointModel(num_clients, area, speed=mobility_params.get('speed', (1, 5)),
+                                            pause=mobility_params.get('pause', (0, 0)))
+            elif model_name == 'trace':
+                model = TraceModel(os.path.join(self.conf_dir, mobility_params['trace_file']),
+                                   num_clients, loop=mobility_params.get('loop', False))
+                mobility.positions[:] = model.get_frame(0)
+            else:
+                raise NotImplementedError(f'Unknown mobility model: {model_name}')
+            mobility.set_model(model)
+
+        KDTree.limit = settings['limit_closest_base_stations']
+
+        stats.clients = clients
+        if outage_params:
+            stats.outages = OutageController(env, stats, windows=outage_params.get('windows'),
+                                             mtbf=outage_params.get('mtbf'),
+                                             mttr=outage_params.get('mttr', DEFAULT_MTTR),
+                                             base_stations=outage_params.get('base_stations'), seed=self.seed,
+                                             idle_scheduler=idle_scheduler)
+        if convergence_params:
+            warmup = int(settings['simulation_time'] * settings['statistics_params'].get('warmup_ratio', 0))
+            stats.convergence = ConvergenceDetector(warmup, **convergence_params)
+            # env.run returns once converged, as it does at the end of the simulation time
+            stats.converged.callbacks.append(simpy.core.StopSimulation.callback)
+        env.process(stats.collect())
+
+        if hotspot_params:
+            stats.hotspots = HotspotTracker(env, base_stations, k=hotspot_params.get('k', DEFAULT_TOP_K),
+                                            window=hotspot_params.get('window', DEFAULT_WINDOW),
+                                            stream=hotspot_params.get('stream'),
+                                            interval=hotspot_params.get('interval', 1))
+
+        if recorder_params:
+            stats.recorder = Recorder(env, stats, recorder_params.get('directory', 'recording'), num_clients,
+                                      len(slices_info), sample=recorder_params.get('sample'), seed=self.seed,
+                                      chunk_ticks=recorder_params.get('chunk_ticks', DEFAULT_CHUNK_TICKS),
+                                      sessions=recorder_params.get('sessions', True))
+
+    def get_area(self):
+        x_vals = self.settings['statistics_params']['x']
+        y_vals = self.settings['statistics_params']['y']
+        return (x_vals['min'], x_vals['max']), (y_vals['min'], y_vals['max'])
+
+    def run(self):
+        """
+        :return: General stats and per slice stats, see Stats.get_general_stats and Stats.get_per_slice_stats
+        """
+        if self.env is None:
+            self.build()
+        try:
+            self.env.run(until=int(self.settings['simulation_time']))
+        finally:
+            self.executor.shutdown()
+        if self.stats.recorder is not None:
+            self.stats.recorder.close()
+        if self.stats.hotspots is not None:
+            self.stats.hotspots.close()
+
+        # TODO: Some stats of clients printed below are never updated. Hence disabled.
+        """
+        for client in clients:
+
+            print(client)
+            print(f'\tTotal connected time: {client.total_connected_time:>5}')
+            print(f'\tTotal unconnected time: {client.total_unconnected_time:>5}')
+            print(f'\tTotal request count: {client.total_request_count:>5}')
+            print(f'\tTotal consume time: {client.total_consume_time:>5}')
+            print(f'\tTotal usage: {client.total_usage:>5}')
+            print()
+        """
+
+        verbose = False if self.settings['log_stat_only'] else True
+        if self.stats.converged.triggered:
+            log(verbose, f'Converged at {self.stats.converged.value} by {self.stats.convergence}')
+        log(verbose, f'Number or clients: {self.settings["num_clients"]}')
+        log(verbose, '-' * 60)
+        return self.stats.get_general_stats(), self.stats.get_per_slice_stats()
+
+    def plot(self, per_slice_stats):
+        settings = self.settings
+        plotting_params = settings['plotting_params']
+        xlim_left = int(settings['simulation_time'] * settings['statistics_params']['warmup_ratio'])
+        xlim_right = int(settings['simulation_time'] * (1 - settings['statistics_params']['cooldown_ratio'])) + 1
+
+        graph = Graph(self.base_stations, self.clients, (xlim_left, xlim_right), self.get_area(),
+                      output_dpi=plotting_params['plot_file_dpi'],
+                      scatter_size=plotting_params['scatter_size'],
+                      output_filename=plotting_params['plot_file'])
+        graph.draw_all(self.stats.get_stats(), per_slice_stats[1])
+        if plotting_params['plot_save']:
+            graph.save_fig()
+        if plotting_params['plot_show']:
+            graph.show_plot()
+
+
+def print_summary(settings, general_stats, per_slice_stats):
+    # Comparison statistics. Outputs only the handover related statistics.
+    # TODO: Move to Stats.py
+    print(50 * '-', "SUMMARY", 50 * '-')
+    print("Client: ", settings['num_clients'])
+    print("Time: ", settings['simulation_time'])
+    print("Seed:", int(settings['seed']))
+    print("Load balance:", LoadBalanceType[settings['load_balance_type']])
+    print("Handover policy:", get_handover_policy(settings))
+    # collected time units are fewer if the simulation is stopped at convergence
+    collected = len(general_stats['coverage_ratio'])
+    if collected < settings['simulation_time']:
+        print(f"Converged after: {collected}, saved time: {settings['simulation_time'] - collected}")
+    print(109 * '-')
+
+    r = lambda series: [round(elem, 4) for elem in series]
+    to_mean_var = lambda series: print(f'Mean: {round(np.mean(series), 4)}, Std: {round(np.std(series), 4)}\n{r(series)}\n')
+
+    print("[Clients connected] (connected / total) per time unit")
+    to_mean_var(general_stats['total_connected_users_ratio'])
+
+    print("[Used Bandwidth] used bandwidth per time unit")
+    to_mean_var(general_stats['total_used_bw'])
+
+    print("[Avg Slice Load Ratio] (total used / total capacity) per time unit")
+    to_mean_var(general_stats['avg_slice_load_ratio'])
+
+    print("[Connected clients ratio] (total connected clients / total number of slices) per time unit")
+    to_mean_var(general_stats['avg_slice_client_count_ratio'])
+
+    print("[Client coverage ratio] (connected and in coverage clients count / number of clients) per time unit")
+    to_mean_var(general_stats['coverage_ratio'])
+
+    print("[Block count ratio] (rejected from currently connected station count / connection attempt count) per time unit")
+    to_mean_var(general_stats['block_count_ratio'])
+
+    print("[Handover ratio] (BS changed due to load handover count / connection attempt count) per time unit")
+    to_mean_var(general_stats['handover_count_ratio'])
+
+    print("[Drop count ratio] (moved out of range count + rejected from freshly assigned BS after handover count ) /\n"
+          " (connection attempt count) per time unit")
+    to_mean_var(general_stats['drop_count_ratio'])
+
+    print()
+    print(50 * '-', " SLICE ", 50 * '-')
+    print("Average loads of slices from all base stations. A good handover mechanism will decrease std.\n")
+    for k,v in per_slice_stats[0].items():
+        print(f'[Slice {k}] mean: {round(v[0],4)}, stdev: {round(v[1],4)}')
+
+
+def apply_overrides(data, overrides):
+    """
+    :param overrides:   Dict of settings to be replaced, dict values are merged into the current ones
+    :return:            Copy of the configuration with the overrides
+    """
+    data = copy.deepcopy(data)
+    settings = data['settings']
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(settings.get(key), dict):
+            settings[key].update(value)
+        else:
+            settings[key] = value
+    return data
+
+
+def run_simulation(data, conf_dir='.', cache=None, refresh=False, topology=None):
+    """
+    Runs a configuration, or returns its results from the cache.
+    :param data:        Parsed YAML configuration
+    :param conf_dir:    Directory of the configuration
+    :param cache:       ResultCache, results are not cached if None
+    :param refresh:     Run even if the results are cached, and replace them
+    :param topology:    Topology of the base stations of the configuration, see Topology
+    :return:            (general stats, per slice stats, Simulation or None if the results are read from the cache)
+    """
+    key = None
+    if cache is not None:
+        key = get_cache_key(data, RESULT_VERSION, conf_dir)
+        if not refresh:
+            cached = cache.load(key)
+            if cached is not None:
+                return cached[0], cached[1], None
+    simulation = Simulation(data, conf_dir, topology)
+    general_stats, per_slice_stats = simulation.run()
+    if cache is not None:
+        cache.store(key, general_stats, per_slice_stats)
+    return general_stats, per_slice_stats, simulation
@@ -1,7 +1,108 @@
-import simpy
+from collections import deque
+
+
+class Capacity:
+    """
+    Compact replacement of simpy.Container for slice capacities.
+    Clients never wait for the events returned by simpy.Container, so only the level
+    bookkeeping is kept. Requests that cannot be satisfied immediately are queued and
+    served in FIFO order later on, as simpy.Container does.
+    simpy.Container serves the queue of the other kind when the event of a successful request
+    is processed, i.e. after the events scheduled before it at the same time. The position of
+    these events is reserved on each success, and events are only scheduled for the positions
+    once a request waits, so requests are served at the same points as with simpy.Container,
+    see Environment.reserve and Environment.schedule_reserved.
+    If watch is set to (set, key), key is added to the set on each get and put, see HotspotTracker.
+    """
+    __slots__ = ('env', 'capacity', 'level', '_get_queue', '_put_queue', '_get_triggers', '_put_triggers',
+                 'watch')
+
+    def __init__(self, env, capacity, init=0):
+        if capacity <= 0:
+            raise ValueError('"capacity" must be > 0.')
+        if init < 0 or init > capacity:
+            raise ValueError('"init" must be >= 0 and <= capacity.')
+        self.env = env
+        self.capacity = capacity
+        self.level = init
+        self._get_queue = None
+        self._put_queue = None
+        # reserved positions of the triggers of each queue, see reserve
+        self._get_triggers = None
+        self._put_triggers = None
+        self.watch = None
+
+    def get(self, amount):
+        if amount <= 0:
+            raise ValueError(f'amount(={amount}) must be > 0.')
+        if self._get_queue is None:
+            self._get_queue = deque()
+        self._get_queue.append(amount)
+        self._trigger_get()
+        if self._get_queue:
+            self._get_triggers = self.schedule(self._get_triggers, self._trigger_get)
+        if self.watch is not None:
+            self.watch[0].add(self.watch[1])
+
+    def put(self, amount):
+        if amount <= 0:
+            raise ValueError(f'amount(={amount}) must be > 0.')
+        if self._put_queue is None:
+            self._put_queue = deque()
+        self._put_queue.append(amount)
+        self._trigger_put()
+        if self._put_queue:
+            self._put_triggers = self.schedule(self._put_triggers, self._trigger_put)
+        if self.watch is not None:
+            self.watch[0].add(self.watch[1])
+
+    def _trigger_get(self, event=None):
+        gets = self._get_queue
+        while gets and self.level >= gets[0]:
+            self.level -= gets.popleft()
+            if self._put_queue:
+                self.make_trigger(self._trigger_put).succeed()
+            else:
+                self._put_triggers = self.reserve(self._put_triggers)
+
+    def _trigger_put(self, event=None):
+        puts = self._put_queue
+        while puts and self.capacity - self.level >= puts[0]:
+            self.level += puts.popleft()
+            if self._get_queue:
+                self.make_trigger(self._trigger_get).succeed()
+            else:
+                self._get_triggers = self.reserve(self._get_triggers)
+
+    def reserve(self, triggers):
+        """
+        Reserves the position of a trigger at the current time, as scheduling its event would.
+        :return: Positions reserved at the current time
+        """
+        if triggers is None or triggers[0][0] != self.env.now:
+            triggers = []
+        triggers.append(self.env.reserve())
+        return triggers
+
+    def schedule(self, triggers, callback):
+        """
+        Schedules the events of the reserved triggers which are not processed yet, as a request waits.
+        :return: None, as no position is reserved anymore
+        """
+        for position in triggers or ():
+            self.env.schedule_reserved(position, callback)
+        return None
+
+    def make_trigger(self, callback):
+        event = self.env.event()
+        event.callbacks.append(callback)
+        return event
 
 
 class Slice:
+    __slots__ = ('name', 'connected_users', 'user_share', 'delay_tolerance', 'qos_class', 'ratio',
+                 'bandwidth_guaranteed', 'bandwidth_max', 'init_capacity', 'capacity', 'usage_pattern', 'index')
+
     def __init__(self, name, ratio,
                  connected_users, user_share, delay_tolerance, qos_class,
                  bandwidth_guaranteed, bandwidth_max, init_capacity,
@@ -15,13 +116,13 @@ class Slice:
         self.bandwidth_guaranteed = bandwidth_guaranteed
         self.bandwidth_max = bandwidth_max
         self.init_capacity = init_capacity
-        self.capacity = simpy.Container(env, init=init_capacity, capacity=init_capacity)
+        self.capacity = Capacity(env, init_capacity, init=init_capacity)
         self.usage_pattern = usage_pattern
         self.index = index
         # self.print_max_user_count()
 
     def print_max_user_count(self):
-        max_user_count = int(self.init_capacity / self.bandwidth_guaranteed) if self.bandwidth_guaranteed is not 0 else 99999
+        max_user_count = int(self.init_capacity / self.bandwidth_guaranteed) if self.bandwidth_guaranteed != 0 else 99999
         print("Slice:", self, "can have at most", max_user_count, "user")
 
     def get_consumable_share(self):
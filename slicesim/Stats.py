@@ -1,13 +1,48 @@
 import numpy as np
 from collections import defaultdict
 
+from .ConnectionUtils import get_adjacency
+from .CoverageGrid import CoverageGrid
+from .HandoverPolicy import DisabledPolicy, HandoverController
+from .Parallel import ChunkExecutor
+
 
 class Stats:
-    def __init__(self, env, base_stations, clients, area):
+    def __init__(self, env, base_stations, clients, area, grid_cell_size=None, handover_policy=None, executor=None,
+                 topology=None):
+        """
+        :param topology:    Shared static arrays of the base stations, see Topology. Built for this run if None.
+        """
         self.env = env
+        # Runs the kernels over the client arrays, see ChunkExecutor
+        self.executor = executor if executor is not None else ChunkExecutor()
         self.base_stations = base_stations
         self.clients = clients
+        self.mobility = None  # positions of the clients, if shared
         self.area = area
+        if topology is not None and topology.matches(area, grid_cell_size):
+            self.topology = topology
+            self.coverage_grid = topology.get_coverage_grid()
+            self.adjacency = topology.get_adjacency()
+        else:
+            self.topology = None
+            self.coverage_grid = CoverageGrid(base_stations, area, cell_size=grid_cell_size)
+            slice_names = list(dict.fromkeys(sl.name for bs in base_stations for sl in bs.slices))
+            self.adjacency = get_adjacency(slice_names, base_stations)
+        self.admission = None  # batched admission, see AdmissionControl. Clients are admitted one by one if None.
+        self.scheduler = None  # see Scheduler. Clients take init_capacity / connected_users of slices if None.
+        self.recorder = None  # per client snapshots and sessions, see Recorder
+        self.hotspots = None  # top k loaded and blocking slices, see HotspotTracker
+        self.convergence = None  # stops the simulation at steady state, see ConvergenceDetector
+        self.outages = None  # base station outages and restores, see OutageController
+        self.demand = None  # time-varying request rates and volumes, see DemandProfiles. Constant if None.
+        self.idle_scheduler = None  # sleeping clients of the event driven usage model, see IdleScheduler
+        # serving base station index (-1 for none) and connected flag of each client, kept up to date by the
+        # clients once tracked, see track_clients. Read from the clients if None.
+        self.client_serving = None
+        self.client_connected = None
+        self.converged = env.event()
+        self.handover = HandoverController(self, handover_policy if handover_policy is not None else DisabledPolicy())
         # self.graph = graph
 
         # Stats
@@ -68,18 +103,64 @@ class Stats:
             self.handover_count_ratio.append(0)
             self.drop_count_ratio.append(0)
 
+            if self.convergence is not None and self.convergence.update(int(self.env.now), self.get_last_stats()):
+                self.converged.succeed(int(self.env.now))
+                return
+
             yield self.env.timeout(1)
 
+    def get_positions(self):
+        """
+        :return: (clients, 2) array of the client positions
+        """
+        if self.mobility is not None:
+            return self.mobility.positions
+        return np.array([(c.x, c.y) for c in self.clients], dtype=float).reshape(-1, 2)
+
+    def track_clients(self, count):
+        """
+        Keeps the serving base stations and connected flags of count clients in arrays, with pk as row,
+        updated by the clients themselves. To be called before the clients are created.
+        """
+        self.client_serving = np.full(count, -1, dtype=np.int64)
+        self.client_connected = np.zeros(count, dtype=bool)
+
+    def get_client_arrays(self):
+        """
+        :return: x, y, serving base station index (-1 for none) and connected flag arrays of the clients.
+        """
+        positions = self.get_positions()
+        xs, ys = positions[:, 0], positions[:, 1]
+        if self.client_serving is not None:
+            return xs, ys, self.client_serving.copy(), self.client_connected.copy()
+        n = len(self.clients)
+        serving = np.fromiter((c.base_station.pk if c.base_station is not None else -1 for c in self.clients),
+                              dtype=np.int64, count=n)
+        connected = np.fromiter((c.connected for c in self.clients), dtype=bool, count=n)
+        return xs, ys, serving, connected
+
+    def get_serving(self, rows):
+        """
+        :return: Serving base station index of the clients at the given rows, -1 for none
+        """
+        if self.client_serving is not None:
+            return self.client_serving[rows]
+        clients = (self.clients[i] for i in rows)
+        return np.fromiter((c.base_station.pk if c.base_station is not None else -1 for c in clients),
+                           dtype=np.int64, count=len(rows))
+
+    def is_in_area(self, xs, ys):
+        (x_min, x_max), (y_min, y_max) = self.area
+        return (x_min <= xs) & (xs <= x_max) & (y_min <= ys) & (ys <= y_max)
+
     def get_total_connected_users_ratio(self):
-        t, cc = 0, 0
-        for c in self.clients:
-            if self.is_client_in_coverage(c):
-                t += c.connected
-                cc += 1
+        xs, ys, _, connected = self.get_client_arrays()
+        in_area = self.is_in_area(xs, ys)
+        cc = int(np.count_nonzero(in_area))
         # for bs in self.base_stations:
         #     for sl in bs.slices:
         #         t += sl.connected_users
-        return t / cc if cc != 0 else 0
+        return int(np.count_nonzero(connected & in_area)) / cc if cc != 0 else 0
 
     def get_total_used_bw(self):
         t = 0
@@ -108,12 +189,13 @@ class Stats:
         return t / c if c != 0 else 0
 
     def get_coverage_ratio(self):
-        t, cc = 0, 0
-        for c in self.clients:
-            if self.is_client_in_coverage(c):
-                cc += 1
-                if c.base_station is not None and c.base_station.coverage.is_in_coverage(c.x, c.y):
-                    t += 1
+        xs, ys, serving, _ = self.get_client_arrays()
+        in_area = self.is_in_area(xs, ys)
+        cc = int(np.count_nonzero(in_area))
+        xs, ys, serving = xs[in_area], ys[in_area], serving[in_area]
+        covered = self.executor.map(
+            lambda lo, hi: np.count_nonzero(self.coverage_grid.covers(xs[lo:hi], ys[lo:hi], serving[lo:hi])), cc)
+        t = int(sum(covered))
         return t / cc if cc != 0 else 0
 
     def incr_connect_attempt(self, client):
@@ -146,6 +228,16 @@ class Stats:
                 'handover_count_ratio': self.handover_count_ratio,
                 'drop_count_ratio': self.drop_count_ratio}
 
+    def get_last_stats(self):
+        """
+        :return: Values of the general stats in the last collected time unit
+        """
+        last = {name: series[-1] for name, series in self.get_general_stats().items()}
+        # counters of the current time unit are already open
+        for name in ('block_count_ratio', 'handover_count_ratio', 'drop_count_ratio'):
+            last[name] = getattr(self, name)[-2]
+        return last
+
     def get_per_slice_stats(self):
         res = {}
         slices = defaultdict(lambda: [])
@@ -153,7 +245,7 @@ class Stats:
         for bs, slice_meta in self.load_stats.items():
             for slice_name, load_list in slice_meta.items():
                 slices[slice_name].append(np.mean(load_list))
-                if len(load_per_time[slice_name]) is 0:
+                if len(load_per_time[slice_name]) == 0:
                     load_per_time[slice_name] = load_list
                 else:
                     load_per_time[slice_name] = (np.asarray(load_per_time[slice_name]) + np.asarray(load_list)) / 2
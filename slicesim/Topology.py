@@ -0,0 +1,160 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .ConnectionUtils import Adjacency, get_adjacency_from_arrays
+from .CoverageGrid import CoverageGrid
+from .ScenarioGenerator import load_base_stations
+
+ALIGNMENT = 64
+# Arrays of the packed form, in order
+ARRAYS = ('centers', 'radii', 'capacities', 'ratios', 'slice_mask',
+          'adjacency_indptr', 'adjacency_indices', 'grid_keys', 'grid_states', 'grid_cell_ptr', 'handover_values')
+
+
+class Topology:
+    """
+    Static part of a scenario: base station centers, radii, capacities and slice ratios, the neighbour CSR of
+    Adjacency, the coverage raster of CoverageGrid and the candidate rows of HandoverController.
+    It is built once and packed into shared memory or a file, then attached by the worker processes of the same
+    map without copying, see pack and attach. Base stations, slices and clients of each run are private.
+    """
+
+    def __init__(self, arrays, slice_names, area, cell_size, requested_cell_size=None):
+        """
+        :param cell_size:           Cell size of the coverage raster
+        :param requested_cell_size: coverage_grid_cell_size the raster is built for, None for the default one
+        """
+        self.arrays = arrays
+        self.slice_names = list(slice_names)
+        self.area = tuple(tuple(float(v) for v in a) for a in area)
+        self.cell_size = float(cell_size)
+        self.requested_cell_size = requested_cell_size
+        self.shm = None
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def build(cls, base_stations_info, slice_names, area, cell_size=None):
+        """
+        :param base_stations_info:  Base stations in the form of the base_stations entries of a configuration
+        """
+        base_stations_info = list(base_stations_info)
+        n = len(base_stations_info)
+        centers = np.asarray([(b['x'], b['y']) for b in base_stations_info], dtype=float).reshape(-1, 2)
+        radii = np.asarray([b['coverage'] for b in base_stations_info], dtype=float)
+        capacities = np.asarray([b['capacity_bandwidth'] for b in base_stations_info], dtype=float)
+        ratios = np.asarray([[b['ratios'][name] for name in slice_names] for b in base_stations_info],
+                            dtype=float).reshape(n, len(slice_names))
+        # all base stations have all slices, see Simulation.build
+        slice_mask = np.ones((n, len(slice_names)), dtype=bool)
+
+        grid = CoverageGrid.from_arrays(centers, radii, area, cell_size)
+        adjacency = get_adjacency_from_arrays(slice_names, centers, radii, slice_mask)
+        grid_stations = grid.keys % max(grid.bs_count, 1)
+        arrays = {
+            'centers': centers, 'radii': radii, 'capacities': capacities, 'ratios': ratios, 'slice_mask': slice_mask,
+            'adjacency_indptr': adjacency.indptr, 'adjacency_indices': adjacency.indices,
+            'grid_keys': grid.keys, 'grid_states': grid.states, 'grid_cell_ptr': grid.cell_ptr,
+            'handover_values': np.concatenate((adjacency.indices, grid_stations)).astype(np.int64),
+        }
+        return cls(arrays, slice_names, area, grid.cell_size, cell_size)
+
+    @classmethod
+    def from_data(cls, data, conf_dir='.'):
+        """
+        :param data: Parsed YAML configuration
+        """
+        if 'base_stations_file' in data:
+            base_stations_info = load_base_stations(os.path.join(conf_dir, data['base_stations_file']))
+        else:
+            base_stations_info = data['base_stations']
+        statistics_params = data['settings']['statistics_params']
+        area = ((statistics_params['x']['min'], statistics_params['x']['max']),
+                (statistics_params['y']['min'], statistics_params['y']['max']))
+        return cls.build(base_stations_info, list(data['slices']), area,
+                         statistics_params.get('coverage_grid_cell_size'))
+
+    def matches(self, area, cell_size=None):
+        """
+        :return: True if the coverage raster is the one built for the area and coverage_grid_cell_size
+        """
+        area = tuple(tuple(float(v) for v in a) for a in area)
+        return area == self.area and cell_size == self.requested_cell_size
+
+    def get_base_stations_info(self):
+        """
+        :return: Base stations in the form of the base_stations entries of a configuration
+        """
+        columns = (self.centers[:, 0].tolist(), self.centers[:, 1].tolist(), self.capacities.tolist(),
+                   self.radii.tolist(), self.ratios.tolist())
+        for x, y, capacity, coverage, ratios in zip(*columns):
+            yield {'x': x, 'y': y, 'capacity_bandwidth': capacity, 'coverage': coverage,
+                   'ratios': dict(zip(self.slice_names, ratios))}
+
+    def get_coverage_grid(self):
+        return CoverageGrid.from_arrays(self.centers, self.radii, self.area, self.cell_size,
+                                        self.grid_keys, self.grid_states, self.grid_cell_ptr)
+
+    def get_adjacency(self):
+        return Adjacency(self.adjacency_indptr, self.adjacency_indices, self.slice_mask, self.slice_names)
+
+    def pack(self, filename=None):
+        """
+        Copies the arrays into a single shared memory block, or into filename to be memory-mapped.
+        :return: Picklable descriptor to attach the packed topology, see attach
+        """
+        layout, offset = {}, 0
+        for name in ARRAYS:
+            a = np.ascontiguousarray(self.arrays[name])
+            layout[name] = (offset, a.dtype.str, a.shape)
+            offset += -(-a.nbytes // ALIGNMENT) * ALIGNMENT
+        size = max(offset, 1)
+        if filename is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            buffer = self.shm.buf
+        else:
+            buffer = np.memmap(filename, dtype=np.uint8, mode='w+', shape=(size,))
+        for name in ARRAYS:
+            start, dtype, shape = layout[name]
+            a = np.ascontiguousarray(self.arrays[name])
+            np.ndarray(shape, dtype=dtype, buffer=buffer, offset=start)[...] = a
+        if filename is not None:
+            buffer.flush()
+            del buffer
+        return {'shm': self.shm.name if filename is None else None, 'file': filename, 'layout': layout,
+                'slice_names': self.slice_names, 'area': self.area, 'cell_size': self.cell_size,
+                'requested_cell_size': self.requested_cell_size}
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        :param descriptor:  Returned by pack
+        :return:            Topology whose arrays are read-only views of the packed one
+        """
+        shm = None
+        if descriptor['shm'] is not None:
+            # workers share the resource tracker of the process which packed the block, which removes it
+            shm = shared_memory.SharedMemory(name=descriptor['shm'])
+            buffer = shm.buf
+        else:
+            buffer = np.memmap(descriptor['file'], dtype=np.uint8, mode='r')
+        arrays = {}
+        for name, (start, dtype, shape) in descriptor['layout'].items():
+            a = np.ndarray(tuple(shape), dtype=dtype, buffer=buffer, offset=start)
+            a.flags.writeable = False
+            arrays[name] = a
+        topology = cls(arrays, descriptor['slice_names'], descriptor['area'], descriptor['cell_size'],
+                       descriptor['requested_cell_size'])
+        topology.shm = shm
+        return topology
+
+    def unlink(self):
+        """
+        Removes the shared memory block, by the process which packed it once the workers are done.
+        """
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -1,7 +1,10 @@
 import math
 from enum import Enum
+from heapq import heappush
 
-from sklearn.neighbors import KDTree as kdt
+import numpy as np
+import simpy
+from simpy.events import NORMAL, URGENT, Event
 
 
 class LoadBalanceType(Enum):
@@ -10,8 +13,80 @@ class LoadBalanceType(Enum):
     mean = 2
 
 
+class Environment(simpy.Environment):
+    """
+    simpy.Environment keeping the (time, priority, event id) position of the event being processed, and reserving
+    positions for events which might be scheduled later on, see Capacity.
+    The event queue of simpy 3.0 to 4.x is a heap of (time, priority, event id, event) entries, the event ids being
+    drawn from a counter. These internals are only used here.
+    """
+
+    def __init__(self, initial_time=0):
+        super().__init__(initial_time)
+        if not isinstance(getattr(self, '_queue', None), list) or not hasattr(self, '_eid'):
+            raise RuntimeError(f'simpy {simpy.__version__} is not supported, its event queue is not a heap')
+        self.position = (initial_time, URGENT, -1)
+
+    def step(self):
+        if self._queue:
+            self.position = self._queue[0][:3]
+        super().step()
+
+    def reserve(self):
+        """
+        Draws the event id an event scheduled now with the NORMAL priority would get, without scheduling one.
+        :return: (time, priority, event id) position
+        """
+        return self.now, NORMAL, next(self._eid)
+
+    def schedule_reserved(self, position, callback):
+        """
+        Schedules a succeeded event calling callback at a reserved position, unless the position is already past.
+        """
+        if position <= self.position:
+            return
+        event = Event(self)
+        event._ok = True
+        event._value = None
+        event.callbacks.append(callback)
+        heappush(self._queue, position + (event,))
+
+
 def distance(a, b):
-    return math.sqrt(sum((i - j) ** 2 for i, j in zip(a, b)))
+    dx, dy = a[0] - b[0], a[1] - b[1]
+    return math.sqrt(dx * dx + dy * dy)
+
+
+def gather_rows(starts, counts, values, fill=-1):
+    """
+    Gathers variable length rows of a flat array into a padded matrix.
+    :param starts:  Start offset of each row in values
+    :param counts:  Length of each row
+    :param values:  Flat array the rows are taken from
+    :param fill:    Value of the padding
+    :return:        (rows, max(counts)) array
+    """
+    width = int(counts.max()) if len(counts) > 0 else 0
+    offsets = np.arange(width)
+    valid = offsets < counts[:, None]
+    idx = np.where(valid, starts[:, None] + offsets, 0)
+    if len(values) == 0:
+        return np.full(valid.shape, fill, dtype=values.dtype)
+    return np.where(valid, values[idx], fill)
+
+
+def scatter_rows(rows, values, n, fill):
+    """
+    Counterpart of gather_rows: spreads values over the given rows of an array of n rows.
+    :param rows:    Row of each value
+    :param values:  Array of values, one (row of) value(s) per row
+    :param n:       Number of rows of the result
+    :param fill:    Value of the other rows
+    :return:        Array of n rows
+    """
+    result = np.full((n,) + values.shape[1:], fill, dtype=values.dtype)
+    result[rows] = values
+    return result
 
 
 # Initial connections using k-d tree
@@ -28,30 +103,11 @@ def kd_tree(clients, base_stations):
 
 
 class KDTree:
-    last_run_time = 0
+    """
+    Number of closest base stations the k-d tree is queried for, see HandoverController.get_candidates.
+    """
     limit = None
 
-    # Initial connections using k-d tree
-    @staticmethod
-    def run(clients, base_stations, run_at, assign=True, logging=True):
-        if logging:
-            print(f'KDTREE CALL [{run_at}] - limit: {KDTree.limit}')
-        if run_at == KDTree.last_run_time:
-            return
-        KDTree.last_run_time = run_at
-
-        c_coor = [(c.x, c.y) for c in clients]
-        bs_coor = [p.coverage.center for p in base_stations]
-
-        tree = kdt(bs_coor, leaf_size=2)
-        res = tree.query(c_coor, k=min(KDTree.limit, len(base_stations)))
-
-        # print(res[0])
-        for c, d, p in zip(clients, res[0], res[1]):
-            if assign and d[0] <= base_stations[p[0]].coverage.radius:
-                c.base_station = base_stations[p[0]]
-            c.closest_base_stations = [(a, base_stations[b]) for a, b in zip(d, p)]
-
 
 def format_bps(size, pos=None, return_float=False):
     # https://stackoverflow.com/questions/12523586/python-format-size-application-converting-b-to-kb-mb-gb-tb
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slicesim.Simulation import apply_overrides
+
+CONF_DIR = os.path.join(os.path.dirname(__file__), '..', 'slicesim')
+CONF_FILENAME = os.path.join(CONF_DIR, 'istanbul-kapalicarsi.yml')
+
+
+@pytest.fixture(scope='session')
+def small_config():
+    """
+    The Kapalicarsi scenario with few clients and time units, without plotting and side outputs.
+    """
+    with open(CONF_FILENAME, 'r') as stream:
+        data = yaml.load(stream, Loader=yaml.FullLoader)
+    return apply_overrides(data, {'num_clients': 300, 'simulation_time': 20, 'logging': False,
+                                  'plotting_params': {'plotting': False},
+                                  'recorder_params': None, 'hotspot_params': None, 'cache_params': None})
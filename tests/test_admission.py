@@ -0,0 +1,35 @@
+import numpy as np
+
+from slicesim.Admission import get_headrooms
+from slicesim.Slice import Slice
+from slicesim.utils import Environment
+
+
+def count_admissions(capacity, users, bandwidth_max, bandwidth_guaranteed, limit=10000):
+    """
+    Number of clients admitted one by one with Slice.is_available.
+    """
+    s = Slice('s', 1, users, 1, 0, 1, bandwidth_guaranteed, bandwidth_max, capacity, None, Environment(), 0)
+    count = 0
+    while count < limit and s.is_available():
+        s.connected_users += 1
+        count += 1
+    return count
+
+
+def test_headrooms_match_per_client_check():
+    rng = np.random.RandomState(0)
+    n = 500
+    capacities = rng.choice([1e6, 3e6, 5e6, 1e7, 123456.0], n) * rng.choice([1.0, 0.1, 0.3, 0.7], n)
+    users = rng.randint(0, 40, n)
+    guaranteed = rng.choice([1e5, 3e5, 1e6, 2e6, 7e5 / 3], n)
+    bandwidth_max = rng.choice([5e5, 1e6, 1e7, 1e8], n)
+    headrooms = get_headrooms(capacities, users, bandwidth_max, guaranteed)
+    expected = [count_admissions(*args) for args in zip(capacities, users, bandwidth_max, guaranteed)]
+    np.testing.assert_array_equal(headrooms, expected)
+
+
+def test_headrooms_edge_cases():
+    # no guaranteed bandwidth, max bandwidth below the guaranteed one, full and exactly fitting slices
+    headrooms = get_headrooms([1e6, 1e6, 1e6, 1e6], [5, 0, 10, 3], [1e7, 1e4, 1e7, 1e7], [0, 1e5, 1e5, 1e5])
+    np.testing.assert_array_equal(headrooms, [np.inf, 0, 0, 7])
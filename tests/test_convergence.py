@@ -0,0 +1,46 @@
+import math
+
+import numpy as np
+import pytest
+
+from slicesim.Convergence import ConvergenceDetector, get_batch_means, get_confidence_interval
+
+
+def test_confidence_interval():
+    mean, std, half_width = get_confidence_interval([1, 2, 3, 4])
+    assert mean == 2.5
+    assert std == pytest.approx(1.2909944)
+    # t quantile of 3 degrees of freedom at 97.5%
+    assert half_width == pytest.approx(3.1824463 * std / 2)
+    assert math.isnan(get_confidence_interval([1])[2])
+    assert math.isnan(get_confidence_interval([])[0])
+
+
+def test_batch_means():
+    assert get_batch_means(np.arange(10), 5) == [0.5, 2.5, 4.5, 6.5, 8.5]
+    assert get_batch_means(np.arange(3), 10) == [0, 1, 2]
+    assert get_batch_means(np.arange(7), 2) == [1.5, 5]
+
+
+def test_batch_means_interval_covers_mean():
+    # the batch means of an autocorrelated series give an interval around its mean
+    rng = np.random.RandomState(2)
+    series = np.empty(20000)
+    series[0] = 0
+    for i in range(1, len(series)):
+        series[i] = 0.9 * series[i - 1] + rng.standard_normal()
+    mean, _, half_width = get_confidence_interval(get_batch_means(series, 20))
+    assert abs(mean) < half_width
+    assert abs(mean - series.mean()) < 1e-9
+
+
+def test_detector_window():
+    detector = ConvergenceDetector(warmup=2, metrics=('m',), window=10, batches=5, tolerance=0.1)
+    assert not detector.update(0, {'m': 100.0})
+    for now in range(2, 11):
+        assert not detector.update(now, {'m': 100.0 * now})
+    # only the last window values are watched: the early varying ones are dropped
+    for now in range(11, 21):
+        converged = detector.update(now, {'m': 1.0})
+    assert converged
+    assert detector.converged_at == 20
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from slicesim.Demand import compile_profile, get_period
+
+
+def test_constant():
+    np.testing.assert_array_equal(compile_profile(1.5, 4), [1.5] * 4)
+    np.testing.assert_array_equal(compile_profile(-1, 2), [0, 0])
+    assert get_period(2) == 0
+
+
+def test_piecewise_step():
+    spec = {'points': [[2, 3], [0, 1]]}
+    np.testing.assert_array_equal(compile_profile(spec, 5), [1, 1, 3, 3, 3])
+    spec = {'points': [[1, 1], [3, 2]], 'period': 4}
+    # before the first point of a period: the last one of the previous period
+    np.testing.assert_array_equal(compile_profile(spec, 8), [2, 1, 1, 2, 2, 1, 1, 2])
+    assert get_period(spec) == 4
+
+
+def test_piecewise_linear():
+    spec = {'points': [[0, 0], [4, 2]], 'interpolation': 'linear'}
+    np.testing.assert_allclose(compile_profile(spec, 6), [0, 0.5, 1, 1.5, 2, 2])
+    spec = {'points': [[0, 0], [2, 2]], 'interpolation': 'linear', 'period': 4}
+    np.testing.assert_allclose(compile_profile(spec, 5), [0, 1, 2, 1, 0])
+
+
+def test_periodic():
+    spec = {'type': 'periodic', 'period': 4, 'mean': 1, 'amplitude': 2, 'peak': 1}
+    np.testing.assert_allclose(compile_profile(spec, 4), [1, 3, 1, 0], atol=1e-12)
+
+
+def test_unknown():
+    with pytest.raises(NotImplementedError):
+        compile_profile({'type': 'square', 'period': 2}, 3)
+    with pytest.raises(NotImplementedError):
+        compile_profile({'points': [[0, 1]], 'interpolation': 'cubic'}, 3)
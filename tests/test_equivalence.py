@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from slicesim.Equivalence import (DEFAULT_REPLICATIONS, MODES, check_equivalence, compare, compare_replications,
+                                  run_replications, summarize)
+from slicesim.Replication import get_seeds
+from slicesim.Simulation import apply_overrides
+
+from conftest import CONF_DIR
+
+# Modes changing the order of the random draws or of the admissions, they only match over replications
+STATISTICAL_MODES = ('event', 'batched_admission')
+
+
+@pytest.fixture(scope='module')
+def seeds(small_config):
+    return get_seeds(small_config['settings']['seed'], DEFAULT_REPLICATIONS)
+
+
+@pytest.fixture(scope='module')
+def reference_summaries(small_config, seeds):
+    return run_replications(small_config, CONF_DIR, seeds)[0]
+
+
+@pytest.mark.parametrize('mode', sorted(MODES))
+def test_mode(small_config, seeds, reference_summaries, mode):
+    if mode not in STATISTICAL_MODES:
+        report = check_equivalence(small_config, CONF_DIR, MODES[mode])
+        assert report['equivalent'], report['first_divergence']
+        return
+    candidate, _ = run_replications(apply_overrides(small_config, MODES[mode]), CONF_DIR, seeds)
+    assert sorted(candidate[0]) == sorted(reference_summaries[0])
+    assert compare_replications(reference_summaries, candidate) == []
+
+
+def test_replications_detect_a_change(small_config, seeds, reference_summaries):
+    candidate, _ = run_replications(apply_overrides(small_config, {'load_balance_type': 'max'}), CONF_DIR, seeds)
+    divergences = compare_replications(reference_summaries, candidate)
+    assert 'handover_count_ratio' in {d['metric'] for d in divergences}
+
+
+def test_compare_replications():
+    rng = np.random.RandomState(4)
+    reference = [summarize({'a': rng.rand(20), 'b': rng.rand(20), 'slice_mean_loads/x': rng.rand(3)})
+                 for _ in range(8)]
+    noisy = [{key: value + rng.normal(0, 1e-3) for key, value in summary.items()} for summary in reference]
+    shifted = [{key: value + 0.01 if key == ('a', 'mean') else value for key, value in summary.items()}
+               for summary in noisy]
+    assert sorted(reference[0]) == [('a', 'mean'), ('a', 'std'), ('b', 'mean'), ('b', 'std'),
+                                    ('slice_mean_loads/x', 'base_station_0'), ('slice_mean_loads/x', 'base_station_1'),
+                                    ('slice_mean_loads/x', 'base_station_2')]
+    assert compare_replications(reference, reference) == []
+    assert compare_replications(reference, noisy) == []
+    divergences = compare_replications(reference, shifted)
+    assert [(d['metric'], d['statistic']) for d in divergences] == [('a', 'mean')]
+    assert divergences[0]['ci_low'] > 0
+    missing = [{key: value for key, value in summary.items() if key[0] != 'b'} for summary in reference]
+    assert {d['metric'] for d in compare_replications(reference, missing)} == {'b'}
+
+
+def test_compare_first_divergence():
+    reference = {'a': np.array([1.0, 2.0, 3.0]), 'slice_mean_loads/x': np.array([0.5, 0.5])}
+    candidate = {'a': np.array([1.0, 2.5, 4.0]), 'slice_mean_loads/x': np.array([0.5, 0.5])}
+    divergences = compare(reference, candidate)
+    assert len(divergences) == 1
+    assert divergences[0]['metric'] == 'a'
+    assert divergences[0]['index'] == 1
+    assert divergences[0]['max_abs_diff'] == 1.0
+    assert compare(reference, {name: values.copy() for name, values in reference.items()}) == []
+
+
+def test_compare_missing_and_shorter():
+    reference = {'a': np.array([1.0, 2.0]), 'b': np.array([1.0])}
+    candidate = {'a': np.array([1.0])}
+    divergences = {d['metric']: d for d in compare(reference, candidate)}
+    assert divergences['a']['index'] == 1
+    assert divergences['a']['candidate'] is None
+    assert divergences['b']['candidate'] is None
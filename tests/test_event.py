@@ -0,0 +1,65 @@
+import numpy as np
+
+from slicesim.Simulation import Simulation, apply_overrides
+
+from conftest import CONF_DIR
+
+
+def build_event_simulation(small_config, until):
+    """
+    :return: Simulation run until the given time, with clients idle for long stretches
+    """
+    data = apply_overrides(small_config, {'usage_model': 'event', 'handover_policy': {'type': 'max', 'threshold': 0.1}})
+    data['clients']['usage_frequency'] = {'distribution': 'randint', 'params': [90000, 100000], 'divide_scale': 100000}
+    simulation = Simulation(data, CONF_DIR)
+    simulation.build()
+    if until > 0:
+        simulation.env.run(until=until)
+    return simulation
+
+
+def test_covers_any_matches_covering_stations(small_config):
+    simulation = build_event_simulation(small_config, 0)
+    grid = simulation.stats.coverage_grid
+    grid.set_station_state(0, False)
+    rng = np.random.RandomState(2)
+    (x_min, x_max), (y_min, y_max) = simulation.get_area()
+    xs = rng.uniform(x_min - 100, x_max + 100, 5000)
+    ys = rng.uniform(y_min - 100, y_max + 100, 5000)
+    expected = [len(grid.get_covering_stations(x, y) or []) > 0 for x, y in zip(xs, ys)]
+    np.testing.assert_array_equal(grid.covers_any(xs, ys), expected)
+    assert len(grid.covers_any(xs[:0], ys[:0])) == 0
+
+
+def test_client_arrays_are_tracked(small_config):
+    simulation = build_event_simulation(small_config, 12.6)
+    stats = simulation.stats
+    serving = [c.base_station.pk if c.base_station is not None else -1 for c in simulation.clients]
+    connected = [c.connected for c in simulation.clients]
+    _, _, tracked_serving, tracked_connected = stats.get_client_arrays()
+    np.testing.assert_array_equal(tracked_serving, serving)
+    np.testing.assert_array_equal(tracked_connected, connected)
+    assert 0 < np.count_nonzero(tracked_connected) < len(connected)
+
+
+def test_context_of_awake_clients(small_config):
+    """
+    Rows of the awake clients are the ones computed over all clients, the others are left out.
+    """
+    simulation = build_event_simulation(small_config, 8.1)
+    controller = simulation.stats.handover
+    idle_scheduler = simulation.stats.idle_scheduler
+    active = controller.get_active_rows(9)
+    assert active is not None and 0 < len(active) < len(simulation.clients)
+    ctx = controller.get_context(9)
+    controller.get_active_rows = lambda now: None
+    full = controller.get_context(9)
+    asleep = ~idle_scheduler.get_awake(9)
+    for name in ('in_coverage', 'current_distance', 'current_radius', 'current_load'):
+        np.testing.assert_array_equal(getattr(ctx, name)[active], getattr(full, name)[active])
+    for name in ('candidates', 'mask', 'distances', 'radii', 'candidate_load'):
+        values, expected = getattr(ctx, name)[active], getattr(full, name)[active]
+        width = min(values.shape[1], expected.shape[1])
+        np.testing.assert_array_equal(values[:, :width], expected[:, :width])
+        assert not ctx.mask[active][:, width:].any() and not full.mask[active][:, width:].any()
+    assert not ctx.in_coverage[asleep].any() and not ctx.mask[asleep].any()
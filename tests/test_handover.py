@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from slicesim import Kernels
+from slicesim.HandoverPolicy import LoadBalancePolicy, get_policy
+from slicesim.Simulation import Simulation, apply_overrides
+
+from conftest import CONF_DIR
+
+
+def get_random_context(rng, n=400, k=6):
+    """
+    :return: candidate_load, mask, in_coverage, current_load with many ties, loads being multiples of 0.05
+    """
+    candidate_load = rng.randint(0, 21, (n, k)) * 0.05
+    mask = rng.rand(n, k) < 0.7
+    in_coverage = rng.rand(n) < 0.8
+    current_load = np.where(rng.rand(n) < 0.1, -1.0, rng.randint(0, 21, n) * 0.05)
+    return candidate_load, mask, in_coverage, current_load
+
+
+@pytest.mark.parametrize('decide', [Kernels.decide_threshold_margin_numpy, Kernels.decide_threshold_margin_loop])
+@pytest.mark.parametrize('threshold, margin', [(0.6, 0.05), (0.0, 0.0), (0.5, 0.2)])
+def test_decide_matches_decide_client(decide, threshold, margin):
+    policy = LoadBalancePolicy('max', threshold=threshold, margin=margin)
+    rng = np.random.RandomState(3)
+    candidate_load, mask, in_coverage, current_load = get_random_context(rng)
+    choice = decide(candidate_load, mask, in_coverage, current_load, threshold, margin)
+    for i in range(len(choice)):
+        columns = np.flatnonzero(mask[i])
+        best = policy.decide_client(in_coverage[i], current_load[i], candidate_load[i, columns].tolist())
+        assert choice[i] == (columns[best] if best >= 0 else -1)
+
+
+def test_batched_by_default():
+    assert get_policy({'type': 'max'}).batched
+    assert not get_policy({'type': 'mean', 'batched': False}).batched
+    assert str(get_policy({'type': 'mean', 'batched': False})).endswith(', per client)')
+
+
+@pytest.mark.parametrize('reduction', ['max', 'mean'])
+def test_vectorized_matches_per_client(small_config, reduction):
+    """
+    On the state of a run in the middle of a time unit, the vectorized loads and decisions are the ones each client
+    takes at its turn on the same loads.
+    """
+    data = apply_overrides(small_config, {'handover_policy': {'type': reduction, 'threshold': 0.1, 'margin': 0.0}})
+    simulation = Simulation(data, CONF_DIR)
+    simulation.build()
+    simulation.env.run(until=6.1)
+    controller = simulation.stats.handover
+    controller.loads = controller.get_slice_loads()
+    controller.run(6)
+    ctx = controller.context
+    moved = 0
+    for client in simulation.clients:
+        if client.base_station is not None:
+            live_load = controller.get_live_load(client.base_station, client.subscribed_slice_indices)
+            assert ctx.current_load[client.pk] == live_load
+        candidates = ctx.candidates[client.pk][ctx.mask[client.pk]]
+        live_loads = [controller.get_live_load(simulation.base_stations[pk], client.subscribed_slice_indices)
+                      for pk in candidates]
+        assert ctx.candidate_load[client.pk][ctx.mask[client.pk]].tolist() == live_loads
+        assert controller.next_pks[client.pk] == controller.decide_client(client)
+        moved += controller.next_pks[client.pk] not in (ctx.serving[client.pk], -1)
+    assert moved > 0
@@ -0,0 +1,133 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from slicesim import Kernels
+from slicesim.Kernels import PAIRWISE_BLOCKSIZE, pairwise_sum, water_fill
+
+# kernel bound by Kernels, and its NumPy or plain Python fallback
+FALLBACKS = {
+    'admit_in_order': 'admit_in_order_python',
+    'get_candidate_loads': 'get_candidate_loads_numpy',
+    'decide_threshold_margin': 'decide_threshold_margin_numpy',
+    'water_fill_groups': 'water_fill_groups_numpy',
+}
+
+
+def test_water_fill_under_demand():
+    demands = np.array([1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(water_fill(10, demands), demands)
+    np.testing.assert_array_equal(water_fill(10, []), [])
+
+
+def test_water_fill_max_min():
+    np.testing.assert_allclose(water_fill(10, [1, 4, 10]), [1, 4, 5])
+    np.testing.assert_allclose(water_fill(9, [10, 10], [1, 2]), [3, 6])
+    np.testing.assert_allclose(water_fill(12, [2, 10, 10]), [2, 5, 5])
+    np.testing.assert_array_equal(water_fill(0, [1, 2]), [0, 0])
+
+
+def test_water_fill_properties():
+    rng = np.random.RandomState(1)
+    for _ in range(100):
+        n = rng.randint(1, 50)
+        demands = rng.exponential(10, n)
+        weights = rng.uniform(0.5, 3, n)
+        capacity = rng.uniform(0, demands.sum())
+        result = water_fill(capacity, demands, weights)
+        assert result.sum() == pytest.approx(capacity)
+        assert np.all(result <= demands + 1e-9)
+        # clients not fully served all get the same allocation per weight, at least the one of the others
+        unserved = result < demands - 1e-9
+        level = result[unserved] / weights[unserved]
+        np.testing.assert_allclose(level, level[0])
+        assert np.all(demands[~unserved] / weights[~unserved] <= level[0] + 1e-9)
+
+
+@pytest.mark.parametrize('n', [0, 1, 7, 8, 9, PAIRWISE_BLOCKSIZE - 1, PAIRWISE_BLOCKSIZE, PAIRWISE_BLOCKSIZE + 1,
+                               1000, 12345, 100003])
+def test_pairwise_sum_matches_numpy(n):
+    a = np.random.RandomState(n).standard_normal(n + 5) * 1e6
+    assert pairwise_sum(a, 0, n) == a[:n].sum()
+    assert pairwise_sum(a, 5, n) == a[5:5 + n].sum()
+
+
+def load_kernels(jit):
+    """
+    :return: slicesim.Kernels if jit, compiled, or a fresh copy of it loaded with SLICE_SIM_JIT=0 otherwise.
+             Compiled copies are not loaded, as numba would cache their functions under the name of the copy.
+    """
+    if jit:
+        if not Kernels.JIT:
+            pytest.skip('numba is not installed or SLICE_SIM_JIT is 0')
+        return Kernels
+    previous = os.environ.get('SLICE_SIM_JIT')
+    os.environ['SLICE_SIM_JIT'] = '0'
+    try:
+        spec = importlib.util.spec_from_file_location('slicesim_kernels_no_jit', Kernels.__file__)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        if previous is None:
+            del os.environ['SLICE_SIM_JIT']
+        else:
+            os.environ['SLICE_SIM_JIT'] = previous
+    assert not module.JIT
+    return module
+
+
+def get_kernel_args(name, rng):
+    """
+    :return: List of argument tuples of the kernel, with ties, padding and empty groups
+    """
+    n, k, n_stations, n_slices = 300, 5, 12, 4
+    if name == 'admit_in_order':
+        counts = rng.randint(1, 4, n)
+        ptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        keys = rng.randint(0, n_stations * n_slices, ptr[-1]).astype(np.int64)
+        headroom = np.where(rng.rand(n_stations * n_slices) < 0.2, np.inf,
+                            rng.randint(0, 10, n_stations * n_slices).astype(float))
+        return [(rng.permutation(n).astype(np.int64), ptr, keys, rng.rand(len(keys)) < 0.7, headroom)]
+    if name == 'get_candidate_loads':
+        loads = rng.rand(n_stations, n_slices)
+        stations = rng.randint(-1, n_stations, (n, k))
+        slice_indices = np.full((n, 3), -1, dtype=np.int64)
+        for i in range(n):
+            count = rng.randint(1, 4)
+            slice_indices[i, :count] = rng.choice(n_slices, count, replace=False)
+        return [(loads, stations, slice_indices, True), (loads, stations, slice_indices, False)]
+    if name == 'decide_threshold_margin':
+        candidate_load = rng.randint(0, 21, (n, k)) * 0.05
+        current_load = np.where(rng.rand(n) < 0.1, -1.0, rng.randint(0, 21, n) * 0.05)
+        return [(candidate_load, rng.rand(n, k) < 0.7, rng.rand(n) < 0.8, current_load, 0.6, 0.05),
+                (candidate_load, np.zeros((n, k), dtype=bool), rng.rand(n) < 0.8, current_load, 0.0, 0.0)]
+    groups = np.sort(rng.randint(0, 40, n))
+    ptr = np.searchsorted(groups, np.arange(41)).astype(np.int64)
+    demands = rng.lognormal(16, 1.5, n)
+    capacities = np.add.reduceat(demands, ptr[:-1]) * rng.uniform(0.3, 1.2, 40)
+    capacities[np.diff(ptr) == 0] = 0.0
+    capacities[:3] = 0.0
+    return [(capacities, ptr, demands, np.ones(n)), (capacities, ptr, demands, 1.0 / rng.randint(1, 6, n))]
+
+
+@pytest.mark.parametrize('jit', [False, True])
+@pytest.mark.parametrize('name', sorted(FALLBACKS))
+def test_kernel_matches_fallback(name, jit):
+    module = load_kernels(jit)
+    for args in get_kernel_args(name, np.random.RandomState(11)):
+        expected = getattr(module, FALLBACKS[name])(*args)
+        np.testing.assert_array_equal(getattr(module, name)(*args), expected)
+        np.testing.assert_array_equal(getattr(module, f'{name}_loop')(*args), expected)
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_compiled_sums_match_numpy(jit):
+    module = load_kernels(jit)
+    rng = np.random.RandomState(5)
+    for n in (0, 1, 7, 8, 15, 16, 17, PAIRWISE_BLOCKSIZE, PAIRWISE_BLOCKSIZE + 8, 1001, 65537):
+        a = rng.standard_normal(n + 3) * 1e6
+        assert module.pairwise_sum(a, 3, n) == a[3:3 + n].sum()
+        if n <= PAIRWISE_BLOCKSIZE:
+            assert module.block_sum(a, 3, n) == a[3:3 + n].sum()
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+import simpy
+
+from slicesim.Slice import Capacity
+from slicesim.utils import Environment
+
+
+def run(seed, compact):
+    """
+    Random gets and puts of processes woken at the phases of a time unit, the levels seen after each batch.
+    """
+    env = Environment()
+    capacity = Capacity(env, 10.0, init=10.0) if compact else simpy.Container(env, 10.0, init=10.0)
+    trace = []
+
+    def process(i):
+        rng = random.Random(seed * 100 + i)
+        while True:
+            yield env.timeout(rng.choice([0.25, 0.5, 1]))
+            for _ in range(rng.randint(1, 3)):
+                amount = rng.uniform(0.1, 4.0)
+                (capacity.get if rng.random() < 0.5 else capacity.put)(amount)
+            trace.append((env.now, i, capacity.level))
+
+    for i in range(8):
+        env.process(process(i))
+    env.run(until=60)
+    return trace
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_capacity_matches_container(seed):
+    assert run(seed, True) == run(seed, False)
+
+
+def test_capacity_bounds():
+    env = Environment()
+    with pytest.raises(ValueError):
+        Capacity(env, 0)
+    with pytest.raises(ValueError):
+        Capacity(env, 1, init=2)
+    with pytest.raises(ValueError):
+        Capacity(env, 1).get(0)
+
+
+def test_reserved_positions():
+    env = Environment()
+    calls = []
+    first, second = env.reserve(), env.reserve()
+    assert first < second
+    env.schedule_reserved(second, lambda event: calls.append('second'))
+    env.schedule_reserved(first, lambda event: calls.append('first'))
+    env.run()
+    assert calls == ['first', 'second']
+    # positions already past are not scheduled
+    env.schedule_reserved(first, lambda event: calls.append('late'))
+    env.run()
+    assert calls == ['first', 'second']